@@ -10,8 +10,10 @@ This application allows users to:
 6. Save the revised contract to a file.
 """
 import os
-import logging
 import sys
+import hashlib
+import logging
+import argparse
 import time
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple
@@ -39,12 +41,21 @@ except UnicodeDecodeError:
 
 # Import utility modules
 from utils.file_handler import (
-    open_file_dialog, save_file_dialog, read_file, save_file
+    open_file_dialog, save_file_dialog, read_file_with_positions, save_file
 )
-from utils.chunker import chunk_text
+from utils.chunker import CHUNKING_STRATEGY, chunk_by_sentences, chunk_by_clauses
+from utils.dedup import DEDUP_CHUNKS, collapse_near_duplicates, fan_out
 from utils.embedding import get_embeddings_batch
+from utils.embedding_batcher import EMBEDDING_MICROBATCH, get_embedding_batcher
 from utils.db import test_db_connection, find_similar_entries_batch
-from utils.api import get_contract_revision
+from utils.gating import GATE_CHUNKS, select_candidates, merge_sections
+from utils.api import (
+    get_contract_revision, revise_sections, create_contract_revision_prompt,
+    create_section_revision_prompt, apply_section_revisions, track_usage, REVISION_MODE
+)
+from utils.batch_api import BATCH_DIR, embed_in_bulk, complete_in_bulk
+from utils.redline import REDLINE_REPORT, save_redline_report
+from utils.profiling import RunProfiler
 
 # Define supported file types
 FILE_TYPES = (
@@ -67,15 +78,89 @@ def display_welcome_message():
     print("4. Saving the revised contract")
     print("\n" + "=" * 80 + "\n")
 
-def process_contract() -> bool:
+def split_contract(contract_text: str) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """
+    Split a contract into non-blank chunks with the configured strategy.
+    
+    Args:
+        contract_text: The contract text.
+        
+    Returns:
+        The chunks and the (start, end) position of each chunk in the text.
+    """
+    # Chunks carry their position in the text, which lets gating revise them in place
+    if CHUNKING_STRATEGY == "clause":
+        chunks = chunk_by_clauses(contract_text)
+    else:
+        chunks = chunk_by_sentences(contract_text)
+    contract_chunks = [chunk["text"] for chunk in chunks]
+    chunk_spans = [(chunk["start"], chunk["end"]) for chunk in chunks]
+    
+    kept = [i for i, chunk in enumerate(contract_chunks) if chunk.strip()]
+    return [contract_chunks[i] for i in kept], [chunk_spans[i] for i in kept]
+
+def collapse_chunks(contract_chunks: List[str]) -> Tuple[List[int], List[int]]:
+    """
+    Collapse near-duplicate chunks so each distinct chunk is embedded and searched once.
+    
+    Args:
+        contract_chunks: The contract chunks.
+        
+    Returns:
+        The indexes of the representative chunks and, for each chunk, the index of its group.
+    """
+    if DEDUP_CHUNKS:
+        return collapse_near_duplicates(contract_chunks)
+    return list(range(len(contract_chunks))), list(range(len(contract_chunks)))
+
+def plan_revision(valid_chunks: List[str], valid_spans: Optional[List[Tuple[int, int]]],
+                  similar_entries: List[List[Dict[str, Any]]]) -> Optional[List[Tuple[int, int, List[Dict[str, Any]]]]]:
+    """
+    Decide which parts of a contract to revise.
+    
+    Args:
+        valid_chunks: The chunks that have knowledge base results.
+        valid_spans: The position of each of those chunks, or None if unknown.
+        similar_entries: The knowledge base entries of each chunk.
+        
+    Returns:
+        The sections to revise (empty if nothing needs revision), or None if the
+        contract is to be revised as a whole.
+    """
+    if not GATE_CHUNKS:
+        return None
+    
+    # Only chunks with policy hits are sent; the rest pass through unchanged
+    candidates, _ = select_candidates(similar_entries)
+    skipped = len(valid_chunks) - len(candidates)
+    print(f"{len(candidates)} of {len(valid_chunks)} chunks have policy hits.")
+    
+    if not candidates:
+        print("No chunk needs revision; keeping the contract unchanged.")
+        return []
+    if valid_spans is None:
+        # Without chunk positions, the contract is revised as a whole
+        return None
+    
+    sections = merge_sections(valid_spans, candidates, similar_entries)
+    print(f"Revising {len(sections)} sections, skipping {skipped} chunks "
+          f"({skipped / len(valid_chunks):.0%}) without policy hits.")
+    return sections
+
+def process_contract(profiler: Optional[RunProfiler] = None) -> bool:
     """
     Process a contract file from selection to saving the revised version.
     
+    Args:
+        profiler: Profiler marking the steps of the run. Defaults to no profiling.
+    
     Returns:
         True if successful, False otherwise.
     """
+    profiler = profiler or RunProfiler(enabled=False)
     try:
         # Test database connection
+        profiler.step("connect")
         logger.info("Testing database connection...")
         db_success, db_message = test_db_connection()
         if not db_success:
@@ -84,6 +169,7 @@ def process_contract() -> bool:
             return False
         
         # Step 1: Select a contract file
+        profiler.step("select_file")
         print("\nStep 1: Please select a contract file (PDF or DOCX)...")
         file_path = open_file_dialog(FILE_TYPES)
         
@@ -94,18 +180,20 @@ def process_contract() -> bool:
         print(f"Selected file: {file_path}")
         
         # Step 2: Read the file
+        profiler.step("read_file")
         print("\nStep 2: Reading the file content...")
-        result = read_file(file_path)
+        result = read_file_with_positions(file_path)
         
         if not result:
             print("Failed to read the file. Please check the file format and try again.")
             return False
         
-        contract_text, file_ext = result
+        contract_text, file_ext, text_positions = result
         
         # Step 3: Split the text into chunks
+        profiler.step("chunk")
         print("\nStep 3: Splitting the contract into chunks...")
-        contract_chunks = chunk_text(contract_text)
+        contract_chunks, chunk_spans = split_contract(contract_text)
         
         if not contract_chunks:
             print("Failed to split the contract into chunks. The contract may be empty.")
@@ -113,32 +201,52 @@ def process_contract() -> bool:
         
         print(f"Split the contract into {len(contract_chunks)} chunks.")
         
+        # Collapse near-duplicate chunks so each distinct chunk is embedded and searched once
+        representatives, assignment = collapse_chunks(contract_chunks)
+        distinct_chunks = [contract_chunks[i] for i in representatives]
+        
+        if len(distinct_chunks) < len(contract_chunks):
+            print(f"Collapsed near-duplicates into {len(distinct_chunks)} distinct chunks.")
+        
         # Step 4: Generate embeddings for the chunks
+        profiler.step("embed")
         print("\nStep 4: Generating embeddings for the contract chunks...")
-        embeddings = get_embeddings_batch(contract_chunks, show_progress=True)
+        if EMBEDDING_MICROBATCH:
+            distinct_embeddings = get_embedding_batcher().embed_many(distinct_chunks)
+        else:
+            distinct_embeddings = get_embeddings_batch(distinct_chunks, show_progress=True)
         
-        if not embeddings or all(emb is None for emb in embeddings):
+        if not distinct_embeddings or all(emb is None for emb in distinct_embeddings):
             print("Failed to generate embeddings. Please check your OpenAI API key.")
             return False
         
+        embeddings = fan_out(distinct_embeddings, assignment)
         print(f"Generated embeddings for {sum(1 for emb in embeddings if emb is not None)} chunks.")
         
         # Step 5: Find similar entries in the knowledge base
+        profiler.step("search")
         print("\nStep 5: Finding similar entries in the knowledge base...")
-        valid_embeddings = [emb for emb in embeddings if emb is not None]
+        valid_groups = [group for group, emb in enumerate(distinct_embeddings) if emb is not None]
         
-        if not valid_embeddings:
+        if not valid_groups:
             print("No valid embeddings to query the knowledge base.")
             return False
         
-        similar_entries = find_similar_entries_batch(valid_embeddings)
+        group_entries = dict(zip(
+            valid_groups,
+            find_similar_entries_batch([distinct_embeddings[group] for group in valid_groups],
+                                       query_texts=[distinct_chunks[group] for group in valid_groups])
+        ))
+        similar_entries = [group_entries[group] for group in assignment if group in group_entries]
         
         total_entries = sum(len(entries) for entries in similar_entries)
         print(f"Found {total_entries} relevant entries in the knowledge base.")
         
         # Step 6: Revise the contract using OpenAI's GPT-4.1-nano
+        profiler.step("revise")
         print("\nStep 6: Revising the contract using OpenAI's GPT-4.1-nano...")
-        valid_chunks = [chunk for i, chunk in enumerate(contract_chunks) if embeddings[i] is not None]
+        valid_indexes = [i for i, emb in enumerate(embeddings) if emb is not None]
+        valid_chunks = [contract_chunks[i] for i in valid_indexes]
         
         # Ensure we have matching chunks and similar entries
         if len(valid_chunks) != len(similar_entries):
@@ -148,13 +256,31 @@ def process_contract() -> bool:
             valid_chunks = valid_chunks[:min_len]
             similar_entries = similar_entries[:min_len]
         
-        revised_contract = get_contract_revision(valid_chunks, similar_entries)
+        valid_spans = None
+        if len(valid_chunks) == len(valid_indexes):
+            valid_spans = [chunk_spans[i] for i in valid_indexes]
+        
+        sections = plan_revision(valid_chunks, valid_spans, similar_entries)
+        if sections is None and REVISION_MODE == "edits":
+            # Edits are located in the original text, so the whole contract becomes one section
+            sections = [(0, len(contract_text), [entry for entries in similar_entries for entry in entries])]
+        with track_usage() as usage:
+            if sections is None:
+                revised_contract = get_contract_revision(valid_chunks, similar_entries)
+            elif not sections:
+                revised_contract = contract_text
+            else:
+                revised_contract = revise_sections(contract_text, sections)
+        if usage["prompt_tokens"]:
+            print(f"Chat tokens: {usage['prompt_tokens']} prompt ({usage['cached_tokens']} served from the "
+                  f"provider's prompt cache), {usage['completion_tokens']} completion.")
         
         if not revised_contract:
             print("Failed to revise the contract. Please check your OpenAI API key and try again.")
             return False
         
         # Step 7: Save the revised contract
+        profiler.step("save")
         print("\nStep 7: Saving the revised contract...")
         try:
             original_file_name = Path(file_path).stem
@@ -176,7 +302,8 @@ def process_contract() -> bool:
                 os.makedirs(save_dir)
             
             # Try to save the file
-            success = save_file(revised_contract, save_path)
+            # DOCX output edits the original document in place, keeping its formatting
+            success = save_file(revised_contract, save_path, source_path=file_path, blocks=text_positions)
             
             if not success:
                 print(f"Failed to save the revised contract to {save_path}.")
@@ -185,6 +312,12 @@ def process_contract() -> bool:
             
             print(f"Revised contract saved successfully to: {save_path}")
             logger.info(f"Successfully saved revised contract to: {save_path}")
+            
+            # Write a redline of the changes next to the revised contract
+            if REDLINE_REPORT:
+                changes = save_redline_report(contract_text, revised_contract, save_path)
+                if changes is not None:
+                    print(f"Saved a change report with {len(changes)} changes next to the revised contract.")
             return True
             
         except Exception as e:
@@ -197,13 +330,172 @@ def process_contract() -> bool:
         print(f"\nAn error occurred: {str(e)}")
         return False
 
+def process_archive(input_dir: str, output_dir: str, work_dir: Optional[str] = None, wait: bool = True) -> bool:
+    """
+    Revise every contract in a directory through the OpenAI Batch API.
+    
+    Embeddings and revisions are requested in bulk, so the run takes hours rather
+    than minutes but costs half as much. All state is kept in work_dir: running the
+    same command again resumes an interrupted run and retries failed requests.
+    
+    Args:
+        input_dir: Directory searched recursively for PDF and DOCX contracts.
+        output_dir: Directory for the revised contracts, mirroring input_dir.
+        work_dir: Directory of the batch jobs. Defaults to a directory under BATCH_DIR
+            named after input_dir.
+        wait: Whether to wait for the batches. Without waiting, each run submits the
+            next phase and returns; run again to continue.
+        
+    Returns:
+        True if all contracts were processed, False otherwise.
+    """
+    try:
+        db_success, db_message = test_db_connection()
+        if not db_success:
+            print(f"Database connection error: {db_message}")
+            return False
+        
+        work_dir = work_dir or os.path.join(BATCH_DIR, Path(input_dir).resolve().name)
+        paths = sorted(path for path in Path(input_dir).rglob("*") if path.suffix.lower() in (".pdf", ".docx"))
+        print(f"Found {len(paths)} contracts in {input_dir}.")
+        
+        # Documents are identified by content, so custom IDs stay valid across runs.
+        # Identical files at several paths are revised once and saved to each path.
+        documents = {}
+        for path in paths:
+            document_id = hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+            if document_id in documents:
+                documents[document_id]["paths"].append(path)
+                continue
+            
+            result = read_file_with_positions(str(path))
+            if not result:
+                print(f"Skipping {path}: failed to read the file.")
+                continue
+            contract_text, file_ext, text_positions = result
+            contract_chunks, chunk_spans = split_contract(contract_text)
+            if not contract_chunks:
+                print(f"Skipping {path}: no text to revise.")
+                continue
+            representatives, assignment = collapse_chunks(contract_chunks)
+            documents[document_id] = {
+                "paths": [path], "text": contract_text, "ext": file_ext, "blocks": text_positions,
+                "chunks": contract_chunks, "spans": chunk_spans,
+                "distinct": [contract_chunks[i] for i in representatives], "assignment": assignment,
+            }
+        
+        # Phase 1: embed all distinct chunks of all contracts
+        texts = {f"{document_id}:chunk-{group}": chunk
+                 for document_id, document in documents.items()
+                 for group, chunk in enumerate(document["distinct"])}
+        print(f"Embedding {len(texts)} chunks through the Batch API...")
+        embeddings = embed_in_bulk(texts, os.path.join(work_dir, "embeddings"), wait=wait)
+        if embeddings is None:
+            print("Embedding batches are still running or could not be sent (see the log). "
+                  "Run the same command again later to continue.")
+            return False
+        
+        # Phase 2: search the knowledge base and build the revision prompts
+        prompts = {}
+        plans = {}
+        for document_id, document in documents.items():
+            distinct_embeddings = [embeddings[f"{document_id}:chunk-{group}"] for group in range(len(document["distinct"]))]
+            valid_groups = [group for group, emb in enumerate(distinct_embeddings) if emb is not None]
+            if not valid_groups:
+                print(f"Skipping {document['paths'][0]}: no embeddings.")
+                continue
+            
+            group_entries = dict(zip(
+                valid_groups,
+                find_similar_entries_batch([distinct_embeddings[group] for group in valid_groups],
+                                           query_texts=[document["distinct"][group] for group in valid_groups])
+            ))
+            valid_indexes = [i for i, group in enumerate(document["assignment"]) if group in group_entries]
+            valid_chunks = [document["chunks"][i] for i in valid_indexes]
+            similar_entries = [group_entries[document["assignment"][i]] for i in valid_indexes]
+            valid_spans = [document["spans"][i] for i in valid_indexes]
+            
+            print(f"\n{document['paths'][0]}:")
+            sections = plan_revision(valid_chunks, valid_spans, similar_entries)
+            plans[document_id] = sections
+            if sections is None:
+                prompts[f"{document_id}:contract"] = create_contract_revision_prompt(valid_chunks, similar_entries)
+            for number, (start, end, entries) in enumerate(sections or []):
+                prompts[f"{document_id}:section-{number}"] = create_section_revision_prompt(
+                    document["text"][start:end], [entries])
+        
+        # Phase 3: revise
+        print(f"\nRequesting {len(prompts)} revisions through the Batch API...")
+        revisions = complete_in_bulk(prompts, os.path.join(work_dir, "revisions"), wait=wait)
+        if revisions is None:
+            print("Revision batches are still running or could not be sent (see the log). "
+                  "Run the same command again later to continue.")
+            return False
+        
+        # Phase 4: put the revisions together and save them under output_dir
+        saved = 0
+        for document_id, sections in plans.items():
+            document = documents[document_id]
+            if sections is None:
+                revised_contract = revisions[f"{document_id}:contract"]
+            else:
+                revised_sections = [revisions[f"{document_id}:section-{number}"] for number in range(len(sections))]
+                revised_contract = (None if None in revised_sections
+                                    else apply_section_revisions(document["text"], sections, revised_sections))
+            
+            if not revised_contract:
+                print(f"Failed to revise {', '.join(str(path) for path in document['paths'])}.")
+                continue
+            
+            for path in document["paths"]:
+                relative_path = path.relative_to(input_dir)
+                save_path = os.path.join(output_dir, str(relative_path.parent),
+                                         f"{relative_path.stem}_revised{document['ext']}")
+                os.makedirs(os.path.dirname(save_path), exist_ok=True)
+                if not save_file(revised_contract, save_path, source_path=str(path), blocks=document["blocks"]):
+                    print(f"Failed to save the revised contract to {save_path}.")
+                    continue
+                if REDLINE_REPORT:
+                    save_redline_report(document["text"], revised_contract, save_path)
+                saved += 1
+        
+        print(f"\nSaved {saved} of {len(paths)} revised contracts to {output_dir}.")
+        return saved == len(paths)
+    
+    except Exception as e:
+        logger.error(f"Error processing archive: {str(e)}")
+        print(f"\nAn error occurred: {str(e)}")
+        return False
+
 def main():
     """Main function to run the contract analysis tool."""
+    parser = argparse.ArgumentParser(description="Analyze and revise contracts against the knowledge base.")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile CPU time and memory of each step and write the results under runs/")
+    parser.add_argument("--bulk", metavar="INPUT_DIR",
+                        help="revise every contract in INPUT_DIR through the Batch API instead of interactively")
+    parser.add_argument("--output", metavar="OUTPUT_DIR", default="revised",
+                        help="where --bulk saves the revised contracts (default: revised)")
+    parser.add_argument("--work-dir", help="state directory of the --bulk batch jobs, for resuming")
+    parser.add_argument("--no-wait", action="store_true",
+                        help="with --bulk, submit the next batches and exit instead of waiting for them")
+    args = parser.parse_args()
+    
+    if args.bulk:
+        success = process_archive(args.bulk, args.output, args.work_dir, wait=not args.no_wait)
+        sys.exit(0 if success else 1)
+    
     try:
         display_welcome_message()
         
         while True:
-            success = process_contract()
+            profiler = RunProfiler(enabled=args.profile)
+            try:
+                success = process_contract(profiler)
+            finally:
+                run_dir = profiler.finish()
+            if run_dir:
+                print(f"Profile of this run saved to: {run_dir}")
             
             if success:
                 print("\nContract processing completed successfully!")
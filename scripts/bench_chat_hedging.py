@@ -0,0 +1,90 @@
+"""
+Benchmark for hedged chat completions and the circuit breaker.
+
+Starts the local OpenAI stand-in with a long-tail latency model (no API calls are
+made) and sends the same sequence of chat requests with hedging off and on,
+reporting p50/p95/p99 latency, hedge rate and hedge wins. A final phase makes the
+stand-in fail most requests to show the circuit breaker opening and failing fast.
+
+Usage:
+    python scripts/bench_chat_hedging.py [--requests 200] [--median-ms 100]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai_standin import start_standin  # noqa: E402
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--median-ms", type=float, default=100)
+    parser.add_argument("--tail-probability", type=float, default=0.05)
+    args = parser.parse_args()
+
+    _, state, base_url = start_standin(median=args.median_ms / 1000, tail_probability=args.tail_probability)
+
+    # Configure the client before the pipeline modules read the environment
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "stand-in",
+        "RATE_LIMIT_PATH": os.path.join(tempfile.mkdtemp(), "rate_limits.sqlite3"),
+        "HEDGE_MIN_DELAY": "0",
+        "CIRCUIT_COOLDOWN": "2",
+    })
+    logging.disable(logging.CRITICAL)
+
+    from utils import api, metrics
+
+    messages = [{"role": "user", "content": "MADDE 1 - Taraflar işbu sözleşmeyi kabul eder."}]
+
+    print(f"{args.requests} requests, median {args.median_ms:.0f} ms, "
+          f"{args.tail_probability:.0%} of requests 10x slower\n")
+    print(f"{'hedging':<8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'hedges':>7} {'wins':>5} {'API calls':>10}")
+    for hedging in (False, True):
+        api.CHAT_HEDGING = hedging
+        model = f"stand-in-{'hedged' if hedging else 'plain'}"
+        # Warm up the latency window so the p95 threshold is known
+        for _ in range(api.HEDGE_MIN_SAMPLES):
+            api.create_chat_completion(messages, model)
+
+        calls_before = state.requests
+        latencies = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            api.create_chat_completion(messages, model)
+            latencies.append(time.perf_counter() - started)
+
+        counters = metrics.snapshot()["counters"]
+        hedges = counters.get(f'chat_hedges_total{{model="{model}"}}', 0)
+        wins = counters.get(f'chat_hedge_wins_total{{model="{model}"}}', 0)
+        print(f"{'on' if hedging else 'off':<8} {percentile(latencies, 50):>7.3f} {percentile(latencies, 95):>7.3f} "
+              f"{percentile(latencies, 99):>7.3f} {hedges:>7.0f} {wins:>5.0f} {state.requests - calls_before:>10}")
+
+    # Circuit breaker: most requests fail, so calls start failing fast
+    api.CHAT_HEDGING = False
+    state.error_probability = 0.9
+    api.client = api.client.with_options(max_retries=0)
+    outcomes = {"answered": 0, "failed": 0}
+    started = time.perf_counter()
+    for _ in range(40):
+        outcomes["answered" if api.create_chat_completion(messages, "stand-in-failing") else "failed"] += 1
+    elapsed = time.perf_counter() - started
+
+    counters = metrics.snapshot()["counters"]
+    rejected = counters.get('circuit_rejected_total{breaker="chat:stand-in-failing"}', 0)
+    print(f"\nWith 90% of requests failing: {outcomes['answered']} answered, {outcomes['failed']} failed "
+          f"({rejected:.0f} failed fast by the open breaker) in {elapsed:.1f} s")
+    print("\n" + metrics.render_prometheus())
+
+if __name__ == "__main__":
+    main()
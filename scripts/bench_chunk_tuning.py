@@ -0,0 +1,317 @@
+"""
+Chunking parameter sweep: retrieval quality against token volume.
+
+Chunks a local corpus of contracts with every combination of chunk size, overlap
+and top_k, retrieves the top_k policies for every chunk and scores the result
+against a labeled set of clause -> policy matches. A match is recalled when a
+chunk overlapping its passage retrieves its policy. For every configuration the
+sweep reports:
+
+- recall@k over the labeled matches;
+- embedding tokens (the chunks) and context tokens (the retrieved policies as
+  formatted for the revision prompt), and their total;
+- the number of knowledge base queries (one per chunk);
+- wall time of chunking and retrieval, with embeddings already cached.
+
+Configurations that no other configuration beats on recall, total tokens and
+queries at once (the Pareto front) are marked with "*" and listed at the end.
+
+Chunk embeddings are kept in a SQLite cache keyed by model and text, so a chunk
+is embedded once across configurations and runs; only chunks not in the cache
+are sent to the API. Retrieval is exact cosine search over the policy
+embeddings, the ranking of SEARCH_MODE=exact.
+
+The labeled set is a JSON file:
+
+    {
+      "policies": [{"id": "late-payment", "content": "...", "meta_info": "..."}],
+      "matches": [{"document": "supplier.docx", "passage": "Gecikme halinde ...",
+                   "policy": "late-payment"}]
+    }
+
+"document" is a path relative to the corpus directory and "passage" is quoted
+from it (whitespace may differ). Without "policies", the knowledge base entries
+are loaded from the database with their stored embeddings, and "policy" is an
+entry id.
+
+Usage:
+    python scripts/bench_chunk_tuning.py CORPUS_DIR LABELS.json
+        [--chunk-sizes 250 500 1000] [--overlaps 0 50 100] [--top-k 3 5 10]
+        [--strategies sentence clause] [--cache .cache/embeddings.sqlite3] [--json results.json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.chunker import chunk_by_sentences, chunk_by_clauses  # noqa: E402
+from utils.tokenizer import count_tokens  # noqa: E402
+
+# Texts per embedding request when filling the cache
+EMBEDDING_BATCH_SIZE = 100
+
+class EmbeddingCache:
+    """SQLite store of embeddings keyed by a hash of the model and the text."""
+
+    def __init__(self, path: str, model: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.model = model
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, embedding BLOB NOT NULL)")
+        self.connection.commit()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Return the cached embedding of every text found, keyed by text."""
+        keys = {self.key(text): text for text in texts}
+        found = {}
+        key_list = list(keys)
+        for offset in range(0, len(key_list), 500):
+            batch = key_list[offset:offset + 500]
+            rows = self.connection.execute(
+                f"SELECT key, embedding FROM embeddings WHERE key IN ({', '.join('?' * len(batch))})", batch)
+            for key, blob in rows:
+                found[keys[key]] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+                [(self.key(text), np.asarray(embedding, dtype=np.float32).tobytes())
+                 for text, embedding in items.items()])
+
+def embed_missing(cache: EmbeddingCache, texts: List[str]) -> Tuple[int, int]:
+    """
+    Embed the texts that are not cached yet.
+
+    Returns:
+        (texts embedded, tokens sent) for the API calls made.
+    """
+    from utils.embedding import create_embeddings
+
+    unique = list(dict.fromkeys(text for text in texts if text.strip()))
+    cached = cache.get_many(unique)
+    missing = [text for text in unique if text not in cached]
+    tokens = 0
+    for offset in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+        batch = missing[offset:offset + EMBEDDING_BATCH_SIZE]
+        embeddings = create_embeddings(batch, cache.model)
+        if embeddings is None:
+            sys.exit("Embedding request failed; completed batches stay cached, run again to resume.")
+        cache.put_many(dict(zip(batch, embeddings)))
+        tokens += sum(count_tokens(text, cache.model) for text in batch)
+    return len(missing), tokens
+
+def normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def load_policies_from_db() -> Tuple[List[Dict], np.ndarray]:
+    """Load knowledge base entries and their stored embeddings."""
+    from utils.db import get_db_connection
+    from utils.vector import from_vector_text
+
+    connection = get_db_connection()
+    if not connection:
+        sys.exit("Could not connect to the database.")
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, content, meta_info, embedding::text FROM knowledge_base "
+                "WHERE is_knowledge_base = TRUE AND embedding IS NOT NULL;")
+            rows = cursor.fetchall()
+    finally:
+        connection.close()
+    policies = [{"id": row[0], "content": row[1], "meta_info": row[2]} for row in rows]
+    return policies, np.array([from_vector_text(row[3]) for row in rows], dtype=np.float32)
+
+def locate_passage(text: str, passage: str) -> Optional[Tuple[int, int]]:
+    """Find a passage in a text, tolerating differences in whitespace."""
+    words = passage.split()
+    if not words:
+        return None
+    match = re.search(r"\s+".join(re.escape(word) for word in words), text)
+    return match.span() if match else None
+
+def make_chunks(text: str, strategy: str, chunk_size: int, overlap: int) -> List[Tuple[str, int, int]]:
+    """Chunk a document and return (text, start, end) chunks."""
+    if strategy == "clause":
+        chunks = chunk_by_clauses(text, max_tokens=chunk_size)
+    else:
+        chunks = chunk_by_sentences(text, chunk_size, overlap)
+    return [(chunk["text"], chunk["start"], chunk["end"]) for chunk in chunks if chunk["text"].strip()]
+
+def format_context(policies: List[Dict], ranked: np.ndarray) -> str:
+    """The retrieved policies as create_contract_revision_prompt formats them."""
+    from utils.api import format_knowledge_entries
+    return format_knowledge_entries([[policies[i] for i in row] for row in ranked])
+
+def evaluate(documents: Dict[str, str], matches: List[Dict], policies: List[Dict],
+             policy_matrix: np.ndarray, cache: EmbeddingCache, strategy: str,
+             chunk_size: int, overlap: int, top_k: int) -> Dict:
+    """Chunk, retrieve and score one configuration."""
+    started = time.perf_counter()
+    recalled = queries = embedding_tokens = context_tokens = 0
+
+    for name, text in documents.items():
+        chunks = make_chunks(text, strategy, chunk_size, overlap)
+        if not chunks:
+            continue
+        embeddings = cache.get_many([chunk[0] for chunk in chunks])
+        query_matrix = normalized(np.array([embeddings[chunk[0]] for chunk in chunks], dtype=np.float32))
+        scores = query_matrix @ policy_matrix.T
+        k = min(top_k, len(policies))
+        ranked = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        ranked = np.take_along_axis(ranked, np.argsort(-np.take_along_axis(scores, ranked, axis=1), axis=1), axis=1)
+
+        queries += len(chunks)
+        embedding_tokens += sum(count_tokens(chunk[0], cache.model) for chunk in chunks)
+        context_tokens += count_tokens(format_context(policies, ranked))
+
+        for match in matches:
+            if match["document"] != name:
+                continue
+            start, end = match["span"]
+            retrieved = set()
+            for (_, chunk_start, chunk_end), row in zip(chunks, ranked):
+                if chunk_start < end and chunk_end > start:
+                    retrieved.update(policies[i]["id"] for i in row)
+            recalled += match["policy"] in retrieved
+
+    return {
+        "strategy": strategy, "chunk_size": chunk_size, "overlap": overlap, "top_k": top_k,
+        "recall": recalled / len(matches) if matches else 0.0,
+        "embedding_tokens": embedding_tokens, "context_tokens": context_tokens,
+        "total_tokens": embedding_tokens + context_tokens,
+        "queries": queries, "seconds": time.perf_counter() - started,
+    }
+
+def pareto_front(results: List[Dict]) -> List[Dict]:
+    """Results not dominated on recall (higher), total tokens and queries (lower)."""
+    def dominates(a, b):
+        no_worse = (a["recall"] >= b["recall"] and a["total_tokens"] <= b["total_tokens"]
+                    and a["queries"] <= b["queries"])
+        better = (a["recall"] > b["recall"] or a["total_tokens"] < b["total_tokens"]
+                  or a["queries"] < b["queries"])
+        return no_worse and better
+    return [r for r in results if not any(dominates(other, r) for other in results)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("corpus", help="directory of contracts (PDF, DOCX or text)")
+    parser.add_argument("labels", help="JSON file of labeled clause -> policy matches")
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[250, 500, 1000])
+    parser.add_argument("--overlaps", nargs="+", type=int, default=[0, 50, 100])
+    parser.add_argument("--top-k", nargs="+", type=int, default=[3, 5, 10])
+    parser.add_argument("--strategies", nargs="+", choices=["sentence", "clause"], default=["sentence"])
+    parser.add_argument("--cache", default=os.path.join(".cache", "embeddings.sqlite3"),
+                        help="SQLite file of cached embeddings")
+    parser.add_argument("--model", help="embedding model (default: EMBEDDING_MODEL)")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    from utils.file_handler import read_file
+
+    with open(args.labels, encoding="utf-8") as f:
+        labels = json.load(f)
+
+    # Documents named in the labeled set, plus the rest of the corpus
+    documents = {}
+    for root, _, files in os.walk(args.corpus):
+        for file_name in sorted(files):
+            path = os.path.join(root, file_name)
+            result = read_file(path) if file_name.lower().endswith((".pdf", ".docx")) else None
+            if result is None and file_name.lower().endswith((".txt", ".md")):
+                with open(path, encoding="utf-8") as f:
+                    result = (f.read(), "text")
+            if result and result[0].strip():
+                documents[os.path.relpath(path, args.corpus).replace(os.sep, "/")] = result[0]
+    if not documents:
+        sys.exit(f"No readable documents in {args.corpus}.")
+
+    matches = []
+    for match in labels.get("matches", []):
+        text = documents.get(match["document"])
+        span = locate_passage(text, match["passage"]) if text else None
+        if span is None:
+            print(f"Skipping match not found in its document: {match['document']}: {match['passage'][:60]!r}")
+            continue
+        matches.append({**match, "span": span})
+    if not matches:
+        sys.exit("No labeled match could be located in the corpus.")
+
+    from utils.embedding import EMBEDDING_MODEL
+    cache = EmbeddingCache(args.cache, args.model or EMBEDDING_MODEL)
+
+    configurations = [(strategy, size, overlap) for strategy in args.strategies
+                      for size in args.chunk_sizes
+                      for overlap in (args.overlaps if strategy == "sentence" else [0])
+                      if overlap < size]
+
+    if "policies" in labels:
+        policies = labels["policies"]
+        embedded, tokens = embed_missing(cache, [policy["content"] for policy in policies])
+        policy_embeddings = cache.get_many([policy["content"] for policy in policies])
+        policy_matrix = np.array([policy_embeddings[policy["content"]] for policy in policies], dtype=np.float32)
+    else:
+        policies, policy_matrix = load_policies_from_db()
+        embedded = tokens = 0
+    if not policies:
+        sys.exit("No policies to retrieve.")
+    policy_matrix = normalized(policy_matrix)
+
+    # Embed every chunk of every configuration once, before anything is timed
+    chunk_texts = [chunk[0] for strategy, size, overlap in configurations
+                   for text in documents.values() for chunk in make_chunks(text, strategy, size, overlap)]
+    chunks_embedded, chunk_tokens = embed_missing(cache, chunk_texts)
+    embedded += chunks_embedded
+    tokens += chunk_tokens
+
+    print(f"{len(documents)} documents, {len(matches)} labeled matches, {len(policies)} policies, "
+          f"{len(configurations) * len(args.top_k)} configurations")
+    print(f"Embedded {embedded} uncached texts ({tokens} tokens); the rest came from {args.cache}\n")
+
+    results = [evaluate(documents, matches, policies, policy_matrix, cache, strategy, size, overlap, top_k)
+               for strategy, size, overlap in configurations for top_k in args.top_k]
+    front = pareto_front(results)
+
+    header = (f"  {'strategy':<9} {'size':>5} {'overlap':>7} {'k':>3} {'recall@k':>9} {'embed tok':>10} "
+              f"{'context tok':>12} {'total tok':>10} {'queries':>8} {'wall s':>7}")
+
+    def row(result, marker):
+        return (f"{marker} {result['strategy']:<9} {result['chunk_size']:>5} {result['overlap']:>7} "
+                f"{result['top_k']:>3} {result['recall']:>9.3f} {result['embedding_tokens']:>10} "
+                f"{result['context_tokens']:>12} {result['total_tokens']:>10} {result['queries']:>8} "
+                f"{result['seconds']:>7.2f}")
+
+    print(header)
+    for result in results:
+        print(row(result, "*" if result in front else " "))
+    print("\nPareto front (recall@k against total tokens and queries):")
+    print(header)
+    for result in sorted(front, key=lambda r: r["total_tokens"]):
+        print(row(result, "*"))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results, "pareto_front": front}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
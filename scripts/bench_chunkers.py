@@ -0,0 +1,130 @@
+"""
+Throughput benchmark: chunk_text (before and after the linear rewrite) and chunk_by_clauses.
+
+Generates a synthetic Turkish contract of the requested size (numbered articles,
+sub-clauses and lettered items), chunks it with each chunker and reports wall
+time, throughput, chunk count, total tokens emitted and how many clauses end up
+split across chunks. The previous chunk_text, which applied the overlap as a
+number of sentences and re-joined the chunk at every boundary, is kept here as
+legacy_chunk_text for comparison; it is skipped above --legacy-max-megabytes (default 0.5).
+
+Usage:
+    python scripts/bench_chunkers.py [--megabytes 2] [--chunk-size 500] [--chunk-overlap 50]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.chunker import chunk_text, chunk_by_clauses, find_clauses, split_into_sentences  # noqa: E402
+from utils.tokenizer import count_tokens  # noqa: E402
+
+SENTENCES = [
+    "Taraflar işbu sözleşmeden doğan yükümlülüklerini eksiksiz ve zamanında yerine getirmeyi kabul eder.",
+    "Satıcı, teslim edilen ürünlerin ayıplı çıkması halinde bedelsiz olarak değiştirmekle yükümlüdür.",
+    "Ödemeler fatura tarihinden itibaren otuz (30) gün içinde banka havalesi ile yapılacaktır.",
+    "Gecikme halinde aylık %2 oranında gecikme faizi uygulanır.",
+    "Taraflardan birinin sözleşmeyi haklı bir sebep olmaksızın feshetmesi halinde cezai şart ödenir.",
+    "Gizli bilgiler, sözleşmenin sona ermesinden sonra da beş (5) yıl süreyle gizli tutulacaktır.",
+    "İşbu sözleşmeden doğacak uyuşmazlıklarda İstanbul Mahkemeleri ve İcra Daireleri yetkilidir.",
+    "Mücbir sebep halleri süresince tarafların yükümlülükleri askıya alınır.",
+]
+
+def make_contract(megabytes: float, seed: int = 0, sentences=None) -> str:
+    """Generate a synthetic contract of roughly the given size, from SENTENCES unless given others."""
+    sentences = sentences or SENTENCES
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    parts = ["HİZMET SÖZLEŞMESİ\n\nİşbu sözleşme aşağıdaki taraflar arasında akdedilmiştir.\n\n"]
+    size = len(parts[0])
+    article = 0
+    while size < target:
+        article += 1
+        block = [f"MADDE {article} - HÜKÜMLER\n"]
+        for sub in range(1, rng.randint(2, 5)):
+            block.append(f"{article}.{sub} " + " ".join(rng.choices(sentences, k=rng.randint(1, 6))) + "\n")
+        if rng.random() < 0.3:
+            for letter in "abc":
+                block.append(f"({letter}) " + rng.choice(sentences) + "\n")
+        block.append("\n")
+        text = "".join(block)
+        parts.append(text)
+        size += len(text.encode("utf-8"))
+    return "".join(parts)
+
+def legacy_chunk_text(text: str, chunk_size: int, chunk_overlap: int):
+    """chunk_text before the rewrite: whitespace word counts, overlap counted in sentences."""
+    sentences = split_into_sentences(text)
+    chunks = []
+    current_chunk = []
+    current_size = 0
+    for sentence in sentences:
+        sentence_tokens = sentence.split()
+        sentence_size = len(sentence_tokens)
+        if sentence_size > chunk_size:
+            if current_chunk:
+                chunks.append(" ".join(current_chunk))
+                current_chunk = []
+                current_size = 0
+            for i in range(0, len(sentence_tokens), chunk_size):
+                chunks.append(" ".join(sentence_tokens[i:i + chunk_size]))
+        elif current_size + sentence_size > chunk_size:
+            chunks.append(" ".join(current_chunk))
+            overlap_start = max(0, len(current_chunk) - chunk_overlap)
+            current_chunk = current_chunk[overlap_start:] + [sentence]
+            current_size = len(" ".join(current_chunk).split())
+        else:
+            current_chunk.append(sentence)
+            current_size += sentence_size
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+    return chunks
+
+def count_split_clauses(text: str, chunk_texts) -> int:
+    """Count clauses whose text is not contained whole in any single chunk."""
+    normalized_chunks = [" ".join(chunk.split()) for chunk in chunk_texts]
+    split = 0
+    for start, end, label in find_clauses(text):
+        clause = " ".join(text[start:end].split())
+        if clause and not any(clause in chunk for chunk in normalized_chunks):
+            split += 1
+    return split
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megabytes", type=float, default=2.0)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    parser.add_argument("--legacy-max-megabytes", type=float, default=0.5,
+                        help="largest contract the quadratic legacy chunker is run on")
+    args = parser.parse_args()
+
+    text = make_contract(args.megabytes)
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    sample = make_contract(0.05, seed=1)
+    print(f"Contract: {size_mb:.2f} MB, {len(find_clauses(text))} clauses\n")
+
+    chunkers = [
+        ("chunk_text (old)", lambda t: legacy_chunk_text(t, args.chunk_size, args.chunk_overlap)),
+        ("chunk_text", lambda t: chunk_text(t, args.chunk_size, args.chunk_overlap)),
+        ("chunk_by_clauses", lambda t: [c["text"] for c in chunk_by_clauses(t, args.chunk_size)]),
+    ]
+
+    print(f"Document tokens: {count_tokens(text)}\n")
+    print(f"{'chunker':<18} {'seconds':>8} {'MB/s':>7} {'chunks':>7} {'tokens':>9} {'split clauses (50 KB sample)':>30}")
+    for name, chunker in chunkers:
+        if name == "chunk_text (old)" and size_mb > args.legacy_max_megabytes:
+            print(f"{name:<18} {'skipped (quadratic; use --megabytes ' + str(args.legacy_max_megabytes) + ')':>40}")
+            continue
+        start = time.perf_counter()
+        chunks = chunker(text)
+        elapsed = time.perf_counter() - start
+        tokens = sum(count_tokens(chunk) for chunk in chunks)
+        split = count_split_clauses(sample, chunker(sample))
+        print(f"{name:<18} {elapsed:>8.2f} {size_mb / elapsed:>7.2f} {len(chunks):>7} {tokens:>9} {split:>30}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark of edit-operation revisions against full regeneration.
+
+Generates a synthetic contract and revisions of it with a growing number of
+word-level changes, expresses each revision as the edit operations the model is
+asked for in REVISION_MODE=edits, and compares the output tokens of the two
+answers: the full revised text and the JSON edits. Output tokens dominate the
+latency and cost of a revision, so the estimated generation time at a fixed
+decoding speed is reported too. Every set of edits is applied with
+edits.apply_edits and checked against the revised text.
+
+Usage:
+    python scripts/bench_edit_revisions.py [--kilobytes 40] [--tokens-per-second 80]
+"""
+import os
+import re
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.edits import segment_text, apply_edits, _locate  # noqa: E402
+from utils.redline import diff_contracts  # noqa: E402
+from utils.tokenizer import count_tokens  # noqa: E402
+from bench_chunkers import make_contract  # noqa: E402
+from bench_redline import make_revision  # noqa: E402
+
+def to_edits(original: str, segments, changes):
+    """
+    Express the changes between two texts as edit operations: each change is widened
+    to whole words, then word by word until its passage is unique in its clause, and
+    changes whose passages overlap are merged.
+    """
+    passages = []  # [clause ID, start, end, changes]
+    for change in changes:
+        start, end = change["original_start"], change["original_end"]
+        clause_id, clause_start, clause_end = next(
+            segment for segment in reversed(segments) if segment[1] <= start)
+        clause_end = max(clause_end, end)
+
+        while start > clause_start and not original[start - 1].isspace():
+            start -= 1
+        while end < clause_end and not original[end].isspace():
+            end += 1
+        while start > clause_start or end < clause_end:
+            if original[start:end].strip() and _locate(original, clause_start, clause_end, original[start:end]):
+                break
+            if start > clause_start:
+                start = max(clause_start, original.rfind(" ", clause_start, start - 1) + 1)
+            if end < clause_end:
+                space = original.find(" ", end + 1, clause_end)
+                end = clause_end if space < 0 else space
+
+        if passages and passages[-1][0] == clause_id and start <= passages[-1][2]:
+            passages[-1][2] = max(passages[-1][2], end)
+            passages[-1][3].append(change)
+        else:
+            passages.append([clause_id, start, end, [change]])
+
+    edits = []
+    for clause_id, start, end, passage_changes in passages:
+        # Replay the passage's changes on its original text; the diff is word-level,
+        # so insertions get separating spaces and doubled spaces are collapsed
+        pieces, position = [], start
+        for change in passage_changes:
+            pieces.append(original[position:change["original_start"]])
+            pieces.append(f" {change['revised']} " if not change["original"] else change["revised"])
+            position = change["original_end"]
+        pieces.append(original[position:end])
+        replacement = re.sub(r" {2,}", " ", "".join(pieces)).strip()
+        edits.append({"clause": clause_id, "original": original[start:end], "replacement": replacement})
+    return edits
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--kilobytes", type=float, default=40)
+    parser.add_argument("--tokens-per-second", type=float, default=80,
+                        help="decoding speed used to estimate generation time")
+    args = parser.parse_args()
+
+    original = make_contract(args.kilobytes / 1024)
+    segments = segment_text(original)
+    full_tokens_original = count_tokens(original)
+    words = re.compile(r"\w+|[^\w\s]")
+    print(f"Contract: {len(original) / 1024:.0f} KB, {full_tokens_original} tokens, {len(segments)} clauses\n")
+    print(f"{'changes':>8} {'edits':>6} {'full tokens':>12} {'edit tokens':>12} {'ratio':>7} "
+          f"{'full s':>7} {'edits s':>8} {'applies':>8}")
+
+    for changes_wanted in (1, 5, 20, 50, 200):
+        revised = make_revision(original, changes_wanted, seed=changes_wanted)
+        changes = diff_contracts(original, revised)
+        edits = to_edits(original, segments, changes)
+        applied = apply_edits(original, segments, edits)
+        applies = applied is not None and words.findall(applied) == words.findall(revised)
+
+        full_tokens = count_tokens(revised)
+        edit_tokens = count_tokens(json.dumps({"edits": edits}, ensure_ascii=False))
+        print(f"{len(changes):>8} {len(edits):>6} {full_tokens:>12} {edit_tokens:>12} "
+              f"{edit_tokens / full_tokens:>7.1%} {full_tokens / args.tokens_per_second:>7.1f} "
+              f"{edit_tokens / args.tokens_per_second:>8.1f} {str(applies):>8}")
+
+if __name__ == "__main__":
+    main()
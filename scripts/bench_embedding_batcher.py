@@ -0,0 +1,102 @@
+"""
+Benchmark for the shared embedding micro-batcher.
+
+Simulates several documents being embedded at once against a stand-in for the
+embeddings endpoint (fixed latency plus a per-text cost; no API calls are made).
+Compares each document calling the endpoint on its own, in batches of 10 as
+get_embeddings_batch does, with all documents going through one EmbeddingBatcher.
+Reports the number of API requests, texts sent and per-document latency.
+
+Usage:
+    python scripts/bench_embedding_batcher.py [--documents 16] [--chunks 40] [--max-wait-ms 20]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embedding_batcher import EmbeddingBatcher  # noqa: E402
+
+class StandInEndpoint:
+    """Counts requests and sleeps like the embeddings endpoint would."""
+
+    def __init__(self, latency: float, per_text: float):
+        self.latency = latency
+        self.per_text = per_text
+        self.requests = 0
+        self.texts = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, texts, model):
+        with self.lock:
+            self.requests += 1
+            self.texts += len(texts)
+        time.sleep(self.latency + self.per_text * len(texts))
+        return [[float(len(text)), 0.0] for text in texts]
+
+def make_documents(documents: int, chunks: int, shared_fraction: float, seed: int = 0):
+    """Generate chunk lists; a fraction of each document is boilerplate shared by all."""
+    rng = random.Random(seed)
+    boilerplate = [f"Standart hüküm {i}: taraflar işbu maddeyi kabul eder." for i in range(chunks)]
+    return [
+        [rng.choice(boilerplate) if rng.random() < shared_fraction else f"Belge {d} özel hüküm {c}."
+         for c in range(chunks)]
+        for d in range(documents)
+    ]
+
+def run(documents, embed_document):
+    """Embed all documents concurrently and return per-document latencies."""
+    def timed(chunks):
+        start = time.perf_counter()
+        embed_document(chunks)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(len(documents)) as pool:
+        return sorted(pool.map(timed, documents))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=16)
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--shared", type=float, default=0.3, help="fraction of boilerplate chunks")
+    parser.add_argument("--max-wait-ms", type=float, default=20)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    documents = make_documents(args.documents, args.chunks, args.shared)
+    latency, per_text = args.latency_ms / 1000, 0.0005
+
+    direct = StandInEndpoint(latency, per_text)
+
+    def embed_directly(chunks):
+        for i in range(0, len(chunks), 10):
+            direct(chunks[i:i + 10], "stand-in")
+
+    direct_latencies = run(documents, embed_directly)
+
+    batched = StandInEndpoint(latency, per_text)
+    batcher = EmbeddingBatcher("stand-in", max_wait=args.max_wait_ms / 1000, embed_function=batched)
+    batched_latencies = run(documents, batcher.embed_many)
+    batcher.close()
+
+    single = StandInEndpoint(latency, per_text)
+    single_batcher = EmbeddingBatcher("stand-in", max_wait=args.max_wait_ms / 1000, embed_function=single)
+    single_latency = run(documents[:1], single_batcher.embed_many)[0]
+    single_batcher.close()
+
+    print(f"{args.documents} documents x {args.chunks} chunks, {args.shared:.0%} shared boilerplate\n")
+    print(f"{'mode':<10} {'requests':>9} {'texts':>7} {'p50 doc s':>10} {'max doc s':>10}")
+    for name, endpoint, latencies in (("direct", direct, direct_latencies),
+                                      ("batcher", batched, batched_latencies)):
+        print(f"{name:<10} {endpoint.requests:>9} {endpoint.texts:>7} "
+              f"{latencies[len(latencies) // 2]:>10.3f} {latencies[-1]:>10.3f}")
+    print(f"\nSingle document through the batcher: {single_latency:.3f} s "
+          f"(one request takes {latency + per_text * args.chunks:.3f} s, max wait {args.max_wait_ms:.0f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark of model routing for section revisions.
+
+Builds revision sections from a synthetic contract, with retrieved policies at
+random distances, and revises them against the local OpenAI stand-in (no API
+calls are made), where the strong model answers --strong-latency-factor times
+slower than the fast one. Compares the current path (every section on the
+strong model, one after another) with routing between the fast and the strong
+tier under their concurrency limits, and reports wall time, sections per tier,
+tokens, estimated cost and sections per second per dollar. A --keyword-share of
+the sections contains a penalty clause (a keyword trigger); the rest are built
+from routine sentences. Checks that every section with a keyword trigger was
+routed to the strong tier.
+
+Usage:
+    python scripts/bench_model_routing.py [--sections 60] [--median-ms 150] [--strong-latency-factor 3]
+                                          [--keyword-share 0.1]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai_standin import start_standin  # noqa: E402
+from bench_chunkers import make_contract, SENTENCES  # noqa: E402
+
+FAST_MODEL = "gpt-4.1-nano"
+STRONG_MODEL = "gpt-4.1"
+
+def make_sections(count: int, keyword_share: float, seed: int = 0):
+    """
+    Clause sections of a synthetic contract, each with 1-4 retrieved policies.
+    A keyword_share of the sections end with a penalty clause.
+    """
+    from utils.chunker import chunk_by_clauses
+    from utils.routing import section_signals
+
+    rng = random.Random(seed)
+    keyword_sentences = [sentence for sentence in SENTENCES if section_signals(sentence, [])["keywords"]]
+    routine_sentences = [sentence for sentence in SENTENCES if sentence not in keyword_sentences]
+    clauses = chunk_by_clauses(make_contract(0.1, seed=seed, sentences=routine_sentences), max_tokens=300)[:count]
+
+    parts, sections, position = [], [], 0
+    for clause in clauses:
+        clause_text = clause["text"]
+        if keyword_sentences and rng.random() < keyword_share:
+            clause_text += " " + rng.choice(keyword_sentences)
+        entries = [{"id": rng.randrange(40), "content": f"Politika {rng.randrange(40)}",
+                    "similarity": rng.uniform(0.1, 0.6)} for _ in range(rng.randint(1, 4))]
+        sections.append((position, position + len(clause_text), entries))
+        parts.append(clause_text + "\n\n")
+        position += len(clause_text) + 2
+    return "".join(parts), sections
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sections", type=int, default=60)
+    parser.add_argument("--median-ms", type=float, default=150)
+    parser.add_argument("--strong-latency-factor", type=float, default=3.0)
+    parser.add_argument("--keyword-share", type=float, default=0.1)
+    args = parser.parse_args()
+
+    _, state, base_url = start_standin(median=args.median_ms / 1000, tail_probability=0.0,
+                                       model_latency_factors={STRONG_MODEL: args.strong_latency_factor})
+
+    # Configure the client before the pipeline modules read the environment
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "stand-in",
+        "RATE_LIMIT_PATH": os.path.join(tempfile.mkdtemp(), "rate_limits.sqlite3"),
+        "REVISION_MODE": "full",  # the stand-in echoes its prompt, which is not valid JSON edits
+        "MODEL_ROUTING": "true",
+        "FAST_CHAT_MODEL": FAST_MODEL,
+        "STRONG_CHAT_MODEL": STRONG_MODEL,
+    })
+    logging.disable(logging.CRITICAL)
+
+    from utils import api, metrics
+    from utils.routing import TIERS, route_section, estimate_cost
+
+    text, sections = make_sections(args.sections, args.keyword_share)
+    decisions = [route_section(text[start:end], entries) for start, end, entries in sections]
+    for (start, end, _), decision in zip(sections, decisions):
+        if decision["signals"]["keywords"]:
+            assert decision["tier"] == "strong", f"keyword section at {start}-{end} was not routed to the strong tier"
+
+    def tokens_by_tier():
+        counters = metrics.snapshot()["counters"]
+        return {tier: (counters.get(f'chat_tokens_total{{kind="prompt",model="{TIERS[tier]["model"]}"}}', 0),
+                       counters.get(f'chat_tokens_total{{kind="completion",model="{TIERS[tier]["model"]}"}}', 0),
+                       counters.get(f'chat_cached_tokens_total{{model="{TIERS[tier]["model"]}"}}', 0))
+                for tier in TIERS}
+
+    def run(name, model):
+        before = tokens_by_tier()
+        started = time.perf_counter()
+        revised = api.revise_sections(text, sections, model)
+        seconds = time.perf_counter() - started
+        assert revised is not None, f"{name}: revision failed"
+        after = tokens_by_tier()
+        cost = 0.0
+        for tier in TIERS:
+            prompt_tokens = after[tier][0] - before[tier][0]
+            completion_tokens = after[tier][1] - before[tier][1]
+            cached_tokens = after[tier][2] - before[tier][2]
+            cost += estimate_cost(tier, prompt_tokens, completion_tokens, cached_tokens) or 0.0
+        routed = {tier: sum(1 for d in decisions if d["tier"] == tier) for tier in TIERS} if model is None \
+            else {"fast": 0, "strong": len(sections)}
+        total_tokens = sum(after[tier][0] + after[tier][1] - before[tier][0] - before[tier][1] for tier in TIERS)
+        print(f"{name:<26} {seconds:>7.2f} {routed['fast']:>5} {routed['strong']:>7} {int(total_tokens):>8} "
+              f"{cost:>9.5f} {len(sections) / seconds / cost if cost else float('inf'):>14.0f}")
+
+    keyword_sections = sum(1 for decision in decisions if decision["signals"]["keywords"])
+    print(f"{len(sections)} sections ({keyword_sections} with keyword triggers), median latency "
+          f"{args.median_ms:.0f} ms, {STRONG_MODEL} {args.strong_latency_factor:g}x slower; "
+          f"concurrency fast {TIERS['fast']['concurrency']}, strong {TIERS['strong']['concurrency']}\n")
+    print(f"{'run':<26} {'wall s':>7} {'fast':>5} {'strong':>7} {'tokens':>8} {'cost $':>9} {'sections/s/$':>14}")
+    run(f"all on {STRONG_MODEL}, sequential", STRONG_MODEL)
+    run("routed", None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark of the parse cache: cold parse against cache hit.
+
+Writes a synthetic contract of the requested size as PDF and DOCX, then reads
+each one in a fresh process twice against an empty parse cache: the first read
+parses the file, the second is served from the cache. Reports the read time of
+each, whether PyPDF2 or python-docx were imported, the size of the cache entry,
+and checks that the cached text and positions equal the parsed ones.
+
+Usage:
+    python scripts/bench_parse_cache.py [--megabytes 1]
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.file_handler import save_as_pdf, save_as_docx  # noqa: E402
+from bench_chunkers import make_contract  # noqa: E402
+
+# Runs in a fresh interpreter so imports and timings start from a clean process
+READ_SCRIPT = """
+import sys, json, time, hashlib, logging
+sys.path.insert(0, {root!r})
+logging.disable(logging.CRITICAL)
+from utils.file_handler import read_file_with_positions
+started = time.perf_counter()
+text, ext, positions = read_file_with_positions({path!r})
+seconds = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": seconds,
+    "imported": [name for name in ("PyPDF2", "docx") if name in sys.modules],
+    "digest": hashlib.sha256(json.dumps([text, positions], sort_keys=True).encode("utf-8")).hexdigest(),
+}}))
+"""
+
+def timed_read(path: str, cache_path: str) -> dict:
+    """Read a file in a new process and return its timing report."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ, PARSE_CACHE="true", PARSE_CACHE_PATH=cache_path)
+    output = subprocess.run([sys.executable, "-c", READ_SCRIPT.format(root=root, path=path)],
+                            env=environment, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megabytes", type=float, default=1)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    text = make_contract(args.megabytes)
+    files = {".pdf": os.path.join(work_dir, "contract.pdf"), ".docx": os.path.join(work_dir, "contract.docx")}
+    save_as_pdf(text, files[".pdf"])
+    save_as_docx(text, files[".docx"])
+
+    print(f"Contract: {len(text) / 1024 / 1024:.2f} MB of text\n")
+    print(f"{'format':<7} {'file MB':>8} {'read':<6} {'seconds':>9} {'imported':<16} {'entry KB':>9}")
+    for ext, path in files.items():
+        cache_path = os.path.join(work_dir, f"parsed{ext}.sqlite3")
+        cold = timed_read(path, cache_path)
+        entry_kb = os.path.getsize(cache_path) / 1024
+        hit = timed_read(path, cache_path)
+        assert hit["digest"] == cold["digest"], f"cached {ext} document differs from the parsed one"
+        for name, report in (("parse", cold), ("hit", hit)):
+            print(f"{ext:<7} {os.path.getsize(path) / 1024 / 1024:>8.2f} {name:<6} {report['seconds']:>9.4f} "
+                  f"{', '.join(report['imported']) or '-':<16} {entry_kb:>9.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark for the redline change report.
+
+Generates a synthetic contract of the requested size, applies random word-level
+edits (insertions, deletions, replacements and a few whole new clauses) and times
+diff_contracts on the pair. The change list is then checked by rebuilding the
+revised text from the original and the changes.
+
+Usage:
+    python scripts/bench_redline.py [--megabytes 1] [--edits 500]
+"""
+import os
+import sys
+import time
+import random
+import re
+import argparse
+import difflib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.redline import diff_contracts  # noqa: E402
+from bench_chunkers import make_contract, SENTENCES  # noqa: E402
+
+def make_revision(text: str, edits: int, seed: int = 0) -> str:
+    """Apply random word-level edits to a text."""
+    rng = random.Random(seed)
+    lines = text.split("\n")
+    for _ in range(edits):
+        number = rng.randrange(len(lines))
+        words = lines[number].split(" ")
+        position = rng.randrange(len(words))
+        action = rng.random()
+        if action < 0.3:
+            words.insert(position, rng.choice(["ancak", "yalnızca", "yazılı", "derhal", "makul"]))
+        elif action < 0.6:
+            del words[position]
+        elif action < 0.95:
+            words[position] = rng.choice(["işbu", "Alıcı", "Satıcı", "on", "beş", "gün"])
+        else:
+            lines.insert(number, rng.choice(SENTENCES))
+            continue
+        lines[number] = " ".join(words)
+    return "\n".join(lines)
+
+def apply_changes(original: str, revised: str, changes) -> str:
+    """Rebuild the revised text (up to whitespace) by replaying the change list on the original."""
+    pieces = []
+    original_position = 0
+    for change in changes:
+        pieces.append(original[original_position:change["original_start"]])
+        pieces.append(f" {change['revised']} ")
+        original_position = change["original_end"]
+    pieces.append(original[original_position:])
+    return "".join(pieces)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megabytes", type=float, default=1.0)
+    parser.add_argument("--edits", type=int, default=500)
+    parser.add_argument("--compare-difflib", action="store_true",
+                        help="also time difflib.SequenceMatcher on the same word lists")
+    args = parser.parse_args()
+
+    original = make_contract(args.megabytes)
+    revised = make_revision(original, args.edits)
+    print(f"Original: {len(original.encode('utf-8')) / (1024 * 1024):.2f} MB, "
+          f"revised: {len(revised.encode('utf-8')) / (1024 * 1024):.2f} MB, {args.edits} edits\n")
+
+    start = time.perf_counter()
+    changes = diff_contracts(original, revised)
+    elapsed = time.perf_counter() - start
+    print(f"diff_contracts: {elapsed:.2f} s, {len(changes)} changes")
+
+    # Whitespace is not compared, so check the rebuilt text token for token
+    rebuilt = apply_changes(original, revised, changes)
+    tokens = re.compile(r"\w+|[^\w\s]")
+    print(f"Change list replays to the revised text: {tokens.findall(rebuilt) == tokens.findall(revised)}")
+
+    if args.compare_difflib:
+        start = time.perf_counter()
+        opcodes = difflib.SequenceMatcher(None, original.split(), revised.split(), autojunk=False).get_opcodes()
+        elapsed = time.perf_counter() - start
+        print(f"difflib:        {elapsed:.2f} s, {sum(tag != 'equal' for tag, *_ in opcodes)} changes")
+
+if __name__ == "__main__":
+    main()
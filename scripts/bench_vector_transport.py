@@ -0,0 +1,97 @@
+"""
+Micro-benchmark: how embeddings are serialized for pgvector.
+
+Compares the previous path (a Python list adapted by psycopg2 to ARRAY[...] and cast
+to vector) with the pgvector text literal adapter and the binary COPY encoding.
+Reports client-side serialization time and bytes per vector. With --database-url,
+it also times server-side parsing of each form via a round trip.
+
+Usage:
+    python scripts/bench_vector_transport.py [--dimensions 1536] [--iterations 2000]
+                                             [--database-url postgresql://...]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from psycopg2.extensions import adapt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.vector import Vector, encode_copy_binary, to_vector_binary  # noqa: E402
+
+def make_embedding(dimensions: int, seed: int = 0) -> list:
+    """Build a unit-length embedding as a list of floats, like the OpenAI API returns."""
+    rng = np.random.default_rng(seed)
+    vector = rng.standard_normal(dimensions).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    # The API returns JSON decimals, which arrive as Python floats
+    return [float(f"{value:.10f}") for value in vector]
+
+def time_call(func, iterations: int) -> float:
+    """Return the mean wall time of func() in microseconds."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def bench_client(embedding: list, iterations: int) -> None:
+    """Benchmark client-side serialization of a single embedding."""
+    array = np.asarray(embedding, dtype=np.float32)
+    cases = [
+        ("list -> ARRAY[...]::vector (previous)", lambda: adapt(embedding).getquoted()),
+        ("list -> Vector text literal", lambda: adapt(Vector(embedding)).getquoted()),
+        ("ndarray -> Vector text literal", lambda: adapt(Vector(array)).getquoted()),
+        ("list -> binary (COPY field)", lambda: to_vector_binary(embedding)),
+        ("ndarray -> binary (COPY field)", lambda: to_vector_binary(array)),
+    ]
+
+    print(f"{'path':<40} {'us/vector':>10} {'bytes':>8}")
+    for name, func in cases:
+        elapsed = time_call(func, iterations)
+        print(f"{name:<40} {elapsed:>10.1f} {len(func()):>8}")
+
+    rows = [("fp", i, "content", array, None, None, None, True) for i in range(1000)]
+    types = ("varchar", "int4", "text", "vector", "varchar", "int4", "int4", "bool")
+    start = time.perf_counter()
+    stream = encode_copy_binary(rows, types)
+    elapsed = (time.perf_counter() - start) * 1e3
+    print(f"\nencode_copy_binary: 1000 rows in {elapsed:.1f} ms, {len(stream.getvalue())} bytes")
+
+def bench_server(embedding: list, iterations: int, database_url: str) -> None:
+    """Benchmark a round trip that makes the server parse the vector."""
+    import psycopg2
+
+    connection = psycopg2.connect(database_url)
+    try:
+        with connection.cursor() as cursor:
+            cases = [
+                ("list -> ARRAY[...]::vector (previous)", embedding),
+                ("Vector text literal", Vector(embedding)),
+            ]
+            print(f"\n{'round trip: SELECT vector_dims(%s::vector)':<45} {'us/query':>10}")
+            for name, value in cases:
+                def run():
+                    cursor.execute("SELECT vector_dims(%s::vector)", (value,))
+                    cursor.fetchone()
+                run()
+                print(f"{name:<45} {time_call(run, iterations):>10.1f}")
+    finally:
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    embedding = make_embedding(args.dimensions)
+    bench_client(embedding, args.iterations)
+
+    if args.database_url:
+        bench_server(embedding, args.iterations, args.database_url)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+End-to-end check of bulk mode against the local OpenAI stand-in.
+
+Starts the stand-in with its files/batches endpoints failing a fraction of batch
+requests (no API calls are made), then runs the embedding and revision phases of
+bulk mode the way an overnight run would:
+
+1. submit without waiting, as if the process were stopped after submitting;
+2. run again, which polls the batches already submitted, collects them and
+   resubmits only the failed requests;
+3. run again once everything succeeded, which sends nothing;
+4. change one input, which resends only that request.
+
+Checks that every result is mapped back to its custom ID, that a job that cannot
+be run returns None rather than a mapping of failures, and reports the number of
+batches and batch requests each step sent.
+
+Usage:
+    python scripts/check_bulk_mode.py [--documents 10] [--chunks 30] [--error-probability 0.2]
+"""
+import os
+import sys
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai_standin import start_standin, embed, chat_response  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--chunks", type=int, default=30)
+    parser.add_argument("--error-probability", type=float, default=0.2)
+    args = parser.parse_args()
+
+    _, state, base_url = start_standin(dimensions=64, batch_delay=0.4,
+                                       batch_error_probability=args.error_probability)
+
+    # Configure the client before the pipeline modules read the environment
+    work_dir = tempfile.mkdtemp()
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "stand-in",
+        "BATCH_POLL_INTERVAL": "0.1",
+        "BATCH_MAX_REQUESTS": "100",
+        "BATCH_MAX_ATTEMPTS": "10",
+    })
+    logging.disable(logging.CRITICAL)
+
+    from utils.batch_api import embed_in_bulk, complete_in_bulk
+
+    texts = {f"doc-{d:03d}:chunk-{c}": f"Belge {d}, madde {c}: taraflar işbu hükmü kabul eder."
+             for d in range(args.documents) for c in range(args.chunks)}
+    prompts = {f"doc-{d:03d}:section-0": [{"role": "system", "content": "Revise."},
+                                           {"role": "user", "content": f"Belge {d} bölüm 0"}]
+               for d in range(args.documents)}
+
+    def submitted():
+        """Batches and requests submitted to the stand-in so far."""
+        return len(state.batches), sum(state.files[batch["input_file_id"]][1].count(b"\n")
+                                       for batch in state.batches.values())
+
+    def step(name, run):
+        batches, requests = submitted()
+        result = run()
+        batches_after, requests_after = submitted()
+        print(f"{name:<44} {batches_after - batches:>8} {requests_after - requests:>9}")
+        return result
+
+    print(f"{len(texts)} chunks and {len(prompts)} prompts, {args.error_probability:.0%} of batch requests fail\n")
+    print(f"{'step':<44} {'batches':>8} {'requests':>9}")
+    pending = step("embed, submit only", lambda: embed_in_bulk(texts, os.path.join(work_dir, "embeddings"), wait=False))
+    assert pending is None, "expected the batches to still be running"
+    embeddings = step("embed, resume and wait",
+                      lambda: embed_in_bulk(texts, os.path.join(work_dir, "embeddings")))
+    step("embed, run again", lambda: embed_in_bulk(texts, os.path.join(work_dir, "embeddings")))
+
+    changed = dict(texts)
+    changed["doc-000:chunk-0"] += " (değişti)"
+    changed_embeddings = step("embed, one chunk changed",
+                              lambda: embed_in_bulk(changed, os.path.join(work_dir, "embeddings")))
+
+    revisions = step("revise", lambda: complete_in_bulk(prompts, os.path.join(work_dir, "revisions")))
+
+    # A job directory that cannot be created is an error, not a set of failed requests
+    blocked_dir = os.path.join(work_dir, "blocked")
+    open(blocked_dir, "w").close()
+    broken = step("revise, job directory unusable", lambda: complete_in_bulk(prompts, blocked_dir))
+    assert broken is None, "expected None from a job that could not be run"
+
+    # Every result must be the stand-in's answer to its own request
+    for custom_id, text in texts.items():
+        assert embeddings[custom_id] == embed(text, 64), f"wrong embedding for {custom_id}"
+    assert changed_embeddings["doc-000:chunk-0"] == embed(changed["doc-000:chunk-0"], 64)
+    for custom_id, messages in prompts.items():
+        expected = chat_response(state, {"messages": messages})["choices"][0]["message"]["content"]
+        assert revisions[custom_id] == expected, f"wrong revision for {custom_id}"
+
+    print(f"\nAll {len(texts)} embeddings and {len(prompts)} revisions mapped back to their custom IDs.")
+
+if __name__ == "__main__":
+    main()
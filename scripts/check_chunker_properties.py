@@ -0,0 +1,103 @@
+"""
+Property checks for the sentence chunker (chunk_by_sentences / chunk_text).
+
+Chunks randomly generated texts (synthetic contracts, long unpunctuated runs,
+many tiny sentences, irregular whitespace) with random chunk sizes and overlaps,
+and checks on every result that:
+
+- each chunk is the exact slice text[start:end], without surrounding whitespace;
+- the chunks cover every non-whitespace character of the text;
+- no chunk exceeds chunk_size tokens;
+- consecutive chunks share at most chunk_overlap tokens;
+- chunks move forward: starts and ends strictly increase.
+
+Exits with status 1 if any check fails.
+
+Usage:
+    python scripts/check_chunker_properties.py [--cases 300] [--seed 0]
+"""
+import os
+import sys
+import random
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.chunker import chunk_by_sentences  # noqa: E402
+from utils.tokenizer import count_tokens  # noqa: E402
+from bench_chunkers import make_contract, SENTENCES  # noqa: E402
+
+WORDS = "taraflar işbu sözleşme ödeme gün içinde yükümlülük fesih gizli bilgi mahkeme yetkili".split()
+
+def random_text(rng: random.Random) -> str:
+    """A text of one of several shapes."""
+    shape = rng.randrange(4)
+    if shape == 0:
+        return make_contract(rng.uniform(0.001, 0.03), seed=rng.randrange(10**6))
+    if shape == 1:
+        # One long sentence without punctuation
+        return " ".join(rng.choices(WORDS, k=rng.randint(1, 3000)))
+    if shape == 2:
+        # Many tiny sentences
+        return " ".join(rng.choice(WORDS).capitalize() + "." for _ in range(rng.randint(1, 2000)))
+    # Sentences separated by irregular whitespace
+    separators = [" ", "  ", "\n", "\n\n", "\t", " \n "]
+    return rng.choice(separators).join(
+        rng.choice(SENTENCES) + rng.choice(separators) for _ in range(rng.randint(0, 300))
+    )
+
+def check(text: str, chunk_size: int, chunk_overlap: int):
+    """Return a list of property violations for one chunking."""
+    chunks = chunk_by_sentences(text, chunk_size, chunk_overlap)
+    problems = []
+
+    for number, chunk in enumerate(chunks):
+        if chunk["text"] != text[chunk["start"]:chunk["end"]]:
+            problems.append(f"chunk {number} is not text[start:end]")
+        if not chunk["text"].strip() or chunk["text"] != chunk["text"].strip():
+            problems.append(f"chunk {number} is blank or has surrounding whitespace")
+        tokens = count_tokens(chunk["text"])
+        if tokens > chunk_size:
+            problems.append(f"chunk {number} has {tokens} tokens > {chunk_size}")
+
+    for number, (previous, following) in enumerate(zip(chunks, chunks[1:]), 1):
+        if not (following["start"] > previous["start"] and following["end"] > previous["end"]):
+            problems.append(f"chunk {number} does not move forward")
+        shared = count_tokens(text[following["start"]:previous["end"]]) if following["start"] < previous["end"] else 0
+        if shared > chunk_overlap:
+            problems.append(f"chunks {number - 1} and {number} share {shared} tokens > {chunk_overlap}")
+
+    covered = [False] * len(text)
+    for chunk in chunks:
+        covered[chunk["start"]:chunk["end"]] = [True] * (chunk["end"] - chunk["start"])
+    missing = sum(1 for character, inside in zip(text, covered) if not inside and not character.isspace())
+    if missing:
+        problems.append(f"{missing} non-whitespace characters are in no chunk")
+
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    rng = random.Random(args.seed)
+    failures = 0
+    for case in range(args.cases):
+        text = random_text(rng)
+        chunk_size = rng.randint(8, 800)
+        chunk_overlap = rng.randint(0, chunk_size - 1)
+        problems = check(text, chunk_size, chunk_overlap)
+        if problems:
+            failures += 1
+            print(f"case {case}: {len(text)} characters, chunk_size={chunk_size}, "
+                  f"chunk_overlap={chunk_overlap}: {'; '.join(problems[:3])}")
+
+    print(f"{args.cases - failures} of {args.cases} cases passed.")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
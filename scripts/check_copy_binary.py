@@ -0,0 +1,132 @@
+"""
+Check of the binary COPY encoding used by bulk_insert_entries.
+
+Encodes rows covering every supported column type, NULL fields included, and
+compares the stream with byte strings written out by hand from the PostgreSQL
+binary COPY format: the signature and header, the per-row field count, each
+length-prefixed field (jsonb with its version byte, vectors in pgvector's binary
+layout) and the trailer. Then runs bulk_insert_entries against a fake connection
+whose knowledge_base reports meta_info as jsonb, and checks that the COPY stream
+it sends encodes meta_info as jsonb. No database is needed.
+
+Exits with status 1 if any check fails.
+
+Usage:
+    python scripts/check_copy_binary.py
+"""
+import os
+import sys
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db  # noqa: E402
+from utils.vector import encode_copy_binary  # noqa: E402
+
+HEADER = b"PGCOPY\n\xff\r\n\x00" + b"\x00\x00\x00\x00" + b"\x00\x00\x00\x00"
+TRAILER = b"\xff\xff"
+NULL = b"\xff\xff\xff\xff"
+
+# One row per case: (name, values, column types, expected row bytes after the field count)
+CASES = [
+    ("varchar, int4, NULL text, bool",
+     ["ab", 7, None, True], ["varchar", "int4", "text", "bool"],
+     b"\x00\x00\x00\x02ab" + b"\x00\x00\x00\x04\x00\x00\x00\x07" + NULL + b"\x00\x00\x00\x01\x01"),
+    ("jsonb object, json string, NULL jsonb",
+     [{"a": 1}, "ş", None], ["jsonb", "json", "jsonb"],
+     b"\x00\x00\x00\x09\x01{\"a\": 1}" + b"\x00\x00\x00\x04\"\xc5\x9f\"" + NULL),
+    ("vector, int8, bool false",
+     [[1.0, -2.0], 5, False], ["vector", "int8", "bool"],
+     b"\x00\x00\x00\x0c" + b"\x00\x02\x00\x00" + b"\x3f\x80\x00\x00" + b"\xc0\x00\x00\x00"
+     + b"\x00\x00\x00\x08" + b"\x00\x00\x00\x00\x00\x00\x00\x05" + b"\x00\x00\x00\x01\x00"),
+]
+
+class FakeCursor:
+    """Answers the column type lookup and keeps the COPY stream."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        self.result = [(name, pg_type) for name, pg_type in self.connection.table_types.items()
+                       if name in params[1]]
+
+    def fetchall(self):
+        return self.result
+
+    def copy_expert(self, sql, stream):
+        self.connection.copies.append((sql, stream.getvalue()))
+        self.rowcount = 1
+
+class FakeConnection:
+    def __init__(self, table_types):
+        self.table_types = table_types
+        self.copies = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+def main():
+    logging.disable(logging.CRITICAL)
+    failures = []
+
+    for name, values, types, expected_row in CASES:
+        expected = HEADER + len(types).to_bytes(2, "big") + expected_row + TRAILER
+        actual = encode_copy_binary([values], types).getvalue()
+        if actual != expected:
+            failures.append(f"{name}: expected {expected!r}, got {actual!r}")
+        print(f"{'ok' if actual == expected else 'FAILED':<7} {name}")
+
+    for name, rows, types in (("row of the wrong length", [[1]], ["int4", "int4"]),
+                              ("unsupported type", [[1.5]], ["float8"])):
+        try:
+            encode_copy_binary(rows, types)
+            failures.append(f"{name}: no ValueError raised")
+            print(f"{'FAILED':<7} {name} is rejected")
+        except ValueError:
+            print(f"{'ok':<7} {name} is rejected")
+
+    # bulk_insert_entries encodes each column with the table's own type
+    table_types = dict(db.KNOWLEDGE_BASE_COPY_COLUMNS, meta_info="jsonb")
+    connection = FakeConnection(table_types)
+    original_connect = db.get_db_connection
+    db.get_db_connection = lambda: connection
+    try:
+        entry = {"fp": "f", "chunk_index": 0, "content": "c", "embedding": [1.0, -2.0],
+                 "meta_info": {"source": "policy"}, "file_id": 1, "organization_id": 2}
+        db.bulk_insert_entries([entry])
+    finally:
+        db.get_db_connection = original_connect
+
+    columns = [name for name, _ in db.KNOWLEDGE_BASE_COPY_COLUMNS]
+    expected = encode_copy_binary([[entry.get(name, True) for name in columns]],
+                                  [table_types[name] for name in columns]).getvalue()
+    sent = connection.copies[0][1] if connection.copies else b""
+    jsonb_field = b"\x00\x00\x00\x15\x01{\"source\": \"policy\"}"
+    ok = sent == expected and jsonb_field in sent
+    if not ok:
+        failures.append(f"bulk_insert_entries: sent {sent!r}")
+    print(f"{'ok' if ok else 'FAILED':<7} bulk_insert_entries encodes meta_info as the table's jsonb")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
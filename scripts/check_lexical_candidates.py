@@ -0,0 +1,119 @@
+"""
+Check that hybrid search's full-text candidate count stays bounded.
+
+Samples knowledge base contents as query texts and counts the entries each one
+matches in content_tsv, once with the rarest-lexeme query hybrid search uses and
+once with an OR of every lexeme of the text. The rarest-lexeme count may not
+exceed the sum of the document frequencies of the lexemes it chose. Needs
+DATABASE_URL and a knowledge base set up with enable_full_text_search().
+
+Exits with status 1 if any count exceeds its bound or knowledge_base_lexemes is missing.
+
+Usage:
+    python scripts/check_lexical_candidates.py [--queries 100] [--max-lexemes 8]
+"""
+import os
+import sys
+import argparse
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import (  # noqa: E402
+    get_db_connection, RAREST_LEXEMES_QUERY, HYBRID_MAX_LEXEMES, TEXT_SEARCH_CONFIG,
+)
+
+# Matches of a tsquery among knowledge base entries
+MATCH_COUNT_QUERY = """
+    SELECT count(*) FROM knowledge_base
+    WHERE is_knowledge_base = TRUE AND content_tsv @@ %(tsq)s::tsquery;
+"""
+
+# Every lexeme of the text OR-ed together
+ALL_LEXEMES_QUERY = """
+    SELECT replace(plainto_tsquery(%(config)s::regconfig, %(query_text)s)::text, '&', '|')::tsquery AS tsq
+"""
+
+# Sum of the document frequencies of the lexemes in a tsquery
+BOUND_QUERY = """
+    SELECT coalesce(sum(stats.ndoc), 0)
+    FROM knowledge_base_lexemes stats
+    WHERE stats.word = ANY(tsvector_to_array(%(tsq)s::text::tsvector));
+"""
+
+def sample_query_texts(connection, count: int) -> List[str]:
+    """Sample contents from the knowledge base to use as query texts."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT content FROM knowledge_base "
+            "WHERE is_knowledge_base = TRUE AND content IS NOT NULL "
+            "ORDER BY random() LIMIT %s;",
+            (count,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+def count_matches(cursor, tsquery_sql: str, params: dict):
+    """Build a tsquery with the given query and return (tsquery text, entries it matches)."""
+    cursor.execute(tsquery_sql, params)
+    tsq = cursor.fetchone()[0]
+    cursor.execute(MATCH_COUNT_QUERY, {"tsq": tsq})
+    return tsq, cursor.fetchone()[0]
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Return the given percentile of a list of values."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--max-lexemes", type=int, default=HYBRID_MAX_LEXEMES)
+    args = parser.parse_args()
+
+    connection = get_db_connection()
+    if not connection:
+        sys.exit("Could not connect to the database.")
+
+    failures = []
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('knowledge_base_lexemes') IS NOT NULL;")
+            if not cursor.fetchone()[0]:
+                print("FAILED: knowledge_base_lexemes is missing; run enable_full_text_search() first")
+                sys.exit(1)
+            cursor.execute("SELECT count(*) FROM knowledge_base WHERE is_knowledge_base = TRUE;")
+            table_size = cursor.fetchone()[0]
+
+        texts = sample_query_texts(connection, args.queries)
+        if not texts:
+            sys.exit("The knowledge base has no contents to sample.")
+
+        all_counts, rarest_counts = [], []
+        with connection.cursor() as cursor:
+            for index, text in enumerate(texts):
+                params = {"config": TEXT_SEARCH_CONFIG, "query_text": text,
+                          "max_lexemes": args.max_lexemes}
+                _, all_count = count_matches(cursor, ALL_LEXEMES_QUERY, params)
+                tsq, rarest_count = count_matches(cursor, RAREST_LEXEMES_QUERY, params)
+                cursor.execute(BOUND_QUERY, {"tsq": tsq})
+                bound = cursor.fetchone()[0]
+                if rarest_count > bound:
+                    failures.append(f"query {index}: {rarest_count} matches, bound {bound} ({tsq})")
+                all_counts.append(all_count)
+                rarest_counts.append(rarest_count)
+    finally:
+        connection.close()
+
+    print(f"{len(texts)} queries, {table_size} knowledge base entries, "
+          f"{args.max_lexemes} lexemes per query\n")
+    print(f"{'query':<14} {'mean':>8} {'p95':>8} {'max':>8} {'max share':>10}")
+    for name, counts in (("all lexemes", all_counts), ("rarest", rarest_counts)):
+        print(f"{name:<14} {sum(counts) / len(counts):>8.1f} {percentile(counts, 0.95):>8} "
+              f"{max(counts):>8} {max(counts) / max(table_size, 1):>10.1%}")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Check of the prefix-cache prompt layout against the local OpenAI stand-in.
+
+Revises sections of a synthetic contract that share a few policy sets, each
+retrieved in a different order and at different distances, with
+PROMPT_LAYOUT=standard and with PROMPT_LAYOUT=prefix_cache (no API calls are
+made). The stand-in reports cached prompt tokens the way provider-side prefix
+caching does. Checks that, with the prefix-cache layout, every request sharing a
+policy set starts with byte-identical system and policy messages, both as built
+and as received by the stand-in, and reports prompt, cached and billed input
+tokens for each layout.
+
+Exits with status 1 if any check fails.
+
+Usage:
+    python scripts/check_prompt_prefix_cache.py [--sections 24] [--policy-sets 3]
+"""
+import os
+import sys
+import json
+import random
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai_standin import start_standin  # noqa: E402
+from bench_chunkers import make_contract, SENTENCES  # noqa: E402
+
+POLICIES_PER_SET = 10
+
+def make_policies(count: int, rng: random.Random):
+    """Knowledge base entries of one to two hundred words each."""
+    return [{"id": number, "meta_info": f"policy-{number}",
+             "content": f"Politika {number}: " + " ".join(rng.choices(SENTENCES, k=rng.randint(8, 14)))}
+            for number in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sections", type=int, default=24)
+    parser.add_argument("--policy-sets", type=int, default=3)
+    args = parser.parse_args()
+
+    _, state, base_url = start_standin(median=0.01, tail_probability=0.0)
+
+    # Configure the client before the pipeline modules read the environment
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "stand-in",
+        "RATE_LIMIT_PATH": os.path.join(tempfile.mkdtemp(), "rate_limits.sqlite3"),
+        "REVISION_MODE": "full",  # the stand-in echoes its prompt, which is not valid JSON edits
+    })
+    logging.disable(logging.CRITICAL)
+
+    from utils import api
+    from utils.chunker import chunk_by_clauses
+    from utils.routing import MODEL_PRICES, CACHED_INPUT_PRICE_FACTOR
+
+    rng = random.Random(0)
+    policies = make_policies(40, rng)
+    policy_sets = [rng.sample(policies, POLICIES_PER_SET) for _ in range(args.policy_sets)]
+    text = make_contract(0.1)
+    clauses = chunk_by_clauses(text, max_tokens=300)[:args.sections]
+
+    # Each section gets one of the policy sets, shuffled and at its own distances
+    calls = []
+    for number, clause in enumerate(clauses):
+        entries = [dict(entry, similarity=rng.uniform(0.1, 0.6)) for entry in policy_sets[number % args.policy_sets]]
+        rng.shuffle(entries)
+        calls.append((number % args.policy_sets, clause["text"], entries))
+
+    input_price = MODEL_PRICES[api.CHAT_MODEL][0] if api.CHAT_MODEL in MODEL_PRICES else 0.0
+    failures = []
+    print(f"{len(calls)} sections sharing {args.policy_sets} policy sets of {POLICIES_PER_SET} policies\n")
+    print(f"{'layout':<13} {'prefixes':>9} {'prompt tok':>11} {'cached tok':>11} {'cached':>7} {'input $':>9}")
+
+    for layout in ("standard", "prefix_cache"):
+        api.PROMPT_LAYOUT = layout
+        state.prompts = []
+
+        # The prefix (system and policy messages) of every prompt, per policy set
+        prefixes = {}
+        for policy_set, section_text, entries in calls:
+            messages = api.create_section_revision_prompt(section_text, [entries])
+            prefix = json.dumps(messages[:2], ensure_ascii=False).encode("utf-8")
+            prefixes.setdefault(policy_set, set()).add(prefix)
+        identical = all(len(group) == 1 for group in prefixes.values())
+
+        with api.track_usage() as usage:
+            for _, section_text, entries in calls:
+                if api.revise_section(section_text, [entries]) is None:
+                    failures.append(f"{layout}: revision request failed")
+
+        # The stand-in saw the same prefixes on the wire
+        if layout == "prefix_cache":
+            received = {}
+            for (policy_set, _, _), prompt in zip(calls, state.prompts):
+                received.setdefault(policy_set, set()).add(prompt[:prompt.index("<user>", prompt.index("<user>") + 1)])
+            if not identical or not all(len(group) == 1 for group in received.values()):
+                failures.append("prefix_cache: prompts sharing a policy set have different prefixes")
+            if not usage["cached_tokens"]:
+                failures.append("prefix_cache: no prompt tokens were served from the cache")
+
+        billed = (usage["prompt_tokens"] - usage["cached_tokens"]
+                  + usage["cached_tokens"] * CACHED_INPUT_PRICE_FACTOR) * input_price / 1e6
+        share = usage["cached_tokens"] / usage["prompt_tokens"] if usage["prompt_tokens"] else 0.0
+        print(f"{layout:<13} {'identical' if identical else 'differ':>9} {usage['prompt_tokens']:>11} "
+              f"{usage['cached_tokens']:>11} {share:>7.1%} {billed:>9.5f}")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Local stand-in for the OpenAI endpoints used by the pipeline.
+
+Serves /v1/chat/completions and /v1/embeddings with a configurable long-tail
+latency (optionally scaled per model) and x-ratelimit-* headers, so the client-side machinery (rate limiting,
+hedging, circuit breaking) can be exercised without an API key or network access.
+Chat completions echo the last user message and report cached prompt tokens the
+way provider-side prefix caching would; embeddings are deterministic
+pseudo-random unit vectors derived from each input.
+
+The /v1/files and /v1/batches endpoints accept JSONL batch files and run them in
+the background after a configurable delay, failing a configurable fraction of the
+requests, so bulk mode can be exercised the same way.
+
+Point the client at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Usage:
+    python scripts/openai_standin.py [--port 8765] [--median-ms 200] [--tail-probability 0.05]
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Recent prompts compared for the prefix cache simulation
+PROMPT_CACHE_SIZE = 256
+
+class StandInState:
+    """Latency model and request counters shared by all handler threads."""
+
+    def __init__(self, median: float = 0.2, tail_probability: float = 0.05, tail_factor: float = 10.0,
+                 error_probability: float = 0.0, dimensions: int = 1536, seed: int = 0,
+                 batch_delay: float = 1.0, batch_error_probability: float = 0.0,
+                 model_latency_factors: dict = None):
+        self.median = median
+        self.tail_probability = tail_probability
+        self.tail_factor = tail_factor
+        self.error_probability = error_probability
+        self.dimensions = dimensions
+        self.batch_delay = batch_delay
+        self.batch_error_probability = batch_error_probability
+        self.model_latency_factors = model_latency_factors or {}  # model -> latency multiplier
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.files = {}    # file id -> (purpose, content)
+        self.batches = {}  # batch id -> batch object
+        self.batch_requests = 0
+        self.prompts = []  # serialized prompts of recent chat requests, for prefix caching
+
+    def latency(self) -> float:
+        """Draw a latency: lognormal around the median, with an occasional slow tail."""
+        with self.lock:
+            self.requests += 1
+            latency = self.median * self.random.lognormvariate(0, 0.25)
+            if self.random.random() < self.tail_probability:
+                latency *= self.tail_factor
+            fail = self.random.random() < self.error_probability
+        return -latency if fail else latency
+
+def embed(text: str, dimensions: int):
+    """A deterministic unit vector for a text."""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+def _common_prefix_length(a: str, b: str) -> int:
+    """Length of the longest common prefix of two strings (binary search on slices)."""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def cached_prompt_tokens(state: StandInState, prompt: str) -> int:
+    """
+    Simulate provider-side prefix caching: the longest prefix shared with a recent
+    prompt is cached, counted in words, for prompts of at least 1024 words and in
+    increments of 128, as OpenAI does with tokens.
+    """
+    with state.lock:
+        shared = max((_common_prefix_length(prompt, previous) for previous in state.prompts), default=0)
+        state.prompts = (state.prompts + [prompt])[-PROMPT_CACHE_SIZE:]
+    if len(prompt.split()) < 1024:
+        return 0
+    return len(prompt[:shared].split()) // 128 * 128
+
+def chat_response(state: StandInState, body: dict) -> dict:
+    """A chat completion echoing the last user message."""
+    messages = body.get("messages", [])
+    content = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    prompt = "".join(f"<{m['role']}>{m['content']}" for m in messages)
+    prompt_tokens = len(prompt.split())
+    return {
+        "id": f"chatcmpl-{state.requests}", "object": "chat.completion", "created": int(time.time()),
+        "model": body.get("model", ""),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content.split()),
+                  "total_tokens": prompt_tokens + len(content.split()),
+                  "prompt_tokens_details": {"cached_tokens": cached_prompt_tokens(state, prompt)}},
+    }
+
+def embedding_response(state: StandInState, body: dict) -> dict:
+    """An embedding list with one vector per input."""
+    inputs = body.get("input", [])
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    return {
+        "object": "list", "model": body.get("model", ""),
+        "data": [{"object": "embedding", "index": i, "embedding": embed(text, state.dimensions)}
+                 for i, text in enumerate(inputs)],
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+def store_file(state: StandInState, purpose: str, content: bytes) -> dict:
+    """Keep a file and return its file object."""
+    with state.lock:
+        file_id = f"file-{len(state.files) + 1}"
+        state.files[file_id] = (purpose, content)
+    return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+            "filename": f"{file_id}.jsonl", "purpose": purpose, "status": "processed"}
+
+def run_batch(state: StandInState, batch_id: str) -> None:
+    """Answer every request of a batch after the configured delay."""
+    batch = state.batches[batch_id]
+    time.sleep(state.batch_delay / 2)
+    batch["status"] = "in_progress"
+    batch["in_progress_at"] = int(time.time())
+
+    lines = [line for line in state.files[batch["input_file_id"]][1].decode("utf-8").splitlines() if line.strip()]
+    outputs, errors = [], []
+    for number, line in enumerate(lines):
+        request = json.loads(line)
+        with state.lock:
+            state.batch_requests += 1
+            fail = state.random.random() < state.batch_error_probability
+        item = {"id": f"batch_req_{batch_id}_{number}", "custom_id": request["custom_id"]}
+        if fail:
+            item["response"] = {"status_code": 500, "request_id": f"req_{number}",
+                                "body": {"error": {"message": "stand-in failure", "type": "server_error"}}}
+            item["error"] = None
+            errors.append(item)
+        else:
+            make_body = chat_response if request["url"].endswith("/chat/completions") else embedding_response
+            item["response"] = {"status_code": 200, "request_id": f"req_{number}",
+                                "body": make_body(state, request["body"])}
+            item["error"] = None
+            outputs.append(item)
+        batch["request_counts"] = {"total": len(lines), "completed": len(outputs), "failed": len(errors)}
+
+    time.sleep(state.batch_delay / 2)
+    if outputs:
+        batch["output_file_id"] = store_file(state, "batch_output",
+                                             "".join(json.dumps(item) + "\n" for item in outputs).encode("utf-8"))["id"]
+    if errors:
+        batch["error_file_id"] = store_file(state, "batch_output",
+                                            "".join(json.dumps(item) + "\n" for item in errors).encode("utf-8"))["id"]
+    batch["status"] = "completed"
+    batch["completed_at"] = int(time.time())
+
+def make_handler(state: StandInState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, body: dict):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("x-ratelimit-limit-requests", "10000")
+            self.send_header("x-ratelimit-remaining-requests", "9999")
+            self.send_header("x-ratelimit-limit-tokens", "10000000")
+            self.send_header("x-ratelimit-remaining-tokens", "9990000")
+            self.send_header("x-ratelimit-reset-requests", "6ms")
+            self.send_header("x-ratelimit-reset-tokens", "60ms")
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client cancelled the request (e.g. a losing hedge)
+
+        def read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path.startswith("/v1/files/") and path.endswith("/content"):
+                file_id = path[len("/v1/files/"):-len("/content")]
+                if file_id not in state.files:
+                    self.send_json(404, {"error": {"message": f"no file {file_id}", "type": "not_found"}})
+                    return
+                data = state.files[file_id][1]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            elif path.startswith("/v1/batches/"):
+                batch = state.batches.get(path[len("/v1/batches/"):])
+                if batch is None:
+                    self.send_json(404, {"error": {"message": "no such batch", "type": "not_found"}})
+                else:
+                    self.send_json(200, batch)
+            else:
+                self.send_json(404, {"error": {"message": f"unknown path {self.path}", "type": "not_found"}})
+
+        def upload_file(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("latin1") + self.rfile.read(length))
+            fields = {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                      for part in message.iter_parts()}
+            self.send_json(200, store_file(state, fields.get("purpose", b"").decode("utf-8"), fields.get("file", b"")))
+
+        def create_batch(self):
+            body = self.read_json()
+            if body.get("input_file_id") not in state.files:
+                self.send_json(400, {"error": {"message": "unknown input_file_id", "type": "invalid_request_error"}})
+                return
+            with state.lock:
+                batch_id = f"batch_{len(state.batches) + 1}"
+                state.batches[batch_id] = {
+                    "id": batch_id, "object": "batch", "endpoint": body["endpoint"],
+                    "input_file_id": body["input_file_id"], "completion_window": body["completion_window"],
+                    "status": "validating", "created_at": int(time.time()),
+                    "output_file_id": None, "error_file_id": None,
+                    "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                }
+            threading.Thread(target=run_batch, args=(state, batch_id), daemon=True).start()
+            self.send_json(200, state.batches[batch_id])
+
+        def do_POST(self):
+            if self.path.endswith("/files"):
+                self.upload_file()
+                return
+            if self.path.endswith("/batches"):
+                self.create_batch()
+                return
+
+            body = self.read_json()
+            latency = state.latency() * state.model_latency_factors.get(body.get("model"), 1.0)
+            time.sleep(abs(latency))
+            if latency < 0:
+                self.send_json(500, {"error": {"message": "stand-in failure", "type": "server_error"}})
+                return
+
+            if self.path.endswith("/chat/completions"):
+                self.send_json(200, chat_response(state, body))
+            elif self.path.endswith("/embeddings"):
+                self.send_json(200, embedding_response(state, body))
+            else:
+                self.send_json(404, {"error": {"message": f"unknown path {self.path}", "type": "not_found"}})
+
+    return Handler
+
+def start_standin(port: int = 0, **options):
+    """
+    Start the stand-in server on a background thread.
+
+    Args:
+        port: Port to listen on; 0 picks a free one.
+        **options: StandInState options.
+
+    Returns:
+        (server, state, base_url)
+    """
+    state = StandInState(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--median-ms", type=float, default=200)
+    parser.add_argument("--tail-probability", type=float, default=0.05)
+    parser.add_argument("--tail-factor", type=float, default=10.0)
+    parser.add_argument("--error-probability", type=float, default=0.0)
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="seconds a batch takes")
+    parser.add_argument("--batch-error-probability", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, _, base_url = start_standin(args.port, median=args.median_ms / 1000,
+                                        tail_probability=args.tail_probability, tail_factor=args.tail_factor,
+                                        error_probability=args.error_probability, batch_delay=args.batch_delay,
+                                        batch_error_probability=args.batch_error_probability)
+    print(f"Stand-in OpenAI API listening at {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Recall@k report for two-stage search modes against exact search.
+
+Samples embeddings from knowledge_base as queries, runs the exact search as ground
+truth, then each two-stage search mode (quantized or matryoshka) at several rerank factors, and reports
+recall@k and latency for every configuration.
+
+Usage:
+    python scripts/report_search_recall.py [--queries 200] [--top-k 5]
+                                           [--modes halfvec binary matryoshka] [--factors 1 2 4 8 16]
+"""
+import os
+import sys
+import time
+import argparse
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import get_db_connection, find_similar_entries  # noqa: E402
+from utils.vector import from_vector_text  # noqa: E402
+
+def sample_query_embeddings(connection, count: int) -> List:
+    """Sample embeddings from the knowledge base to use as queries."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT embedding::text FROM knowledge_base "
+            "WHERE is_knowledge_base = TRUE AND embedding IS NOT NULL "
+            "ORDER BY random() LIMIT %s;",
+            (count,)
+        )
+        return [from_vector_text(row[0]) for row in cursor.fetchall()]
+
+def run_searches(connection, queries: List, top_k: int, mode: str, factor: int):
+    """Run one search per query and return (result id lists, latencies in ms)."""
+    ids, latencies = [], []
+    for embedding in queries:
+        start = time.perf_counter()
+        entries = find_similar_entries(embedding, top_k, connection=connection,
+                                       search_mode=mode, rerank_factor=factor)
+        latencies.append((time.perf_counter() - start) * 1e3)
+        ids.append([entry["id"] for entry in entries])
+    return ids, latencies
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Return the given percentile of a list of values."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--modes", nargs="+", default=["halfvec", "binary"])
+    parser.add_argument("--factors", nargs="+", type=int, default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    connection = get_db_connection()
+    if not connection:
+        sys.exit("Could not connect to the database.")
+
+    try:
+        queries = sample_query_embeddings(connection, args.queries)
+        if not queries:
+            sys.exit("The knowledge base has no embeddings to sample.")
+
+        exact_ids, exact_latencies = run_searches(connection, queries, args.top_k, "exact", 1)
+
+        print(f"{len(queries)} queries, k={args.top_k}\n")
+        print(f"{'mode':<10} {'factor':>6} {'recall@k':>9} {'mean ms':>8} {'p95 ms':>8}")
+        print(f"{'exact':<10} {'-':>6} {1.0:>9.3f} "
+              f"{sum(exact_latencies) / len(exact_latencies):>8.2f} {percentile(exact_latencies, 0.95):>8.2f}")
+
+        for mode in args.modes:
+            for factor in args.factors:
+                ids, latencies = run_searches(connection, queries, args.top_k, mode, factor)
+                hits = sum(len(set(found) & set(truth)) for found, truth in zip(ids, exact_ids))
+                total = sum(len(truth) for truth in exact_ids) or 1
+                print(f"{mode:<10} {factor:>6} {hits / total:>9.3f} "
+                      f"{sum(latencies) / len(latencies):>8.2f} {percentile(latencies, 0.95):>8.2f}")
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    main()
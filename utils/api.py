@@ -4,10 +4,19 @@ OpenAI API integration module for chat completions.
 import os
 import time
 import logging
-from typing import List, Dict, Any, Optional, Union
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Any, Optional, Tuple, Union
 import openai
 from dotenv import load_dotenv
-from system_prompt import SYSTEM_PROMPT
+from system_prompt import SYSTEM_PROMPT, EDIT_SYSTEM_PROMPT
+from utils.tokenizer import count_tokens
+from utils.rate_limiter import before_request, after_response, after_rate_limit_error
+from utils.circuit_breaker import CircuitBreaker
+from utils.edits import segment_text, format_segments, parse_edits, apply_edits
+from utils.routing import MODEL_ROUTING, TIERS, route_section, estimate_cost
+from utils import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -36,29 +45,98 @@ if not OPENAI_API_KEY:
 # Chat model to use
 CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4.1-nano")
 
+# Sampling settings of every revision request
+CHAT_TEMPERATURE = 0.2  # Lower temperature for more consistent output
+CHAT_MAX_TOKENS = 8000  # Adjust as needed for your contract size
+
+# How sections are revised: "full" asks for the whole revised section; "edits" asks for
+# edit operations and applies them locally, falling back to "full" when they do not apply cleanly
+REVISION_MODE = os.getenv("REVISION_MODE", "full").lower()
+
+# Prompt layout: "standard" puts the contract before the policies in one user message;
+# "prefix_cache" sends the system prompt, then the policies in canonical order, then the
+# contract last, so calls sharing policies share a prompt prefix the provider can cache
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "standard").lower()
+
+# Hedging: when a chat request is slower than the recent HEDGE_PERCENTILE latency
+# (but at least HEDGE_MIN_DELAY seconds), send a duplicate and keep the first answer
+CHAT_HEDGING = os.getenv("CHAT_HEDGING", "false").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "2"))
+
+# Latency samples needed before the percentile is trusted; no hedging until then
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "5"))
+
 # Initialize OpenAI client
 client = openai.OpenAI(api_key=OPENAI_API_KEY)
 
-def create_contract_revision_prompt(contract_chunks: List[str], knowledge_entries: List[List[Dict[str, Any]]]) -> List[Dict[str, str]]:
+# One circuit breaker per chat model
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+def _get_circuit_breaker(model: str) -> CircuitBreaker:
+    """Return the circuit breaker of a chat model, creating it on first use."""
+    with _circuit_breakers_lock:
+        if model not in _circuit_breakers:
+            _circuit_breakers[model] = CircuitBreaker(f"chat:{model}")
+        return _circuit_breakers[model]
+
+# Token usage of the chat requests made by the current thread, while tracked
+_usage = threading.local()
+
+@contextmanager
+def track_usage() -> Iterator[Dict[str, int]]:
     """
-    Create a prompt for contract revision using contract chunks and knowledge base entries.
+    Count the tokens billed for the chat requests made by the current thread.
+    
+    Blocks may be nested; the counts of an inner block are added to the outer one.
+    
+    Yields:
+        A dictionary with the keys prompt_tokens, cached_tokens (prompt tokens served
+        from the provider's prompt cache) and completion_tokens, updated after every
+        answered request until the block exits.
+    """
+    usage = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+    previous = getattr(_usage, "current", None)
+    _usage.current = usage
+    try:
+        yield usage
+    finally:
+        _usage.current = previous
+        _add_usage(previous, usage)
+
+def _record_usage(model: str, response: Any) -> None:
+    """Add the token usage of a chat response to the metrics and the tracked usage."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    counts = {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+        "completion_tokens": usage.completion_tokens or 0,
+    }
+    metrics.increment("chat_tokens_total", counts["prompt_tokens"], model=model, kind="prompt")
+    metrics.increment("chat_tokens_total", counts["completion_tokens"], model=model, kind="completion")
+    metrics.increment("chat_cached_tokens_total", counts["cached_tokens"], model=model)
+    _add_usage(getattr(_usage, "current", None), counts)
+
+def _add_usage(target: Optional[Dict[str, int]], usage: Dict[str, int]) -> None:
+    """Add token counts to a usage dictionary from track_usage, if any."""
+    if target is not None:
+        for key, value in usage.items():
+            target[key] += value
+
+def format_knowledge_entries(knowledge_entries: List[List[Dict[str, Any]]]) -> str:
+    """
+    Format knowledge base entries for a prompt, skipping entries with repeated content.
     
     Args:
-        contract_chunks: List of text chunks from the contract.
         knowledge_entries: List of lists of knowledge base entries for each chunk.
         
     Returns:
-        A list of message dictionaries for the OpenAI chat completions API.
+        The entries' content, each preceded by its metadata if available.
     """
-    # Create the system message
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT}
-    ]
-    
-    # Combine contract chunks into a single string
-    contract_text = "\n\n".join(contract_chunks)
-    
-    # Extract relevant knowledge base entries
     knowledge_text = ""
     
     # Deduplicate knowledge entries by content
@@ -74,6 +152,84 @@ def create_contract_revision_prompt(contract_chunks: List[str], knowledge_entrie
                     knowledge_text += f"--- Metadata: {meta_info} ---\n"
                 knowledge_text += content + "\n\n"
     
+    return knowledge_text
+
+def format_policy_block(knowledge_entries: List[List[Dict[str, Any]]]) -> str:
+    """
+    Format knowledge base entries as a stable policy block for the prefix-cache layout.
+    
+    Entries are deduplicated by content and sorted by content and metadata, so the
+    same set of policies always gives the same text, whatever the chunk it was
+    retrieved for and the retrieval order.
+    
+    Args:
+        knowledge_entries: List of lists of knowledge base entries for each chunk.
+        
+    Returns:
+        The policy block, starting with its heading.
+    """
+    unique = {}
+    for chunk_entries in knowledge_entries:
+        for entry in chunk_entries:
+            content = entry.get("content", "")
+            if content and content not in unique:
+                unique[content] = entry.get("meta_info") or ""
+    
+    knowledge_text = ""
+    for content, meta_info in sorted(unique.items()):
+        if meta_info:
+            knowledge_text += f"--- Metadata: {meta_info} ---\n"
+        knowledge_text += content + "\n\n"
+    
+    return "--- COMPANY POLICIES AND KNOWLEDGE BASE ---\n" + knowledge_text
+
+def _prefix_cache_prompt(system_prompt: str, knowledge_entries: List[List[Dict[str, Any]]],
+                         request: str) -> List[Dict[str, str]]:
+    """
+    Lay out a prompt for provider-side prefix caching: the system prompt, then the
+    policy block, then the request with the contract text last.
+    """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": format_policy_block(knowledge_entries)},
+        {"role": "user", "content": request},
+    ]
+
+def create_contract_revision_prompt(contract_chunks: List[str], knowledge_entries: List[List[Dict[str, Any]]]) -> List[Dict[str, str]]:
+    """
+    Create a prompt for contract revision using contract chunks and knowledge base entries.
+    
+    With PROMPT_LAYOUT=prefix_cache, the policies come first and the contract text last.
+    
+    Args:
+        contract_chunks: List of text chunks from the contract.
+        knowledge_entries: List of lists of knowledge base entries for each chunk.
+        
+    Returns:
+        A list of message dictionaries for the OpenAI chat completions API.
+    """
+    # Combine contract chunks into a single string
+    contract_text = "\n\n".join(contract_chunks)
+    
+    if PROMPT_LAYOUT == "prefix_cache":
+        return _prefix_cache_prompt(SYSTEM_PROMPT, knowledge_entries, f"""
+Please review and revise the following contract based on the company policies and knowledge base above.
+Please provide a revised version of the contract that aligns with our company policies and interests.
+Make changes only to clauses that conflict with our policies or interests.
+Maintain the original structure and format of the contract.
+
+--- CONTRACT TEXT ---
+{contract_text}
+""")
+    
+    # Create the system message
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT}
+    ]
+    
+    # Extract relevant knowledge base entries
+    knowledge_text = format_knowledge_entries(knowledge_entries)
+    
     # Create the user message with contract and knowledge base
     user_message = f"""
 Please review and revise the following contract based on our company policies and interests.
@@ -93,6 +249,148 @@ Maintain the original structure and format of the contract.
     
     return messages
 
+def _request_completion(messages: List[Dict[str, str]], model: str, max_tokens: int,
+                        estimated_tokens: int, response_format: Optional[Dict[str, str]] = None) -> str:
+    """Send one chat completion request through the rate limiter and return its content."""
+    before_request(model, estimated_tokens)
+    logger.info(f"Sending request to OpenAI API using model: {model}")
+    raw_response = client.chat.completions.with_raw_response.create(
+        model=model,
+        messages=messages,
+        temperature=CHAT_TEMPERATURE,
+        max_tokens=max_tokens,
+        response_format=response_format or openai.NOT_GIVEN,
+    )
+    after_response(model, raw_response.headers)
+    response = raw_response.parse()
+    _record_usage(model, response)
+    
+    return response.choices[0].message.content
+
+def _hedged_completion(messages: List[Dict[str, str]], model: str, max_tokens: int,
+                       estimated_tokens: int, hedge_after: float,
+                       response_format: Optional[Dict[str, str]] = None) -> str:
+    """
+    Send a chat completion request and, if it has not answered within hedge_after
+    seconds, a duplicate. The first successful answer wins.
+    
+    Both requests go through the shared client, so they reuse its connection pool.
+    A request in flight cannot be cancelled; the slower one finishes in the
+    background and its tokens are recorded in the metrics only.
+    """
+    def attempt() -> Tuple[str, Dict[str, int]]:
+        with track_usage() as usage:
+            content = _request_completion(messages, model, max_tokens, estimated_tokens, response_format)
+        return content, usage
+    
+    executor = ThreadPoolExecutor(2, thread_name_prefix="chat-hedge")
+    try:
+        logger.info(f"Sending request to OpenAI API using model: {model} (hedging after {hedge_after:.1f} s)")
+        primary = executor.submit(attempt)
+        done, _ = wait({primary}, timeout=hedge_after)
+        if primary in done:
+            content, usage = primary.result()
+            _add_usage(getattr(_usage, "current", None), usage)
+            return content
+        
+        logger.info(f"No answer from {model} after {hedge_after:.1f} s; sending a hedge request.")
+        metrics.increment("chat_hedges_total", model=model)
+        hedge = executor.submit(attempt)
+        
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        metrics.increment("chat_hedge_wins_total", model=model)
+                    content, usage = future.result()
+                    _add_usage(getattr(_usage, "current", None), usage)
+                    return content
+                error = future.exception()
+        
+        raise error
+    finally:
+        executor.shutdown(wait=False)
+
+def create_chat_completion(messages: List[Dict[str, str]], model: Optional[str] = None,
+                           response_format: Optional[Dict[str, str]] = None) -> Optional[str]:
+    """
+    Send messages to the OpenAI Chat API, retrying with exponential backoff on rate limits.
+    
+    With CHAT_HEDGING on, a request slower than the recent p95 latency is hedged with a
+    duplicate. A per-model circuit breaker fails calls fast while the rate of server
+    errors and timeouts is high; rate limit errors do not count towards it.
+    
+    Args:
+        messages: The message dictionaries to send.
+        model: The model to use for chat completion. Defaults to model specified in environment variable.
+        response_format: Optional response format, e.g. {"type": "json_object"}.
+        
+    Returns:
+        The content of the response message, or None if an error occurred.
+    """
+    model = model or CHAT_MODEL
+    breaker = _get_circuit_breaker(model)
+    
+    # Retry mechanism for API rate limits
+    max_retries = 3
+    retry_delay = 5  # seconds
+    max_tokens = CHAT_MAX_TOKENS
+    
+    # OpenAI counts max_tokens against the token limit along with the prompt
+    estimated_tokens = sum(count_tokens(message["content"], model) for message in messages) + max_tokens
+    
+    for attempt in range(max_retries):
+        if not breaker.allow():
+            logger.error(f"Circuit breaker for {model} is open; not sending the request.")
+            return None
+        
+        try:
+            started = time.monotonic()
+            hedge_after = None
+            if CHAT_HEDGING:
+                p95 = metrics.percentile("chat_latency_seconds", HEDGE_PERCENTILE,
+                                         min_samples=HEDGE_MIN_SAMPLES, model=model)
+                hedge_after = max(HEDGE_MIN_DELAY, p95) if p95 is not None else None
+            
+            if hedge_after is None:
+                content = _request_completion(messages, model, max_tokens, estimated_tokens, response_format)
+            else:
+                content = _hedged_completion(messages, model, max_tokens, estimated_tokens,
+                                             hedge_after, response_format)
+            
+            metrics.observe("chat_latency_seconds", time.monotonic() - started, model=model)
+            metrics.increment("chat_requests_total", model=model, outcome="success")
+            breaker.record(True)
+            return content
+        
+        except openai.RateLimitError as e:
+            # 429s are handled by the rate limiter and the backoff below, not the breaker
+            breaker.release()
+            metrics.increment("chat_requests_total", model=model, outcome="rate_limited")
+            if attempt < max_retries - 1:
+                default_wait = retry_delay * (2 ** attempt)  # Exponential backoff
+                wait_time = after_rate_limit_error(model, e.response.headers, default_wait)
+                logger.warning(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
+                time.sleep(wait_time)
+            else:
+                logger.error("Rate limit exceeded and max retries reached.")
+                return None
+        
+        except Exception as e:
+            # Only server errors, connection failures and timeouts count against the service
+            if isinstance(e, (openai.InternalServerError, openai.APIConnectionError)):
+                breaker.record(False)
+            else:
+                breaker.release()
+            metrics.increment("chat_requests_total", model=model, outcome="error")
+            logger.error(f"Error in chat completion: {str(e)}")
+            return None
+    
+    return None
+
 def get_contract_revision(contract_chunks: List[str], knowledge_entries: List[List[Dict[str, Any]]],
                           model: Optional[str] = None) -> Optional[str]:
     """
@@ -106,42 +404,280 @@ def get_contract_revision(contract_chunks: List[str], knowledge_entries: List[Li
     Returns:
         The revised contract text, or None if an error occurred.
     """
-    model = model or CHAT_MODEL
-    
     try:
         # Create the prompt
         messages = create_contract_revision_prompt(contract_chunks, knowledge_entries)
         
-        # Retry mechanism for API rate limits
-        max_retries = 3
-        retry_delay = 5  # seconds
+        return create_chat_completion(messages, model)
+    
+    except Exception as e:
+        logger.error(f"Unexpected error in get_contract_revision: {str(e)}")
+        return None
+
+def create_section_revision_prompt(section_text: str, knowledge_entries: List[List[Dict[str, Any]]]) -> List[Dict[str, str]]:
+    """
+    Create a prompt for revising one section (one or more clauses) of a contract.
+    
+    With PROMPT_LAYOUT=prefix_cache, the policies come first and the contract text last.
+    
+    Args:
+        section_text: The text of the section.
+        knowledge_entries: List of lists of knowledge base entries retrieved for the section.
         
-        for attempt in range(max_retries):
-            try:
-                logger.info(f"Sending request to OpenAI API using model: {model}")
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=0.2,  # Lower temperature for more consistent output
-                    max_tokens=8000,  # Adjust as needed for your contract size
-                )
-                
-                revised_contract = response.choices[0].message.content
-                return revised_contract
+    Returns:
+        A list of message dictionaries for the OpenAI chat completions API.
+    """
+    if PROMPT_LAYOUT == "prefix_cache":
+        return _prefix_cache_prompt(SYSTEM_PROMPT, knowledge_entries, f"""
+Please review and revise the following excerpt of a contract based on the company policies and knowledge base above.
+The rest of the contract is not affected and is not shown.
+Please provide a revised version of this excerpt only, not the full contract.
+Make changes only to clauses that conflict with our policies or interests.
+Maintain the original structure, numbering and format of the excerpt.
+
+--- CONTRACT EXCERPT ---
+{section_text}
+""")
+    
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT}
+    ]
+    
+    knowledge_text = format_knowledge_entries(knowledge_entries)
+    
+    user_message = f"""
+Please review and revise the following excerpt of a contract based on our company policies and interests.
+The rest of the contract is not affected and is not shown.
+
+--- CONTRACT EXCERPT ---
+{section_text}
+
+--- COMPANY POLICIES AND KNOWLEDGE BASE ---
+{knowledge_text}
+
+Please provide a revised version of this excerpt only, not the full contract.
+Make changes only to clauses that conflict with our policies or interests.
+Maintain the original structure, numbering and format of the excerpt.
+"""
+    
+    messages.append({"role": "user", "content": user_message})
+    
+    return messages
+
+def create_section_edit_prompt(section_text: str, segments: List[Tuple[str, int, int]],
+                               knowledge_entries: List[List[Dict[str, Any]]]) -> List[Dict[str, str]]:
+    """
+    Create a prompt asking for edit operations on one section of a contract.
+    
+    With PROMPT_LAYOUT=prefix_cache, the policies come first and the contract text last.
+    
+    Args:
+        section_text: The text of the section.
+        segments: The clauses of the section, from edits.segment_text.
+        knowledge_entries: List of lists of knowledge base entries retrieved for the section.
+        
+    Returns:
+        A list of message dictionaries for the OpenAI chat completions API.
+    """
+    if PROMPT_LAYOUT == "prefix_cache":
+        return _prefix_cache_prompt(EDIT_SYSTEM_PROMPT, knowledge_entries, f"""
+Please review the following excerpt of a contract based on the company policies and knowledge base above.
+The rest of the contract is not affected and is not shown.
+Please return the edits that align this excerpt with our company policies and interests, as JSON.
+Make changes only to clauses that conflict with our policies or interests.
+
+--- CONTRACT EXCERPT ---
+{format_segments(section_text, segments)}
+""")
+    
+    messages = [
+        {"role": "system", "content": EDIT_SYSTEM_PROMPT}
+    ]
+    
+    knowledge_text = format_knowledge_entries(knowledge_entries)
+    
+    user_message = f"""
+Please review the following excerpt of a contract based on our company policies and interests.
+The rest of the contract is not affected and is not shown.
+
+--- CONTRACT EXCERPT ---
+{format_segments(section_text, segments)}
+
+--- COMPANY POLICIES AND KNOWLEDGE BASE ---
+{knowledge_text}
+
+Please return the edits that align this excerpt with our company policies and interests, as JSON.
+Make changes only to clauses that conflict with our policies or interests.
+"""
+    
+    messages.append({"role": "user", "content": user_message})
+    
+    return messages
+
+def revise_section(section_text: str, knowledge_entries: List[List[Dict[str, Any]]],
+                   model: Optional[str] = None) -> Optional[str]:
+    """
+    Revise one section of a contract.
+    
+    In the "edits" revision mode, the model returns edit operations that are applied
+    to the section locally, so the answer is only as long as the changes. If the
+    answer cannot be parsed or an edit does not apply cleanly, the section is
+    regenerated in full instead.
+    
+    Args:
+        section_text: The text of the section.
+        knowledge_entries: List of lists of knowledge base entries retrieved for the section.
+        model: The model to use for chat completion. Defaults to model specified in environment variable.
+        
+    Returns:
+        The revised section text, or None if an error occurred.
+    """
+    if REVISION_MODE == "edits":
+        segments = segment_text(section_text)
+        messages = create_section_edit_prompt(section_text, segments, knowledge_entries)
+        content = create_chat_completion(messages, model, response_format={"type": "json_object"})
+        
+        edits = parse_edits(content) if content is not None else None
+        revised_section = apply_edits(section_text, segments, edits) if edits is not None else None
+        if revised_section is not None:
+            metrics.increment("revision_sections_total", mode="edits")
+            metrics.increment("revision_edits_total", len(edits))
+            logger.info(f"Applied {len(edits)} edits to the section.")
+            return revised_section
+        
+        metrics.increment("revision_sections_total", mode="fallback")
+        logger.warning("Edits did not apply cleanly; regenerating the section in full.")
+    else:
+        metrics.increment("revision_sections_total", mode="full")
+    
+    messages = create_section_revision_prompt(section_text, knowledge_entries)
+    return create_chat_completion(messages, model)
+
+def revise_sections(contract_text: str, sections: List[Tuple[int, int, List[Dict[str, Any]]]],
+                    model: Optional[str] = None) -> Optional[str]:
+    """
+    Revise only the given sections of a contract, passing the rest through unchanged.
+    
+    With MODEL_ROUTING on (and no model given), each section is routed to the fast or
+    the strong tier (see utils.routing), and sections are revised concurrently up to
+    each tier's concurrency limit. Every routing decision is logged, and the latency,
+    tokens and estimated cost of each tier are logged and recorded in the metrics.
+    Otherwise the sections are revised one after another with a single model. A
+    single section covering the whole contract is not routed: routing scores are
+    calibrated for clauses, and a whole contract would always score as strong.
+    
+    Args:
+        contract_text: The full contract text.
+        sections: Non-overlapping (start, end, knowledge entries) sections in text order,
+            e.g. from gating.merge_sections.
+        model: The model to use for chat completion. Defaults to model specified in environment variable.
+        
+    Returns:
+        The revised contract text, or None if an error occurred.
+    """
+    try:
+        whole_contract = len(sections) == 1 and sections[0][0] == 0 and sections[0][1] >= len(contract_text)
+        routed = MODEL_ROUTING and model is None and not whole_contract
+        if MODEL_ROUTING and model is None and whole_contract:
+            logger.info(f"Not routing: the section is the whole contract; revising it with {CHAT_MODEL}")
+        if routed:
+            decisions = [route_section(contract_text[start:end], entries) for start, end, entries in sections]
+        else:
+            decisions = [{"tier": None, "model": model or CHAT_MODEL} for _ in sections]
+        
+        def revise(number: int) -> Tuple[Optional[str], float, Dict[str, int]]:
+            start, end, entries = sections[number]
+            logger.info(f"Revising section {number + 1} of {len(sections)} (characters {start}-{end}) "
+                        f"with {decisions[number]['model']}")
+            started = time.monotonic()
+            with track_usage() as usage:
+                revised_section = revise_section(contract_text[start:end], [entries], decisions[number]["model"])
+            return revised_section, time.monotonic() - started, usage
+        
+        if not routed:
+            results = [revise(number) for number in range(len(sections))]
+        else:
+            for number, decision in enumerate(decisions, 1):
+                signals = decision["signals"]
+                best_distance = "-" if signals["best_distance"] is None else f"{signals['best_distance']:.3f}"
+                logger.info(f"Routing section {number} of {len(sections)} to the {decision['tier']} tier "
+                            f"({decision['model']}): score {decision['score']:.2f}, {signals['policies']} policies, "
+                            f"best distance {best_distance}, {signals['tokens']} tokens, "
+                            f"keywords {', '.join(signals['keywords']) or '-'}")
+                metrics.increment("routing_decisions_total", tier=decision["tier"])
             
-            except openai.RateLimitError:
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-                    logger.warning(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                else:
-                    logger.error("Rate limit exceeded and max retries reached.")
-                    return None
+            # One pool per tier, so each tier's concurrency limit holds on its own
+            executors = {tier: ThreadPoolExecutor(TIERS[tier]["concurrency"], thread_name_prefix=f"revise-{tier}")
+                         for tier in {decision["tier"] for decision in decisions}}
+            try:
+                futures = [executors[decision["tier"]].submit(revise, number)
+                           for number, decision in enumerate(decisions)]
+                results = [future.result() for future in futures]
+            finally:
+                for executor in executors.values():
+                    executor.shutdown(wait=True, cancel_futures=True)
             
-            except Exception as e:
-                logger.error(f"Error in chat completion: {str(e)}")
+            # The sections were revised on worker threads; credit their usage to this one
+            for _, _, usage in results:
+                _add_usage(getattr(_usage, "current", None), usage)
+            _log_tier_usage(decisions, results)
+        
+        revised_sections = []
+        for number, (revised_section, _, _) in enumerate(results, 1):
+            if revised_section is None:
+                logger.error(f"Failed to revise section {number} of {len(sections)}.")
                 return None
+            revised_sections.append(revised_section)
+        
+        return apply_section_revisions(contract_text, sections, revised_sections)
     
     except Exception as e:
-        logger.error(f"Unexpected error in get_contract_revision: {str(e)}")
-        return None 
\ No newline at end of file
+        logger.error(f"Unexpected error in revise_sections: {str(e)}")
+        return None 
+
+def _log_tier_usage(decisions: List[Dict[str, Any]], results: List[Tuple[Optional[str], float, Dict[str, int]]]) -> None:
+    """Record and log the sections, latency, tokens and estimated cost of each routing tier."""
+    for tier in TIERS:
+        tier_results = [result for decision, result in zip(decisions, results) if decision["tier"] == tier]
+        if not tier_results:
+            continue
+        
+        prompt_tokens = sum(usage["prompt_tokens"] for _, _, usage in tier_results)
+        cached_tokens = sum(usage["cached_tokens"] for _, _, usage in tier_results)
+        completion_tokens = sum(usage["completion_tokens"] for _, _, usage in tier_results)
+        cost = estimate_cost(tier, prompt_tokens, completion_tokens, cached_tokens)
+        for _, seconds, _ in tier_results:
+            metrics.observe("revision_section_seconds", seconds, tier=tier)
+        if cost is not None:
+            metrics.increment("revision_cost_usd_total", cost, tier=tier)
+        
+        latencies = sorted(seconds for _, seconds, _ in tier_results)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        logger.info(f"{tier.capitalize()} tier ({TIERS[tier]['model']}): {len(tier_results)} sections, "
+                    f"mean {sum(latencies) / len(latencies):.2f} s, p95 {p95:.2f} s, "
+                    f"{prompt_tokens} prompt ({cached_tokens} cached) + {completion_tokens} completion tokens, "
+                    f"cost {'unknown' if cost is None else f'${cost:.4f}'}")
+
+def apply_section_revisions(contract_text: str, sections: List[Tuple[int, int, Any]],
+                            revised_sections: List[str]) -> str:
+    """
+    Replace sections of a contract with their revisions.
+    
+    Args:
+        contract_text: The full contract text.
+        sections: Non-overlapping (start, end, ...) sections in text order.
+        revised_sections: The revised text of each section.
+        
+    Returns:
+        The contract text with each section replaced.
+    """
+    pieces = []
+    position = 0
+    
+    for (start, end, *_), revised_section in zip(sections, revised_sections):
+        pieces.append(contract_text[position:start])
+        pieces.append(revised_section.strip())
+        position = end
+    
+    pieces.append(contract_text[position:])
+    return "".join(pieces)
@@ -0,0 +1,337 @@
+"""
+Offline bulk requests through the OpenAI Batch API.
+
+Requests are written to JSONL files, one line per request with a custom ID,
+uploaded and submitted as batches, polled until they finish and mapped back by
+custom ID. Batch requests cost half as much as synchronous ones and count against
+a separate, much larger quota, which suits overnight re-reviews of a whole
+contract archive.
+
+Every job keeps its state in its own directory: a manifest of the submitted
+batches and a results file of the successful responses. A job that is interrupted,
+or whose batches partly fail or expire, picks up where it stopped when it is run
+again: batches still in flight are polled rather than resubmitted, and only
+requests without a result are sent again.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+import openai
+from dotenv import load_dotenv
+from utils.embedding import EMBEDDING_MODEL
+from utils.api import CHAT_MODEL, CHAT_TEMPERATURE, CHAT_MAX_TOKENS
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables with encoding handling
+try:
+    load_dotenv(encoding='utf-8')
+except UnicodeDecodeError:
+    try:
+        load_dotenv(encoding='utf-16')
+    except UnicodeDecodeError:
+        try:
+            load_dotenv(encoding='latin1')
+        except Exception as e:
+            logger.error(f"Failed to load .env file: {str(e)}")
+
+# OpenAI API key
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+if not OPENAI_API_KEY:
+    logger.error("OPENAI_API_KEY not found in environment variables.")
+
+# Directory under which bulk jobs keep their request files, manifests and results
+BATCH_DIR = os.getenv("BATCH_DIR", os.path.join(".cache", "batches"))
+
+# Seconds between status checks of running batches
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "30"))
+
+# Time the API has to finish a batch; only "24h" is offered at the moment
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+
+# Requests per batch file (the API accepts at most 50,000)
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50000"))
+
+# Submissions of a request before its failure is final
+BATCH_MAX_ATTEMPTS = int(os.getenv("BATCH_MAX_ATTEMPTS", "3"))
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Initialize OpenAI client
+client = openai.OpenAI(api_key=OPENAI_API_KEY)
+
+def request_hash(body: Dict[str, Any]) -> str:
+    """Fingerprint of a request body, so results are only reused for identical requests."""
+    return hashlib.sha256(json.dumps(body, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class BatchJob:
+    """
+    A named set of requests to one endpoint, sent through the Batch API and
+    resumable from its directory.
+
+    The directory holds manifest.json (the submitted batches), input-NNN.jsonl
+    (the request files as uploaded) and results.jsonl (one successful response
+    body per custom ID, with the fingerprint of its request).
+
+    Args:
+        work_dir: Directory of the job.
+        endpoint: The API endpoint, "/v1/embeddings" or "/v1/chat/completions".
+        openai_client: Client to use. Defaults to the module client.
+    """
+
+    def __init__(self, work_dir: str, endpoint: str, openai_client: Optional[openai.OpenAI] = None):
+        self.work_dir = work_dir
+        self.endpoint = endpoint
+        self.client = openai_client or client
+        self.manifest_path = os.path.join(work_dir, "manifest.json")
+        self.results_path = os.path.join(work_dir, "results.jsonl")
+        self.errors: Dict[str, str] = {}
+        self.finished = False
+        os.makedirs(work_dir, exist_ok=True)
+
+        self.manifest = {"endpoint": endpoint, "batches": []}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as file:
+                self.manifest = json.load(file)
+
+        # Later lines win, so a request answered twice keeps its latest response
+        self.results: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.results_path):
+            with open(self.results_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by an interrupted write
+                    self.results[record["custom_id"]] = record
+
+    def _save_manifest(self) -> None:
+        temporary_path = self.manifest_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(self.manifest, file, indent=2)
+        os.replace(temporary_path, self.manifest_path)
+
+    def _submit(self, requests: Dict[str, Dict[str, Any]], custom_ids: List[str], attempt: int) -> None:
+        """Write, upload and submit the given requests, recording each batch in the manifest."""
+        for offset in range(0, len(custom_ids), BATCH_MAX_REQUESTS):
+            part = custom_ids[offset:offset + BATCH_MAX_REQUESTS]
+            input_path = os.path.join(self.work_dir, f"input-{len(self.manifest['batches']) + 1:03d}.jsonl")
+            with open(input_path, "w", encoding="utf-8") as file:
+                for custom_id in part:
+                    file.write(json.dumps({"custom_id": custom_id, "method": "POST",
+                                           "url": self.endpoint, "body": requests[custom_id]},
+                                          ensure_ascii=False) + "\n")
+
+            with open(input_path, "rb") as file:
+                uploaded = self.client.files.create(file=file, purpose="batch")
+            batch = self.client.batches.create(input_file_id=uploaded.id, endpoint=self.endpoint,
+                                               completion_window=BATCH_COMPLETION_WINDOW)
+            logger.info(f"Submitted batch {batch.id} with {len(part)} requests to {self.endpoint} (attempt {attempt}).")
+
+            self.manifest["batches"].append({
+                "id": batch.id, "input_file": os.path.basename(input_path), "requests": len(part),
+                "attempt": attempt, "status": batch.status, "collected": False,
+            })
+            self._save_manifest()
+
+    def _collect(self, record: Dict[str, Any], batch) -> None:
+        """Download the output and error files of a finished batch into the results."""
+        # Results are stamped with the fingerprint of the request as it was submitted
+        fingerprints = {}
+        with open(os.path.join(self.work_dir, record["input_file"]), "r", encoding="utf-8") as input_file:
+            for line in input_file:
+                request = json.loads(line)
+                fingerprints[request["custom_id"]] = request_hash(request["body"])
+
+        succeeded = failed = 0
+        with open(self.results_path, "a", encoding="utf-8") as results_file:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if not file_id:
+                    continue
+                for line in self.client.files.content(file_id).text.splitlines():
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    custom_id = item["custom_id"]
+                    response = item.get("response") or {}
+                    if response.get("status_code") == 200 and not item.get("error"):
+                        result = {"custom_id": custom_id, "request_hash": fingerprints.get(custom_id),
+                                  "body": response["body"]}
+                        self.results[custom_id] = result
+                        results_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        self.errors.pop(custom_id, None)
+                        succeeded += 1
+                    else:
+                        error = item.get("error") or response.get("body", {}).get("error") or {}
+                        self.errors[custom_id] = error.get("message", f"status {response.get('status_code')}")
+                        failed += 1
+
+        if batch.status != "completed":
+            logger.warning(f"Batch {batch.id} ended as {batch.status}.")
+        logger.info(f"Collected batch {batch.id}: {succeeded} succeeded, {failed} failed.")
+        record["collected"] = True
+        self._save_manifest()
+
+    def _poll(self, wait: bool) -> bool:
+        """
+        Check the uncollected batches, collecting the finished ones.
+
+        Returns:
+            True once all batches are collected; False if wait is off and some are still running.
+        """
+        while True:
+            running = 0
+            for record in self.manifest["batches"]:
+                if record["collected"]:
+                    continue
+                batch = self.client.batches.retrieve(record["id"])
+                if batch.status != record["status"]:
+                    record["status"] = batch.status
+                    self._save_manifest()
+                if batch.status in TERMINAL_STATUSES:
+                    self._collect(record, batch)
+                else:
+                    running += 1
+                    counts = batch.request_counts
+                    if counts is not None:
+                        logger.info(f"Batch {batch.id} is {batch.status}: "
+                                    f"{counts.completed + counts.failed}/{counts.total} requests done.")
+
+            if not running:
+                return True
+            if not wait:
+                return False
+            time.sleep(BATCH_POLL_INTERVAL)
+
+    def run(self, requests: Dict[str, Dict[str, Any]], wait: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Send the requests that have no result yet and gather all results.
+
+        Results are only reused for custom IDs whose request body is unchanged.
+        Requests that fail are resubmitted until they have been tried
+        BATCH_MAX_ATTEMPTS times, counting earlier runs. When waiting, each
+        resubmission is delayed by BATCH_POLL_INTERVAL times the number of
+        attempts so far.
+
+        Args:
+            requests: Request body by custom ID.
+            wait: Whether to wait for the batches to finish. Without waiting, the
+                batches are submitted and a later run collects them.
+
+        Returns:
+            The response body by custom ID for every request that succeeded, or an
+            empty dictionary while batches are still running (see finished).
+        """
+        fingerprints = {custom_id: request_hash(body) for custom_id, body in requests.items()}
+        attempts = self.manifest.setdefault("attempts", {})
+
+        while True:
+            if not self._poll(wait):
+                logger.info(f"Batches are still running; run again later to collect them ({self.work_dir}).")
+                return {}
+
+            done = {custom_id for custom_id, result in self.results.items()
+                    if result.get("request_hash") == fingerprints.get(custom_id)}
+            pending = [custom_id for custom_id in requests if custom_id not in done]
+
+            # Attempts are counted per request across runs; a changed request starts over
+            for custom_id in pending:
+                if attempts.get(custom_id, [None])[0] != fingerprints[custom_id]:
+                    attempts[custom_id] = [fingerprints[custom_id], 0]
+            retry = [custom_id for custom_id in pending if attempts[custom_id][1] < BATCH_MAX_ATTEMPTS]
+            if len(retry) < len(pending):
+                failed = [custom_id for custom_id in pending if custom_id not in retry]
+                logger.error(f"{len(failed)} requests to {self.endpoint} failed {BATCH_MAX_ATTEMPTS} times, "
+                             f"e.g. {failed[0]}: {self.errors.get(failed[0], 'no result')}")
+            if not retry:
+                self.finished = True
+                break
+
+            # Failed and expired batches tend to fail again if resent at once (e.g. on
+            # quota errors), so wait longer before each further attempt
+            resent = max(attempts[custom_id][1] for custom_id in retry)
+            if wait and resent:
+                delay = BATCH_POLL_INTERVAL * resent
+                logger.info(f"Resending {len(retry)} requests to {self.endpoint} in {delay:.0f} seconds.")
+                time.sleep(delay)
+
+            for custom_id in retry:
+                attempts[custom_id][1] += 1
+            self._submit(requests, retry, max(attempts[custom_id][1] for custom_id in retry))
+
+        return {custom_id: self.results[custom_id]["body"] for custom_id in requests
+                if custom_id in self.results and self.results[custom_id].get("request_hash") == fingerprints[custom_id]}
+
+def embed_in_bulk(texts: Dict[str, str], work_dir: str, model: Optional[str] = None,
+                  wait: bool = True) -> Optional[Dict[str, Optional[List[float]]]]:
+    """
+    Embed texts through the Batch API.
+
+    Args:
+        texts: Text by custom ID, e.g. "<document id>:chunk-<n>".
+        work_dir: Directory of the job; reuse it to resume.
+        model: The embedding model to use. Defaults to model specified in environment variable.
+        wait: Whether to wait for the batches to finish.
+
+    Returns:
+        The embedding by custom ID, with None for failed texts, or None while the
+        batches are still running or if the job could not be run.
+    """
+    model = model or EMBEDDING_MODEL
+    requests = {custom_id: {"model": model, "input": text} for custom_id, text in texts.items()}
+
+    try:
+        job = BatchJob(work_dir, "/v1/embeddings")
+        results = job.run(requests, wait=wait)
+        if not job.finished:
+            return None
+    except Exception as e:
+        logger.error(f"Error in bulk embedding job: {str(e)}")
+        return None
+
+    return {custom_id: results[custom_id]["data"][0]["embedding"] if custom_id in results else None
+            for custom_id in texts}
+
+def complete_in_bulk(prompts: Dict[str, List[Dict[str, str]]], work_dir: str, model: Optional[str] = None,
+                     wait: bool = True) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Run chat completions through the Batch API, with the same settings as
+    api.create_chat_completion.
+
+    Args:
+        prompts: Messages by custom ID, e.g. "<document id>:section-<n>".
+        work_dir: Directory of the job; reuse it to resume.
+        model: The model to use for chat completion. Defaults to model specified in environment variable.
+        wait: Whether to wait for the batches to finish.
+
+    Returns:
+        The content of the response message by custom ID, with None for failed
+        prompts, or None while the batches are still running or if the job could
+        not be run.
+    """
+    model = model or CHAT_MODEL
+    requests = {
+        custom_id: {"model": model, "messages": messages,
+                    "temperature": CHAT_TEMPERATURE, "max_tokens": CHAT_MAX_TOKENS}
+        for custom_id, messages in prompts.items()
+    }
+
+    try:
+        job = BatchJob(work_dir, "/v1/chat/completions")
+        results = job.run(requests, wait=wait)
+        if not job.finished:
+            return None
+    except Exception as e:
+        logger.error(f"Error in bulk chat completion job: {str(e)}")
+        return None
+
+    return {custom_id: results[custom_id]["choices"][0]["message"]["content"] if custom_id in results else None
+            for custom_id in prompts}
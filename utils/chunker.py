@@ -4,9 +4,11 @@ Text chunking module for splitting text into manageable chunks.
 import re
 import logging
 import os
-from typing import List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 import nltk
 from dotenv import load_dotenv
+from utils.tokenizer import count_tokens
 
 # Configure logging
 logging.basicConfig(
@@ -31,6 +33,32 @@ except UnicodeDecodeError:
 DEFAULT_CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
 DEFAULT_CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
 
+# Chunking strategy used by the pipeline: "sentence" (chunk_text) or "clause" (chunk_by_clauses)
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "sentence").lower()
+
+# Clause headings at the start of a line:
+#   keyword   "MADDE 5", "Madde 5.2 -", "Article 3", "Section 2.1", "BÖLÜM II"
+#   number    "5.2 Taraflar...", "5.2.1. ..." (1-2 digit parts, so "1.000 TL" is not a heading)
+#   top       "5. Ödeme", "5) Ödeme"
+#   letter    "(a) ...", "b) ..."
+_CLAUSE_HEADING_PATTERN = re.compile(
+    r"^[ \t]*(?:"
+    r"(?:madde|md\.|article|art\.|section|bölüm|kısım)[ \t]*(?P<keyword>\d{1,3}(?:\.\d{1,2})*|[IVXLC]+)\b"
+    r"|(?P<number>\d{1,3}(?:\.\d{1,2}){1,3})\.?(?=[ \t]+\S)"
+    r"|(?P<top>\d{1,3})[.)](?=[ \t]+[^\W\d_])"
+    r"|\(?(?P<letter>[a-zçğıöşü])\)(?=[ \t]+\S)"
+    r")",
+    re.MULTILINE | re.IGNORECASE
+)
+
+# Sentence boundaries used to split clauses that exceed the token budget
+_SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?;:])\s+|\n[ \t]*\n\s*")
+
+_WORD_PATTERN = re.compile(r"\S+")
+
+# Sentence ends used when the NLTK sentence tokenizer is unavailable
+_FALLBACK_SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
 # Download necessary NLTK resources
 def download_nltk_resources():
     """Download required NLTK resources."""
@@ -45,6 +73,46 @@ def download_nltk_resources():
 # Initialize NLTK
 download_nltk_resources()
 
+@lru_cache(maxsize=None)
+def _get_sentence_tokenizer():
+    """
+    Load the Punkt sentence tokenizer used by nltk.sent_tokenize.
+    
+    Returns:
+        The tokenizer, or None if its data is unavailable.
+    """
+    try:
+        return nltk.tokenize.PunktTokenizer("english")
+    except Exception as e:
+        logger.warning(f"Sentence tokenizer unavailable, splitting at sentence punctuation: {str(e)}")
+        return None
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """
+    Find the sentences of a text.
+    
+    Args:
+        text: The text to split.
+        
+    Returns:
+        (start, end) character offsets of the sentences in order, without surrounding whitespace.
+    """
+    tokenizer = _get_sentence_tokenizer()
+    if tokenizer is not None:
+        try:
+            return list(tokenizer.span_tokenize(text))
+        except Exception as e:
+            logger.error(f"Error splitting text into sentences: {str(e)}")
+    
+    # Fallback: split on periods, question marks, and exclamation marks
+    spans = []
+    sentence_start = 0
+    for boundary in _FALLBACK_SENTENCE_PATTERN.finditer(text):
+        spans.append(_trim_span(text, sentence_start, boundary.start()))
+        sentence_start = boundary.end()
+    spans.append(_trim_span(text, sentence_start, len(text)))
+    return [(start, end) for start, end in spans if start < end]
+
 def split_into_sentences(text: str) -> List[str]:
     """
     Split text into individual sentences.
@@ -55,25 +123,30 @@ def split_into_sentences(text: str) -> List[str]:
     Returns:
         A list of sentences.
     """
-    try:
-        sentences = nltk.sent_tokenize(text)
-        return sentences
-    except Exception as e:
-        logger.error(f"Error splitting text into sentences: {str(e)}")
-        # Fallback: split on periods, question marks, and exclamation marks
-        return re.split(r'(?<=[.!?])\s+', text)
+    return [text[start:end] for start, end in sentence_spans(text)]
 
-def chunk_text(text: str, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None) -> List[str]:
+def chunk_by_sentences(text: str, chunk_size: Optional[int] = None,
+                       chunk_overlap: Optional[int] = None) -> List[Dict[str, Any]]:
     """
-    Split text into chunks of roughly the specified size, trying to break at sentence boundaries.
+    Split text into chunks of whole sentences, with overlapping sentences between chunks.
+    
+    Sentences are located and counted with the model tokenizer once; chunks are then
+    cut from running token totals in a single pass, so the time is linear in the
+    length of the text. A chunk holds at most chunk_size tokens, and consecutive
+    chunks share the trailing sentences of the first chunk that fit in chunk_overlap
+    tokens. Sentences longer than chunk_size are split at clause punctuation and then
+    at word boundaries.
     
     Args:
         text: The text to chunk.
-        chunk_size: The target size (in tokens) for each chunk. Defaults to value from environment variable.
-        chunk_overlap: The number of tokens to overlap between chunks. Defaults to value from environment variable.
+        chunk_size: Maximum tokens per chunk. Defaults to value from environment variable.
+        chunk_overlap: Maximum tokens shared by consecutive chunks. Defaults to value from environment variable.
         
     Returns:
-        A list of text chunks.
+        A list of chunk dictionaries with the keys:
+            text: The chunk text (text[start:end]).
+            start, end: Character offsets of the chunk in text.
+            tokens: Token count of the chunk (the sum over its sentences).
     """
     if not text:
         logger.warning("Empty text provided for chunking.")
@@ -81,71 +154,234 @@ def chunk_text(text: str, chunk_size: Optional[int] = None, chunk_overlap: Optio
     
     # Use default values if not provided
     chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
-    chunk_overlap = chunk_overlap or DEFAULT_CHUNK_OVERLAP
+    chunk_overlap = DEFAULT_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
     
     # Ensure chunk_overlap is less than chunk_size
     if chunk_overlap >= chunk_size:
         logger.warning(f"Chunk overlap ({chunk_overlap}) must be less than chunk size ({chunk_size}). Setting overlap to 10% of chunk size.")
         chunk_overlap = max(1, int(chunk_size * 0.1))  # 10% overlap
     
-    try:
-        # Split text into sentences
-        sentences = split_into_sentences(text)
-        
-        # Initialize variables
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for sentence in sentences:
-            # Rough estimation of tokens: split by whitespace
-            sentence_tokens = sentence.split()
-            sentence_size = len(sentence_tokens)
-            
-            # If a single sentence is larger than the chunk size, split it
-            if sentence_size > chunk_size:
-                # If we have content in the current chunk, add it first
-                if current_chunk:
-                    chunks.append(" ".join(current_chunk))
-                    current_chunk = []
-                    current_size = 0
-                
-                # Split the long sentence
-                words = sentence_tokens
-                for i in range(0, len(words), chunk_size):
-                    chunk_words = words[i:i + chunk_size]
-                    chunks.append(" ".join(chunk_words))
+    # Sentence units within the budget, with running token totals
+    units = []
+    for start, end in sentence_spans(text):
+        tokens = count_tokens(text[start:end])
+        if tokens > chunk_size:
+            units.extend((*_trim_span(text, piece_start, piece_end), piece_tokens)
+                         for piece_start, piece_end, piece_tokens in _split_span(text, start, end, chunk_size))
+        else:
+            units.append((start, end, tokens))
+    
+    totals = [0]
+    for _, _, tokens in units:
+        totals.append(totals[-1] + tokens)
+    
+    chunks = []
+    first = last = overlap_start = 0  # chunk is units[first:last]
+    while first < len(units):
+        last = max(last, first + 1)
+        while last < len(units) and totals[last + 1] - totals[first] <= chunk_size:
+            last += 1
+        
+        start, end = units[first][0], units[last - 1][1]
+        chunks.append({"text": text[start:end], "start": start, "end": end,
+                       "tokens": totals[last] - totals[first]})
+        if last == len(units):
+            break
+        
+        # The next chunk starts with the trailing units that fit in the overlap and
+        # still leave room for the next unit
+        overlap_start = max(overlap_start, first + 1)
+        while overlap_start < last and (totals[last] - totals[overlap_start] > chunk_overlap
+                                        or totals[last + 1] - totals[overlap_start] > chunk_size):
+            overlap_start += 1
+        first = overlap_start
+    
+    return chunks
+
+def chunk_text(text: str, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None) -> List[str]:
+    """
+    Split text into chunks of roughly the specified size, trying to break at sentence boundaries.
+    
+    Args:
+        text: The text to chunk.
+        chunk_size: The target size (in tokens) for each chunk. Defaults to value from environment variable.
+        chunk_overlap: The number of tokens to overlap between chunks. Defaults to value from environment variable.
+        
+    Returns:
+        A list of text chunks.
+    """
+    return [chunk["text"] for chunk in chunk_by_sentences(text, chunk_size, chunk_overlap)]
+
+def find_clauses(text: str) -> List[Tuple[int, int, Optional[str]]]:
+    """
+    Split text into clause units at clause headings, in a single pass.
+    
+    Args:
+        text: The text to split.
+        
+    Returns:
+        A list of (start, end, clause number) tuples covering the text in order.
+        Text before the first heading has clause number None.
+    """
+    units = []
+    unit_start = 0
+    label = None
+    article = None
+    
+    for match in _CLAUSE_HEADING_PATTERN.finditer(text):
+        if match.group("letter"):
+            # Lettered items are subsections of the current article
+            new_label = f"{article or ''}({match.group('letter').lower()})"
+        else:
+            new_label = match.group("keyword") or match.group("number") or match.group("top")
+            article = new_label
+        
+        if match.start() > unit_start:
+            units.append((unit_start, match.start(), label))
+        unit_start = match.start()
+        label = new_label
+    
+    if unit_start < len(text):
+        units.append((unit_start, len(text), label))
+    
+    return units
+
+def _article_of(label: Optional[str]) -> Optional[str]:
+    """Return the top-level article of a clause number (e.g. "5" for "5.2(a)")."""
+    if label is None:
+        return None
+    return re.split(r"[.(]", label, maxsplit=1)[0] or label
+
+def _trim_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """Shrink a span so it does not start or end with whitespace."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def _split_span(text: str, start: int, end: int, max_tokens: int) -> List[Tuple[int, int, int]]:
+    """
+    Split a span that exceeds the token budget at sentence boundaries, falling back
+    to word boundaries for single sentences that are still too long.
+    
+    Args:
+        text: The full text.
+        start: Start offset of the span.
+        end: End offset of the span.
+        max_tokens: Maximum tokens per piece.
+        
+    Returns:
+        A list of (start, end, tokens) pieces covering the span in order.
+    """
+    # Sentence spans within [start, end)
+    sentences = []
+    sentence_start = start
+    for boundary in _SENTENCE_BOUNDARY_PATTERN.finditer(text, start, end):
+        sentences.append((sentence_start, boundary.end()))
+        sentence_start = boundary.end()
+    if sentence_start < end:
+        sentences.append((sentence_start, end))
+    
+    pieces = []
+    piece_start, piece_tokens = start, 0
+    
+    for sentence_start, sentence_end in sentences:
+        sentence_tokens = count_tokens(text[sentence_start:sentence_end])
+        
+        if sentence_tokens > max_tokens:
+            if piece_tokens:
+                pieces.append((piece_start, sentence_start, piece_tokens))
             
-            # If adding this sentence would exceed the chunk size, start a new chunk
-            elif current_size + sentence_size > chunk_size:
-                # Add the current chunk to the list
-                chunks.append(" ".join(current_chunk))
-                
-                # Start a new chunk with overlap
-                overlap_start = max(0, len(current_chunk) - chunk_overlap)
-                current_chunk = current_chunk[overlap_start:] + [sentence]
-                current_size = len(" ".join(current_chunk).split())
+            # Pack words until the budget is reached
+            word_start, word_tokens = sentence_start, 0
+            for word in _WORD_PATTERN.finditer(text, sentence_start, sentence_end):
+                tokens = count_tokens(word.group()) + 1
+                if word_tokens and word_tokens + tokens > max_tokens:
+                    pieces.append((word_start, word.start(), word_tokens))
+                    word_start, word_tokens = word.start(), 0
+                word_tokens += tokens
+            pieces.append((word_start, sentence_end, word_tokens))
             
-            # Otherwise, add the sentence to the current chunk
-            else:
-                current_chunk.append(sentence)
-                current_size += sentence_size
+            piece_start, piece_tokens = sentence_end, 0
         
-        # Add the last chunk if it's not empty
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
+        elif piece_tokens + sentence_tokens > max_tokens:
+            pieces.append((piece_start, sentence_start, piece_tokens))
+            piece_start, piece_tokens = sentence_start, sentence_tokens
         
-        return chunks
+        else:
+            piece_tokens += sentence_tokens
     
-    except Exception as e:
-        logger.error(f"Error chunking text: {str(e)}")
+    if piece_tokens:
+        pieces.append((piece_start, end, piece_tokens))
+    
+    return pieces
+
+def chunk_by_clauses(text: str, max_tokens: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Split a contract into chunks that follow its article/section/subsection structure.
+    
+    Clause headings are detected with precompiled patterns in one pass over the text.
+    Consecutive clauses of the same article are packed together while they fit in
+    max_tokens (counted with the model tokenizer), so a clause is only ever split when
+    it is longer than the budget on its own. Chunks do not overlap.
+    
+    Args:
+        text: The text to chunk.
+        max_tokens: Maximum tokens per chunk. Defaults to CHUNK_SIZE from environment variable.
         
-        # Fallback: simple chunking without respecting sentence boundaries
-        words = text.split()
-        chunks = []
+    Returns:
+        A list of chunk dictionaries with the keys:
+            text: The chunk text (text[start:end]).
+            clause: Clause number of the first clause in the chunk, or None for the preamble.
+            clauses: Clause numbers of all clauses in the chunk.
+            start, end: Character offsets of the chunk in text.
+            tokens: Token count of the chunk.
+    """
+    if not text:
+        logger.warning("Empty text provided for chunking.")
+        return []
+    
+    max_tokens = max_tokens or DEFAULT_CHUNK_SIZE
+    chunks = []
+    
+    def emit(start: int, end: int, tokens: int, labels: List[Optional[str]]):
+        start, end = _trim_span(text, start, end)
+        if start < end:
+            chunks.append({
+                "text": text[start:end],
+                "clause": labels[0],
+                "clauses": labels,
+                "start": start,
+                "end": end,
+                "tokens": tokens,
+            })
+    
+    current_start = current_end = 0
+    current_tokens = 0
+    current_labels: List[Optional[str]] = []
+    
+    for start, end, label in find_clauses(text):
+        tokens = count_tokens(text[start:end])
         
-        for i in range(0, len(words), chunk_size - chunk_overlap):
-            chunk = " ".join(words[i:i + chunk_size])
-            chunks.append(chunk)
+        # Start a new chunk at each article, or when this clause would overflow the budget
+        if current_labels and (current_tokens + tokens > max_tokens
+                               or _article_of(label) != _article_of(current_labels[-1])):
+            emit(current_start, current_end, current_tokens, current_labels)
+            current_labels = []
         
-        return chunks 
\ No newline at end of file
+        if tokens > max_tokens:
+            for piece_start, piece_end, piece_tokens in _split_span(text, start, end, max_tokens):
+                emit(piece_start, piece_end, piece_tokens, [label])
+            continue
+        
+        if not current_labels:
+            current_start, current_tokens = start, 0
+        current_end = end
+        current_tokens += tokens
+        current_labels.append(label)
+    
+    if current_labels:
+        emit(current_start, current_end, current_tokens, current_labels)
+    
+    return chunks
@@ -0,0 +1,152 @@
+"""
+Circuit breaker for calls to an external service.
+
+When the error rate of recent calls spikes, the breaker opens and callers fail
+fast instead of queueing up behind retries and timeouts. After a cooldown one
+trial call is let through; its outcome closes the breaker again or reopens it.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Deque, Optional, Tuple
+from dotenv import load_dotenv
+from utils import metrics
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables with encoding handling
+try:
+    load_dotenv(encoding='utf-8')
+except UnicodeDecodeError:
+    try:
+        load_dotenv(encoding='utf-16')
+    except UnicodeDecodeError:
+        try:
+            load_dotenv(encoding='latin1')
+        except Exception as e:
+            logger.error(f"Failed to load .env file: {str(e)}")
+
+# Error rate over the window at which the breaker opens
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+
+# Fewest calls in the window before the error rate is trusted
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "6"))
+
+# Length of the window of recent calls, in seconds
+CIRCUIT_WINDOW = float(os.getenv("CIRCUIT_WINDOW", "60"))
+
+# Time the breaker stays open before letting a trial call through, in seconds
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "30"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+# Gauge values exported for each state
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker.
+
+    Args:
+        name: Name used in logs and metrics labels.
+        error_rate: Error rate that opens the breaker. Defaults to value from environment variable.
+        min_calls: Fewest calls in the window before it can open. Defaults to value from environment variable.
+        window: Length of the window of recent calls, in seconds. Defaults to value from environment variable.
+        cooldown: Time spent open before a trial call, in seconds. Defaults to value from environment variable.
+    """
+
+    def __init__(self, name: str, error_rate: Optional[float] = None, min_calls: Optional[int] = None,
+                 window: Optional[float] = None, cooldown: Optional[float] = None):
+        self.name = name
+        self.error_rate = CIRCUIT_ERROR_RATE if error_rate is None else error_rate
+        self.min_calls = CIRCUIT_MIN_CALLS if min_calls is None else min_calls
+        self.window = CIRCUIT_WINDOW if window is None else window
+        self.cooldown = CIRCUIT_COOLDOWN if cooldown is None else cooldown
+
+        self._lock = threading.Lock()
+        self._calls: Deque[Tuple[float, bool]] = deque()  # (time, succeeded)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        metrics.set_gauge("circuit_state", _STATE_VALUES[CLOSED], breaker=name)
+
+    @property
+    def state(self) -> str:
+        """The current state: "closed", "half_open" or "open"."""
+        with self._lock:
+            return self._state
+
+    def _set_state(self, state: str) -> None:
+        if state != self._state:
+            logger.warning(f"Circuit breaker {self.name}: {self._state} -> {state}")
+            self._state = state
+            metrics.set_gauge("circuit_state", _STATE_VALUES[state], breaker=self.name)
+            metrics.increment("circuit_transitions_total", breaker=self.name, to=state)
+
+    def allow(self) -> bool:
+        """
+        Decide whether a call may go ahead.
+
+        Returns:
+            True if the call may be made; False if the breaker is open and the call
+            should fail fast.
+        """
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._set_state(HALF_OPEN)
+                self._trial_in_flight = False
+
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+
+        metrics.increment("circuit_rejected_total", breaker=self.name)
+        return False
+
+    def record(self, succeeded: bool) -> None:
+        """
+        Record the outcome of a call that allow() let through.
+
+        Args:
+            succeeded: Whether the call succeeded.
+        """
+        with self._lock:
+            now = time.monotonic()
+
+            if self._state == HALF_OPEN:
+                self._trial_in_flight = False
+                if succeeded:
+                    self._calls.clear()
+                    self._set_state(CLOSED)
+                else:
+                    self._opened_at = now
+                    self._set_state(OPEN)
+                return
+
+            self._calls.append((now, succeeded))
+            while self._calls and now - self._calls[0][0] > self.window:
+                self._calls.popleft()
+
+            failures = sum(1 for _, ok in self._calls if not ok)
+            if (self._state == CLOSED and len(self._calls) >= self.min_calls
+                    and failures / len(self._calls) >= self.error_rate):
+                self._opened_at = now
+                self._set_state(OPEN)
+
+    def release(self) -> None:
+        """
+        End a call that allow() let through without recording an outcome, e.g. one
+        rejected by a rate limit, which says nothing about the health of the service.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trial_in_flight = False
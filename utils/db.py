@@ -3,10 +3,14 @@ Database module for querying the pgvector-enabled PostgreSQL database.
 """
 import os
 import logging
+import itertools
 import psycopg2
 from psycopg2.extras import Json
 from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
+from utils.vector import Vector, VectorLike, encode_copy_binary
+from utils.retrieval_cache import RETRIEVAL_CACHE, RetrievalCache, cache_key, to_cached_hits
+from utils import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -34,6 +38,103 @@ DATABASE_URL = os.getenv("DATABASE_URL", "")
 if not DATABASE_URL:
     logger.warning("DATABASE_URL not found in environment variables. Database operations will fail.")
 
+# Dimensionality of knowledge_base.embedding
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+
+# Search mode: "exact" scans full-precision vectors; "halfvec", "binary" and
+# "matryoshka" take a shortlist from a compact copy of each embedding and rerank
+# it exactly on the full vectors
+SEARCH_MODE = os.getenv("SEARCH_MODE", "exact").lower()
+
+# Prefix length of the truncated, renormalized embedding used by "matryoshka" search
+MATRYOSHKA_DIMENSIONS = int(os.getenv("MATRYOSHKA_DIMENSIONS", "256"))
+
+# Shortlist size for two-stage search, as a multiple of top_k. Higher values
+# improve recall at the cost of latency.
+RERANK_FACTOR = int(os.getenv("RERANK_FACTOR", "4"))
+
+# Largest hnsw.ef_search pgvector accepts; HNSW scans return at most this many rows
+HNSW_MAX_EF_SEARCH = 1000
+
+# Hybrid search fuses full-text and vector rankings with reciprocal rank fusion
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "false").lower() in ("1", "true", "yes")
+
+# Text search configuration of knowledge_base.content_tsv
+TEXT_SEARCH_CONFIG = os.getenv("TEXT_SEARCH_CONFIG", "turkish")
+
+# Share of the fused score given to the full-text ranking (0 = vector only, 1 = full-text only)
+HYBRID_WEIGHT = float(os.getenv("HYBRID_WEIGHT", "0.5"))
+
+# Candidates taken from each ranking before fusion
+HYBRID_VECTOR_CANDIDATES = int(os.getenv("HYBRID_VECTOR_CANDIDATES", "20"))
+HYBRID_LEXICAL_CANDIDATES = int(os.getenv("HYBRID_LEXICAL_CANDIDATES", "20"))
+
+# Lexemes of a chunk used in the full-text query: the rarest ones in the knowledge base
+HYBRID_MAX_LEXEMES = int(os.getenv("HYBRID_MAX_LEXEMES", "8"))
+
+# RRF damping constant: a candidate at rank r scores weight / (RRF_K + r)
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Columns that may be returned for each similar entry
+RESULT_COLUMNS = (
+    "id", "fp", "chunk_index", "content", "meta_info",
+    "created_at", "updated_at", "file_id", "organization_id", "is_knowledge_base",
+)
+
+def _parse_columns(value: str) -> Tuple[str, ...]:
+    """Parse a comma-separated column projection, keeping "id" first and dropping unknown columns."""
+    requested = [column.strip() for column in value.split(",") if column.strip()]
+    unknown = [column for column in requested if column not in RESULT_COLUMNS]
+    if unknown:
+        logger.warning(f"Ignoring unknown retrieval columns: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(["id"] + [column for column in requested if column in RESULT_COLUMNS]))
+
+# Columns fetched for each similar entry (comma-separated, from RESULT_COLUMNS).
+# Only id, content and meta_info are used by the revision prompts.
+RETRIEVAL_COLUMNS = _parse_columns(os.getenv("RETRIEVAL_COLUMNS", "id,content,meta_info"))
+
+# Cosine distance above which entries are not returned, applied in the query (unset = no cutoff)
+SEARCH_MAX_DISTANCE = float(os.getenv("SEARCH_MAX_DISTANCE")) if os.getenv("SEARCH_MAX_DISTANCE") else None
+
+# Adaptive k: up to ADAPTIVE_K_MAX entries are returned, the ones past top_k only
+# while each is within ADAPTIVE_K_GAP of the distance of the previous one (0 = off)
+ADAPTIVE_K_MAX = int(os.getenv("ADAPTIVE_K_MAX", "0"))
+ADAPTIVE_K_GAP = float(os.getenv("ADAPTIVE_K_GAP", "0.02"))
+
+# Rows fetched per round trip once the first top_k rows are in
+ADAPTIVE_FETCH_SIZE = 2
+
+# Names of the server-side cursors used by find_similar_entries
+_cursor_numbers = itertools.count()
+
+# Full-text query of a chunk: its max_lexemes rarest lexemes that occur in the
+# knowledge base (by document frequency in knowledge_base_lexemes), OR-ed together.
+# Each lexeme is quoted for tsquery input, with quotes doubled and backslashes escaped.
+RAREST_LEXEMES_QUERY = """
+    SELECT coalesce(string_agg(
+        '''' || replace(replace(word, '\\', '\\\\'), '''', '''''') || '''', ' | '), '')::tsquery AS tsq
+    FROM (
+        SELECT stats.word
+        FROM unnest(to_tsvector(%(config)s::regconfig, %(query_text)s)) chunk
+        JOIN knowledge_base_lexemes stats ON stats.word = chunk.lexeme
+        ORDER BY stats.ndoc, stats.word
+        LIMIT %(max_lexemes)s
+    ) rarest
+"""
+
+# Quantized copies of knowledge_base.embedding, keyed by search mode:
+# (column name, column type, expression computing it from embedding, index operator class, distance operator, query expression)
+QUANTIZED_COLUMNS = {
+    "halfvec": (
+        "embedding_half", "halfvec({dim})", "embedding::halfvec({dim})",
+        "halfvec_cosine_ops", "<=>", "%(embedding)s::vector::halfvec({dim})",
+    ),
+    "binary": (
+        "embedding_bin", "bit({dim})", "binary_quantize(embedding)::bit({dim})",
+        "bit_hamming_ops", "<~>", "binary_quantize(%(embedding)s::vector)::bit({dim})",
+    ),
+}
+
 def get_db_connection():
     """
     Create a connection to the PostgreSQL database.
@@ -55,79 +156,803 @@ def get_db_connection():
         logger.error(f"Error connecting to the database: {str(e)}")
         return None
 
-def find_similar_entries(embedding: List[float], top_k: int = 5) -> List[Dict[str, Any]]:
+def enable_quantized_storage(modes: Tuple[str, ...] = ("halfvec", "binary")) -> bool:
+    """
+    Add quantized copies of knowledge_base.embedding, each with its own HNSW index.
+    
+    The copies are stored generated columns, so they stay in sync with the
+    full-precision embedding on every insert and update. Safe to run repeatedly.
+    
+    Args:
+        modes: Which copies to create ("halfvec" and/or "binary").
+        
+    Returns:
+        True if successful, False otherwise.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return False
+        
+        with connection.cursor() as cursor:
+            for mode in modes:
+                if mode not in QUANTIZED_COLUMNS:
+                    raise ValueError(f"Unknown quantization mode: {mode}")
+                
+                column, column_type, expression, opclass, _, _ = QUANTIZED_COLUMNS[mode]
+                column_type = column_type.format(dim=EMBEDDING_DIMENSIONS)
+                expression = expression.format(dim=EMBEDDING_DIMENSIONS)
+                
+                logger.info(f"Adding {mode} copy of knowledge_base.embedding as {column}...")
+                cursor.execute(f"""
+                    ALTER TABLE knowledge_base
+                    ADD COLUMN IF NOT EXISTS {column} {column_type}
+                    GENERATED ALWAYS AS ({expression}) STORED;
+                """)
+                cursor.execute(f"""
+                    CREATE INDEX IF NOT EXISTS knowledge_base_{column}_idx
+                    ON knowledge_base USING hnsw ({column} {opclass});
+                """)
+        
+        connection.commit()
+        connection.close()
+        return True
+    
+    except Exception as e:
+        logger.error(f"Error enabling quantized storage: {str(e)}")
+        
+        if connection:
+            connection.rollback()
+            connection.close()
+        
+        return False
+
+def enable_matryoshka_column(dimensions: Optional[int] = None, batch_size: int = 5000) -> bool:
+    """
+    Add and backfill embedding_short, the first `dimensions` values of each
+    embedding renormalized to unit length, and index it for first-pass search.
+    
+    text-embedding-3 models are trained so that such a prefix is itself a usable
+    embedding, so the column is computed from the stored vectors without calling the API.
+    The backfill commits in batches and skips rows that are already filled, so it can
+    be interrupted and rerun. A trigger keeps the column in sync for new and updated rows.
+    
+    Args:
+        dimensions: Prefix length. Defaults to value from environment variable.
+        batch_size: Number of rows updated per transaction.
+        
+    Returns:
+        True if successful, False otherwise.
+    """
+    dimensions = dimensions or MATRYOSHKA_DIMENSIONS
+    if not 0 < dimensions < EMBEDDING_DIMENSIONS:
+        logger.error(f"Matryoshka dimensions must be between 1 and {EMBEDDING_DIMENSIONS - 1}.")
+        return False
+    
+    expression = f"l2_normalize(subvector({{source}}, 1, {dimensions}))::vector({dimensions})"
+    
+    connection = None
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return False
+        
+        with connection.cursor() as cursor:
+            logger.info(f"Adding embedding_short vector({dimensions}) to knowledge_base...")
+            cursor.execute(f"ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS embedding_short vector({dimensions});")
+            cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION knowledge_base_embedding_short() RETURNS trigger AS $$
+                BEGIN
+                    IF NEW.embedding IS NULL THEN
+                        NEW.embedding_short := NULL;
+                    ELSE
+                        NEW.embedding_short := {expression.format(source="NEW.embedding")};
+                    END IF;
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql;
+            """)
+            cursor.execute("DROP TRIGGER IF EXISTS knowledge_base_embedding_short ON knowledge_base;")
+            cursor.execute("""
+                CREATE TRIGGER knowledge_base_embedding_short
+                BEFORE INSERT OR UPDATE OF embedding ON knowledge_base
+                FOR EACH ROW EXECUTE FUNCTION knowledge_base_embedding_short();
+            """)
+            connection.commit()
+            
+            # Backfill existing rows in id order, one committed batch at a time
+            backfilled = 0
+            last_id = 0
+            while True:
+                cursor.execute(f"""
+                    WITH batch AS (
+                        SELECT id FROM knowledge_base
+                        WHERE id > %s AND embedding IS NOT NULL AND embedding_short IS NULL
+                        ORDER BY id
+                        LIMIT %s
+                    )
+                    UPDATE knowledge_base kb
+                    SET embedding_short = {expression.format(source="kb.embedding")}
+                    FROM batch
+                    WHERE kb.id = batch.id
+                    RETURNING kb.id;
+                """, (last_id, batch_size))
+                ids = [row[0] for row in cursor.fetchall()]
+                connection.commit()
+                
+                if not ids:
+                    break
+                last_id = max(ids)
+                backfilled += len(ids)
+                logger.info(f"Backfilled embedding_short for {backfilled} rows...")
+        
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS knowledge_base_embedding_short_idx
+                ON knowledge_base USING hnsw (embedding_short vector_cosine_ops);
+            """)
+        
+        connection.close()
+        logger.info(f"embedding_short is ready ({backfilled} rows backfilled).")
+        return True
+    
+    except Exception as e:
+        logger.error(f"Error enabling the matryoshka column: {str(e)}")
+        
+        if connection:
+            if not connection.autocommit:
+                connection.rollback()
+            connection.close()
+        
+        return False
+
+def enable_full_text_search(config: Optional[str] = None) -> bool:
+    """
+    Add content_tsv, a generated tsvector of knowledge_base.content, with a GIN index.
+    
+    Safe to run repeatedly. To switch to another text search configuration, drop
+    content_tsv first.
+    
+    Args:
+        config: Text search configuration. Defaults to value from environment variable.
+        
+    Returns:
+        True if successful, False otherwise.
+    """
+    config = config or TEXT_SEARCH_CONFIG
+    
+    connection = None
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return False
+        
+        with connection.cursor() as cursor:
+            logger.info(f"Adding content_tsv ({config}) to knowledge_base...")
+            # psycopg2 inlines the config as a constant, which keeps the expression immutable
+            cursor.execute("""
+                ALTER TABLE knowledge_base
+                ADD COLUMN IF NOT EXISTS content_tsv tsvector
+                GENERATED ALWAYS AS (to_tsvector(%s::regconfig, coalesce(content, ''))) STORED;
+            """, (config,))
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS knowledge_base_content_tsv_idx
+                ON knowledge_base USING gin (content_tsv);
+            """)
+        
+        connection.commit()
+        connection.close()
+        return refresh_lexeme_statistics()
+    
+    except Exception as e:
+        logger.error(f"Error enabling full-text search: {str(e)}")
+        
+        if connection:
+            connection.rollback()
+            connection.close()
+        
+        return False
+
+def refresh_lexeme_statistics() -> bool:
+    """
+    Rebuild knowledge_base_lexemes, the number of knowledge base entries containing
+    each lexeme of content_tsv.
+    
+    Hybrid search ORs the rarest lexemes of a chunk by these counts, so run this
+    again after large changes to the knowledge base. Lexemes added since the last
+    refresh are not used in full-text queries until then.
+    
+    Returns:
+        True if successful, False otherwise.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return False
+        
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS knowledge_base_lexemes (
+                    word text PRIMARY KEY,
+                    ndoc integer NOT NULL
+                );
+            """)
+            cursor.execute("TRUNCATE knowledge_base_lexemes;")
+            cursor.execute("""
+                INSERT INTO knowledge_base_lexemes (word, ndoc)
+                SELECT word, ndoc
+                FROM ts_stat('SELECT content_tsv FROM knowledge_base WHERE is_knowledge_base = TRUE');
+            """)
+            count = cursor.rowcount
+            cursor.execute("ANALYZE knowledge_base_lexemes;")
+        
+        connection.commit()
+        connection.close()
+        logger.info(f"Refreshed document frequencies of {count} lexemes.")
+        return True
+    
+    except Exception as e:
+        logger.error(f"Error refreshing lexeme statistics: {str(e)}")
+        
+        if connection:
+            connection.rollback()
+            connection.close()
+        
+        return False
+
+def _first_stage(search_mode: str) -> Tuple[str, str, str]:
+    """
+    Return the column, distance operator and query expression for the first stage
+    of a two-stage search mode.
+    
+    Args:
+        search_mode: One of the keys of QUANTIZED_COLUMNS, or "matryoshka".
+        
+    Returns:
+        A tuple of (column, operator, query expression using %(embedding)s).
+    """
+    if search_mode == "matryoshka":
+        return (
+            "embedding_short", "<=>",
+            f"l2_normalize(subvector(%(embedding)s::vector, 1, {MATRYOSHKA_DIMENSIONS}))::vector({MATRYOSHKA_DIMENSIONS})",
+        )
+    
+    if search_mode not in QUANTIZED_COLUMNS:
+        raise ValueError(f"Unknown search mode: {search_mode}")
+    
+    column, _, _, _, operator, query_expression = QUANTIZED_COLUMNS[search_mode]
+    return column, operator, query_expression.format(dim=EMBEDDING_DIMENSIONS)
+
+def _build_similarity_query(search_mode: str, columns: Tuple[str, ...] = RESULT_COLUMNS,
+                            max_distance: bool = False) -> str:
+    """
+    Build the similarity search query for a search mode.
+    
+    Args:
+        search_mode: "exact", "matryoshka" or one of the keys of QUANTIZED_COLUMNS.
+        columns: Columns of knowledge_base to select.
+        max_distance: Whether to leave out entries farther than %(max_distance)s.
+        
+    Returns:
+        SQL using the named parameters embedding, shortlist, top_k and, with
+        max_distance, max_distance.
+    """
+    columns = ", ".join(f"kb.{column}" for column in columns)
+    distance_condition = "kb.embedding <=> %(embedding)s::vector <= %(max_distance)s"
+    
+    if search_mode == "exact":
+        return f"""
+            SELECT {columns}, kb.embedding <=> %(embedding)s::vector AS similarity
+            FROM knowledge_base kb
+            WHERE kb.is_knowledge_base = TRUE{f" AND {distance_condition}" if max_distance else ""}
+            ORDER BY similarity ASC
+            LIMIT %(top_k)s
+        """
+    
+    column, operator, query_expression = _first_stage(search_mode)
+    
+    # Stage 1 walks the compact index for a shortlist; stage 2 reranks the
+    # shortlist with exact distances on the full-precision vectors.
+    return f"""
+        WITH shortlist AS (
+            SELECT id
+            FROM knowledge_base
+            WHERE is_knowledge_base = TRUE
+            ORDER BY {column} {operator} {query_expression}
+            LIMIT %(shortlist)s
+        )
+        SELECT {columns}, kb.embedding <=> %(embedding)s::vector AS similarity
+        FROM knowledge_base kb
+        JOIN shortlist USING (id)
+        {f"WHERE {distance_condition}" if max_distance else ""}
+        ORDER BY similarity ASC
+        LIMIT %(top_k)s
+    """
+
+def _build_hybrid_query(search_mode: str, columns: Tuple[str, ...] = RESULT_COLUMNS,
+                        max_distance: bool = False) -> str:
+    """
+    Build the hybrid search query: vector and full-text rankings fused with
+    reciprocal rank fusion in a single statement.
+    
+    Args:
+        search_mode: Search mode of the vector branch ("exact", "matryoshka" or one
+            of the keys of QUANTIZED_COLUMNS).
+        columns: Columns of knowledge_base to select.
+        max_distance: Whether to leave out fused entries farther than %(max_distance)s.
+        
+    Returns:
+        SQL using the named parameters embedding, query_text, config, weight, rrf_k,
+        vector_candidates, lexical_candidates, shortlist, top_k and, with
+        max_distance, max_distance.
+    """
+    columns = ", ".join(f"kb.{column}" for column in columns)
+    distance_filter = "WHERE kb.embedding <=> %(embedding)s::vector <= %(max_distance)s" if max_distance else ""
+    
+    if search_mode == "exact":
+        vector_branch = """
+            SELECT id, row_number() OVER (ORDER BY distance) AS rank
+            FROM (
+                SELECT id, embedding <=> %(embedding)s::vector AS distance
+                FROM knowledge_base
+                WHERE is_knowledge_base = TRUE
+                ORDER BY distance
+                LIMIT %(vector_candidates)s
+            ) nearest
+        """
+    else:
+        column, operator, query_expression = _first_stage(search_mode)
+        vector_branch = f"""
+            SELECT id, row_number() OVER (ORDER BY distance) AS rank
+            FROM (
+                SELECT id, embedding <=> %(embedding)s::vector AS distance
+                FROM (
+                    SELECT id, embedding
+                    FROM knowledge_base
+                    WHERE is_knowledge_base = TRUE
+                    ORDER BY {column} {operator} {query_expression}
+                    LIMIT %(shortlist)s
+                ) shortlist
+                ORDER BY distance
+                LIMIT %(vector_candidates)s
+            ) nearest
+        """
+    
+    # ANDing every word of a chunk matches almost nothing and ORing them all matches
+    # almost everything; OR only its rarest terms (a statute number, a defined term)
+    return f"""
+        WITH query AS ({RAREST_LEXEMES_QUERY}),
+        vector_hits AS ({vector_branch}),
+        lexical_hits AS (
+            SELECT id, row_number() OVER (ORDER BY score DESC) AS rank
+            FROM (
+                SELECT kb.id, ts_rank_cd(kb.content_tsv, query.tsq) AS score
+                FROM knowledge_base kb, query
+                WHERE kb.is_knowledge_base = TRUE AND kb.content_tsv @@ query.tsq
+                ORDER BY score DESC
+                LIMIT %(lexical_candidates)s
+            ) matching
+        ),
+        fused AS (
+            SELECT id, sum(score) AS rrf_score
+            FROM (
+                SELECT id, (1 - %(weight)s) / (%(rrf_k)s + rank) AS score FROM vector_hits
+                UNION ALL
+                SELECT id, %(weight)s / (%(rrf_k)s + rank) AS score FROM lexical_hits
+            ) ranked
+            GROUP BY id
+        )
+        SELECT {columns}, kb.embedding <=> %(embedding)s::vector AS similarity, fused.rrf_score
+        FROM knowledge_base kb
+        JOIN fused USING (id)
+        {distance_filter}
+        ORDER BY fused.rrf_score DESC, similarity ASC
+        LIMIT %(top_k)s
+    """
+
+def _row_bytes(row: Tuple) -> int:
+    """Estimate the bytes a result row takes on the wire (text as UTF-8, other values 8 bytes)."""
+    size = 0
+    for value in row:
+        if isinstance(value, str):
+            size += len(value.encode("utf-8"))
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            size += len(value)
+        elif value is not None:
+            size += 8
+    return size
+
+def find_similar_entries(embedding: VectorLike, top_k: int = 5, connection=None,
+                         search_mode: Optional[str] = None,
+                         rerank_factor: Optional[int] = None,
+                         query_text: Optional[str] = None,
+                         hybrid: Optional[bool] = None,
+                         weight: Optional[float] = None,
+                         vector_candidates: Optional[int] = None,
+                         lexical_candidates: Optional[int] = None,
+                         columns: Optional[Tuple[str, ...]] = None,
+                         max_distance: Optional[float] = None,
+                         adaptive_k_max: Optional[int] = None,
+                         adaptive_k_gap: Optional[float] = None) -> List[Dict[str, Any]]:
     """
     Find the most similar entries in the knowledge_base table using cosine similarity.
     
+    Rows are streamed from a server-side cursor. With adaptive k, entries past top_k
+    are fetched a few at a time and only while the distance gap to the previous entry
+    stays within adaptive_k_gap, so the rest are never transferred. The rows and
+    estimated bytes returned are added to the retrieval_rows_total,
+    retrieval_bytes_total and retrieval_queries_total metrics.
+    
     Args:
-        embedding: The embedding vector to compare against.
+        embedding: The embedding vector to compare against (list of floats or NumPy array).
         top_k: Number of similar entries to return.
+        connection: Optional open connection to reuse. If not provided, a new connection
+            is opened and closed for this query.
+        search_mode: "exact", "halfvec", "binary" or "matryoshka". Defaults to value from
+            environment variable. The quantized modes need enable_quantized_storage() and
+            "matryoshka" needs enable_matryoshka_column() to have been run.
+        rerank_factor: Shortlist size as a multiple of top_k (of vector_candidates in
+            hybrid search) for the two-stage modes. Defaults to value from environment variable.
+        query_text: The text the embedding was made from, for the full-text branch of
+            hybrid search.
+        hybrid: Whether to fuse full-text and vector rankings. Defaults to value from
+            environment variable; needs query_text and enable_full_text_search().
+        weight: Share of the fused score given to the full-text ranking.
+            Defaults to value from environment variable.
+        vector_candidates: Candidates taken from the vector ranking before fusion.
+            Defaults to value from environment variable.
+        lexical_candidates: Candidates taken from the full-text ranking before fusion.
+            Defaults to value from environment variable.
+        columns: Columns of knowledge_base to return, from RESULT_COLUMNS; "id" is
+            always included. Defaults to value from environment variable.
+        max_distance: Cosine distance above which entries are left out.
+            Defaults to value from environment variable (no cutoff if unset).
+        adaptive_k_max: Most entries to return with adaptive k; at most top_k turns
+            adaptive k off. Not used in hybrid search, whose results are ordered by
+            fused score. Defaults to value from environment variable.
+        adaptive_k_gap: Largest distance gap between consecutive entries past top_k.
+            Defaults to value from environment variable.
         
     Returns:
-        List of dictionaries containing the similar entries.
+        List of dictionaries containing the similar entries. "similarity" is the cosine
+        distance; hybrid search also returns the fused "rrf_score".
     """
-    if not embedding:
+    if embedding is None or len(embedding) == 0:
         logger.error("No embedding provided for similarity search.")
         return []
     
+    search_mode = search_mode or SEARCH_MODE
+    hybrid = (HYBRID_SEARCH if hybrid is None else hybrid) and bool(query_text and query_text.strip())
+    columns = _parse_columns(",".join(columns)) if columns else RETRIEVAL_COLUMNS
+    max_distance = SEARCH_MAX_DISTANCE if max_distance is None else max_distance
+    adaptive_k_gap = ADAPTIVE_K_GAP if adaptive_k_gap is None else adaptive_k_gap
+    limit = top_k if hybrid else max(top_k, ADAPTIVE_K_MAX if adaptive_k_max is None else adaptive_k_max)
+    vector_candidates = vector_candidates or HYBRID_VECTOR_CANDIDATES
+    shortlist = (vector_candidates if hybrid else limit) * max(1, rerank_factor or RERANK_FACTOR)
+    owns_connection = connection is None
+    
     try:
-        connection = get_db_connection()
+        if owns_connection:
+            connection = get_db_connection()
         if not connection:
             return []
         
-        with connection.cursor() as cursor:
-            # Query to find the most similar entries using cosine similarity
-            query = """
-            SELECT id, fp, chunk_index, content, meta_info, 
-                   created_at, updated_at, file_id, organization_id, 
-                   is_knowledge_base, embedding <=> %s::vector AS similarity
-            FROM knowledge_base
-            WHERE is_knowledge_base = TRUE
-            ORDER BY similarity ASC
-            LIMIT %s;
-            """
-            
-            cursor.execute(query, (embedding, top_k))
-            columns = [desc[0] for desc in cursor.description]
-            results = []
+        if hybrid:
+            query = _build_hybrid_query(search_mode, columns, max_distance is not None)
+        else:
+            query = _build_similarity_query(search_mode, columns, max_distance is not None)
+        
+        if search_mode != "exact":
+            with connection.cursor() as cursor:
+                # HNSW returns at most ef_search rows, so widen it to cover the shortlist
+                if shortlist > HNSW_MAX_EF_SEARCH:
+                    logger.warning(f"Shortlist of {shortlist} exceeds the largest hnsw.ef_search "
+                                   f"({HNSW_MAX_EF_SEARCH}); at most {HNSW_MAX_EF_SEARCH} candidates are reranked.")
+                ef_search = min(HNSW_MAX_EF_SEARCH, max(40, shortlist))
+                cursor.execute("SELECT set_config('hnsw.ef_search', %s, true);", (str(ef_search),))
+        
+        # Vector renders as a pgvector literal instead of a numeric ARRAY[...]
+        params = {"embedding": Vector(embedding), "shortlist": shortlist, "top_k": limit,
+                  "max_distance": max_distance}
+        if hybrid:
+            params.update({
+                "query_text": query_text,
+                "config": TEXT_SEARCH_CONFIG,
+                "weight": HYBRID_WEIGHT if weight is None else weight,
+                "rrf_k": RRF_K,
+                "vector_candidates": vector_candidates,
+                "lexical_candidates": lexical_candidates or HYBRID_LEXICAL_CANDIDATES,
+                "max_lexemes": HYBRID_MAX_LEXEMES,
+            })
+        
+        results = []
+        fetched_rows = fetched_bytes = 0
+        # A named cursor keeps the result set on the server and streams it in batches
+        with connection.cursor(name=f"similar_entries_{next(_cursor_numbers)}") as cursor:
+            cursor.execute(query, params)
+            batch_size = top_k
+            rows = cursor.fetchmany(batch_size)
+            names = [desc[0] for desc in cursor.description] if cursor.description else []
             
-            for row in cursor.fetchall():
-                result = dict(zip(columns, row))
-                # Don't include the embedding in the result to save memory
-                if 'embedding' in result:
-                    del result['embedding']
-                results.append(result)
+            while rows:
+                fetched_rows += len(rows)
+                fetched_bytes += sum(_row_bytes(row) for row in rows)
+                gap_exceeded = False
+                for row in rows:
+                    result = dict(zip(names, row))
+                    # Past top_k, stop at the first entry that falls away from the previous one
+                    if len(results) >= top_k and result["similarity"] - results[-1]["similarity"] > adaptive_k_gap:
+                        gap_exceeded = True
+                        break
+                    results.append(result)
+                if gap_exceeded or len(results) >= limit or len(rows) < batch_size:
+                    break
+                batch_size = ADAPTIVE_FETCH_SIZE
+                rows = cursor.fetchmany(batch_size)
         
-        connection.close()
+        metrics.increment("retrieval_queries_total", search_mode=search_mode)
+        metrics.increment("retrieval_rows_total", fetched_rows, search_mode=search_mode)
+        metrics.increment("retrieval_bytes_total", fetched_bytes, search_mode=search_mode)
+        logger.debug(f"Similarity search returned {len(results)} entries ({fetched_rows} rows, {fetched_bytes} bytes).")
+        
+        if owns_connection:
+            connection.close()
         return results
     
     except Exception as e:
         logger.error(f"Error finding similar entries: {str(e)}")
         
-        # Close connection if it exists
-        if 'connection' in locals() and connection:
+        if owns_connection and connection:
             connection.close()
+        elif connection:
+            # Clear the aborted transaction so the shared connection stays usable
+            connection.rollback()
         
         return []
 
-def find_similar_entries_batch(embeddings: List[List[float]], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+def knowledge_base_version(connection) -> str:
+    """
+    Summarize the state of the knowledge base as a version string.
+    
+    The version changes whenever entries are inserted, deleted, or updated with a
+    new updated_at, which is what invalidates cached search results.
+    
+    Args:
+        connection: Open database connection.
+        
+    Returns:
+        The version string.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT count(*), max(id), max(greatest(created_at, updated_at))
+            FROM knowledge_base
+            WHERE is_knowledge_base = TRUE;
+        """)
+        count, max_id, last_change = cursor.fetchone()
+    
+    return f"{count}:{max_id}:{last_change.isoformat() if last_change else ''}"
+
+def fetch_entries_by_id(ids: List[int], connection) -> Dict[int, Dict[str, Any]]:
+    """
+    Fetch knowledge base entries by primary key in a single query.
+    
+    Args:
+        ids: Entry ids.
+        connection: Open database connection.
+        
+    Returns:
+        Entries keyed by id, with the columns in RETRIEVAL_COLUMNS. Ids that no longer
+        exist are missing.
+    """
+    if not ids:
+        return {}
+    
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {', '.join(RETRIEVAL_COLUMNS)} FROM knowledge_base WHERE id = ANY(%s);",
+            (list(ids),)
+        )
+        return {row[0]: dict(zip(RETRIEVAL_COLUMNS, row)) for row in cursor.fetchall()}
+
+def _transfer_totals(search_mode: str) -> Tuple[float, float]:
+    """Return the rows and bytes returned by similarity searches of a mode so far."""
+    counters = metrics.snapshot()["counters"]
+    return (counters.get(f'retrieval_rows_total{{search_mode="{search_mode}"}}', 0),
+            counters.get(f'retrieval_bytes_total{{search_mode="{search_mode}"}}', 0))
+
+def find_similar_entries_batch(embeddings: List[VectorLike], top_k: int = 5,
+                               search_mode: Optional[str] = None,
+                               rerank_factor: Optional[int] = None,
+                               query_texts: Optional[List[str]] = None,
+                               hybrid: Optional[bool] = None,
+                               use_cache: Optional[bool] = None) -> List[List[Dict[str, Any]]]:
     """
     Find the most similar entries for multiple embeddings.
     
+    All queries share a single database connection. With the retrieval cache on,
+    searches already cached for the current knowledge base version skip the vector
+    search; their entries are fetched by id in one query.
+    
     Args:
         embeddings: List of embedding vectors.
         top_k: Number of similar entries to return for each embedding.
+        search_mode: Search mode passed to find_similar_entries.
+        rerank_factor: Shortlist multiple passed to find_similar_entries.
+        query_texts: Texts the embeddings were made from, for hybrid search.
+        hybrid: Whether to use hybrid search, passed to find_similar_entries.
+        use_cache: Whether to use the retrieval cache. Defaults to value from environment variable.
         
     Returns:
         List of lists of dictionaries containing the similar entries.
     """
-    results = []
+    use_cache = RETRIEVAL_CACHE if use_cache is None else use_cache
+    search_mode = search_mode or SEARCH_MODE
+    hybrid = HYBRID_SEARCH if hybrid is None else hybrid
+    results: List[Optional[List[Dict[str, Any]]]] = [None] * len(embeddings)
+    
+    connection = get_db_connection()
+    if not connection:
+        return [[] for _ in embeddings]
+    
+    cache = None
+    try:
+        keys = []
+        cached = {}
+        if use_cache:
+            try:
+                cache = RetrievalCache()
+                version = knowledge_base_version(connection)
+                for i, embedding in enumerate(embeddings):
+                    query_text = query_texts[i] if query_texts and hybrid else None
+                    keys.append(cache_key(embedding, top_k, {
+                        "search_mode": search_mode,
+                        "rerank_factor": rerank_factor or RERANK_FACTOR,
+                        "hybrid": [query_text, HYBRID_WEIGHT, HYBRID_VECTOR_CANDIDATES,
+                                   HYBRID_LEXICAL_CANDIDATES, HYBRID_MAX_LEXEMES, RRF_K,
+                                   TEXT_SEARCH_CONFIG] if query_text else None,
+                        "max_distance": SEARCH_MAX_DISTANCE,
+                        "adaptive_k": [ADAPTIVE_K_MAX, ADAPTIVE_K_GAP] if ADAPTIVE_K_MAX > top_k else None,
+                    }))
+                cached = cache.get_many(keys, version)
+            except Exception as e:
+                logger.warning(f"Retrieval cache unavailable, searching directly: {str(e)}")
+                connection.rollback()
+                cache, keys = None, []
+        
+        # Hydrate cache hits with one fetch by primary key
+        if cached:
+            entries = fetch_entries_by_id([hit[0] for hits in cached.values() for hit in hits], connection)
+            for i, key in enumerate(keys):
+                hits = cached.get(key)
+                if hits is None or any(entry_id not in entries for entry_id, _, _ in hits):
+                    continue
+                results[i] = []
+                for entry_id, distance, rrf_score in hits:
+                    result = dict(entries[entry_id], similarity=distance)
+                    if rrf_score is not None:
+                        result["rrf_score"] = rrf_score
+                    results[i].append(result)
+        
+        misses = [i for i, result in enumerate(results) if result is None]
+        rows_before, bytes_before = _transfer_totals(search_mode)
+        for i in misses:
+            results[i] = find_similar_entries(embeddings[i], top_k, connection=connection,
+                                              search_mode=search_mode, rerank_factor=rerank_factor,
+                                              query_text=query_texts[i] if query_texts else None,
+                                              hybrid=hybrid)
+        
+        if misses:
+            rows_after, bytes_after = _transfer_totals(search_mode)
+            logger.info(f"Similarity search: {len(misses)} queries returned {int(rows_after - rows_before)} rows, "
+                        f"{(bytes_after - bytes_before) / len(misses):.0f} bytes per query.")
+        
+        if cache:
+            logger.info(f"Retrieval cache: {len(embeddings) - len(misses)} hits, {len(misses)} misses.")
+            # Empty results may come from a failed query, so they are not cached
+            cache.put_many(((keys[i], to_cached_hits(results[i])) for i in misses if results[i]), version)
+    
+    except Exception as e:
+        logger.error(f"Error in batch similarity search: {str(e)}")
+    
+    finally:
+        if cache:
+            cache.close()
+        connection.close()
+    
+    return [result if result is not None else [] for result in results]
+
+# Column order and binary COPY types used by bulk_insert_entries. The types are
+# checked against the table before each COPY, since meta_info may be json/jsonb.
+KNOWLEDGE_BASE_COPY_COLUMNS = (
+    ("fp", "varchar"),
+    ("chunk_index", "int4"),
+    ("content", "text"),
+    ("embedding", "vector"),
+    ("meta_info", "varchar"),
+    ("file_id", "int4"),
+    ("organization_id", "int4"),
+    ("is_knowledge_base", "bool"),
+)
+
+def _column_types(cursor, table: str, columns: List[str]) -> Dict[str, str]:
+    """
+    Look up the type names of table columns.
     
-    for embedding in embeddings:
-        similar_entries = find_similar_entries(embedding, top_k)
-        results.append(similar_entries)
+    Args:
+        cursor: Open cursor.
+        table: Table name, in the current schema.
+        columns: Column names.
+        
+    Returns:
+        Type names (e.g. "varchar", "jsonb", "vector") keyed by column name.
+    """
+    cursor.execute("""
+        SELECT column_name, udt_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND column_name = ANY(%s);
+    """, (table, columns))
+    return dict(cursor.fetchall())
+
+def bulk_insert_entries(entries: List[Dict[str, Any]]) -> int:
+    """
+    Insert knowledge base entries with a single binary COPY.
+    
+    Embeddings are sent in pgvector's binary format, so the server does not have to
+    parse thousands of decimal literals per row. Each field is encoded for the type
+    the column actually has, so meta_info may be varchar, text, json or jsonb
+    (json values are serialized like psycopg2.extras.Json).
+    
+    Args:
+        entries: List of dictionaries keyed by the names in KNOWLEDGE_BASE_COPY_COLUMNS.
+            Missing keys are inserted as NULL, except is_knowledge_base which defaults to True.
+        
+    Returns:
+        The number of rows inserted (0 if an error occurred).
+    """
+    if not entries:
+        return 0
     
-    return results
+    columns = [name for name, _ in KNOWLEDGE_BASE_COPY_COLUMNS]
+    rows = (
+        [entry.get(name, True if name == "is_knowledge_base" else None) for name in columns]
+        for entry in entries
+    )
+    
+    connection = None
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return 0
+        
+        with connection.cursor() as cursor:
+            table_types = _column_types(cursor, "knowledge_base", columns)
+            column_types = [table_types.get(name, pg_type) for name, pg_type in KNOWLEDGE_BASE_COPY_COLUMNS]
+            stream = encode_copy_binary(rows, column_types)
+            
+            cursor.copy_expert(
+                f"COPY knowledge_base ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)",
+                stream
+            )
+            inserted = cursor.rowcount
+        
+        connection.commit()
+        connection.close()
+        logger.info(f"Inserted {inserted} entries into the knowledge base.")
+        return inserted
+    
+    except Exception as e:
+        logger.error(f"Error bulk inserting entries: {str(e)}")
+        
+        if connection:
+            connection.rollback()
+            connection.close()
+        
+        return 0
 
 def test_db_connection() -> Tuple[bool, str]:
     """
@@ -0,0 +1,155 @@
+"""
+Near-duplicate detection module for collapsing repeated contract chunks.
+
+Contracts repeat a lot of text: signature blocks, definition boilerplate and the
+overlap between consecutive chunks. Chunks are fingerprinted with SimHash over word
+shingles and grouped when their fingerprints differ in only a few bits, so each
+group can be embedded and searched once and the results fanned back out to every member.
+"""
+import os
+import re
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables with encoding handling
+try:
+    load_dotenv(encoding='utf-8')
+except UnicodeDecodeError:
+    try:
+        load_dotenv(encoding='utf-16')
+    except UnicodeDecodeError:
+        try:
+            load_dotenv(encoding='latin1')
+        except Exception as e:
+            logger.error(f"Failed to load .env file: {str(e)}")
+
+# Whether the pipeline collapses near-duplicate chunks
+DEDUP_CHUNKS = os.getenv("DEDUP_CHUNKS", "true").lower() in ("1", "true", "yes")
+
+# Maximum number of differing SimHash bits (out of 64) for two chunks to be grouped
+DEFAULT_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "3"))
+
+# Number of consecutive words per shingle
+SHINGLE_SIZE = 3
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+def _shingle_hashes(text: str, shingle_size: int = SHINGLE_SIZE) -> np.ndarray:
+    """
+    Hash the word shingles of a text to 64-bit integers.
+
+    Args:
+        text: The text to shingle.
+        shingle_size: Number of consecutive words per shingle.
+
+    Returns:
+        An array of uint64 shingle hashes.
+    """
+    words = _WORD_PATTERN.findall(text.casefold())
+    if len(words) <= shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    digests = b"".join(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest() for shingle in shingles)
+    return np.frombuffer(digests, dtype=np.uint64)
+
+def simhash(text: str) -> int:
+    """
+    Compute the 64-bit SimHash fingerprint of a text.
+
+    Each bit of the fingerprint is the majority vote of that bit over all shingle hashes,
+    so texts sharing most of their shingles get fingerprints that differ in few bits.
+
+    Args:
+        text: The text to fingerprint.
+
+    Returns:
+        The fingerprint as a Python int.
+    """
+    hashes = _shingle_hashes(text)
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(-1, 64)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 > len(hashes)
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+def collapse_near_duplicates(texts: Sequence[str], max_distance: Optional[int] = None) -> Tuple[List[int], List[int]]:
+    """
+    Group near-duplicate texts and pick one representative per group.
+
+    A text joins the first earlier representative whose fingerprint is within
+    max_distance bits; otherwise it becomes a representative itself. Candidates are
+    found through band buckets: with max_distance + 1 bands, two fingerprints within
+    max_distance bits always agree on at least one whole band.
+
+    Args:
+        texts: The texts to group (e.g. chunks from chunk_text).
+        max_distance: Maximum number of differing fingerprint bits. Defaults to value
+            from environment variable; 0 groups only texts with identical fingerprints.
+
+    Returns:
+        A tuple of (representatives, assignment): the indices of the representative texts
+        in their original order, and for each text the position of its group's
+        representative in that list.
+    """
+    if max_distance is None:
+        max_distance = DEFAULT_MAX_DISTANCE
+    max_distance = max(0, min(max_distance, 63))
+
+    band_count = max_distance + 1
+    band_width = 64 // band_count
+    band_mask = (1 << band_width) - 1
+
+    representatives: List[int] = []
+    fingerprints: List[int] = []
+    assignment: List[int] = []
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+
+    for index, text in enumerate(texts):
+        fingerprint = simhash(text)
+        bands = [(band, (fingerprint >> (band * band_width)) & band_mask) for band in range(band_count)]
+
+        group = None
+        for key in bands:
+            for candidate in buckets.get(key, ()):
+                if bin(fingerprint ^ fingerprints[candidate]).count("1") <= max_distance:
+                    group = candidate
+                    break
+            if group is not None:
+                break
+
+        if group is None:
+            group = len(representatives)
+            representatives.append(index)
+            fingerprints.append(fingerprint)
+            for key in bands:
+                buckets.setdefault(key, []).append(group)
+
+        assignment.append(group)
+
+    if texts:
+        logger.info(f"Collapsed {len(texts)} texts into {len(representatives)} distinct groups.")
+
+    return representatives, assignment
+
+def fan_out(values: Sequence[Any], assignment: Sequence[int]) -> List[Any]:
+    """
+    Expand per-representative results back to every member of each group.
+
+    Args:
+        values: One result per representative, in the order returned by collapse_near_duplicates.
+        assignment: The assignment returned by collapse_near_duplicates.
+
+    Returns:
+        One result per original text.
+    """
+    return [values[group] for group in assignment]
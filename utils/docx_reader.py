@@ -0,0 +1,176 @@
+"""
+Streaming DOCX text extraction module.
+
+Reads the WordprocessingML parts of a DOCX package (the main document, headers,
+footers, footnotes and endnotes) straight from the zip archive with an incremental
+XML parser. Media parts are never read, and parsed elements are released as soon as
+their paragraph is complete, so memory stays flat on large documents.
+"""
+import re
+import logging
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+WORD_NAMESPACE = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+_P = f"{{{WORD_NAMESPACE}}}p"
+_T = f"{{{WORD_NAMESPACE}}}t"
+_TAB = f"{{{WORD_NAMESPACE}}}tab"
+_BR = f"{{{WORD_NAMESPACE}}}br"
+_CR = f"{{{WORD_NAMESPACE}}}cr"
+_TBL = f"{{{WORD_NAMESPACE}}}tbl"
+_TR = f"{{{WORD_NAMESPACE}}}tr"
+_TC = f"{{{WORD_NAMESPACE}}}tc"
+
+# Text-bearing parts, in the order they are read
+MAIN_DOCUMENT_PART = "word/document.xml"
+_SECONDARY_PART_PATTERN = re.compile(r"^word/(header|footer)(\d*)\.xml$|^word/(footnotes|endnotes)\.xml$")
+
+# Characters that stand in for non-text run content. The DOCX writer relies on the
+# same mapping to line revised text back up with the runs.
+TAB_CHARACTER = "\t"
+BREAK_CHARACTER = " "
+
+def _part_sort_key(name: str) -> Tuple[int, int, str]:
+    """Order secondary parts as headers, footers, footnotes, endnotes, by number."""
+    match = _SECONDARY_PART_PATTERN.match(name)
+    kind = match.group(1) or match.group(3)
+    order = ["header", "footer", "footnotes", "endnotes"].index(kind)
+    number = int(match.group(2)) if match.group(2) else 0
+    return order, number, name
+
+def text_parts(archive: zipfile.ZipFile) -> List[str]:
+    """
+    List the text-bearing parts of a DOCX package in reading order.
+
+    Args:
+        archive: The open DOCX archive.
+
+    Returns:
+        Part names, starting with word/document.xml.
+    """
+    names = archive.namelist()
+    secondary = sorted((name for name in names if _SECONDARY_PART_PATTERN.match(name)), key=_part_sort_key)
+    return ([MAIN_DOCUMENT_PART] if MAIN_DOCUMENT_PART in names else []) + secondary
+
+def iter_part_paragraphs(archive: zipfile.ZipFile, part: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the paragraphs of one part in document order.
+
+    Args:
+        archive: The open DOCX archive.
+        part: The part name, e.g. "word/document.xml".
+
+    Yields:
+        A dictionary per paragraph with the keys:
+            part: The part name.
+            index: Ordinal of the paragraph among all w:p elements of the part,
+                counted in document order (nested paragraphs included).
+            kind: "paragraph", or "table_cell" for paragraphs inside a table.
+            table, row, col: Position of the innermost enclosing table cell
+                (table counted per part), or None outside tables.
+            text: The paragraph text.
+    """
+    paragraph_count = 0
+    table_count = 0
+    open_paragraphs: List[Tuple[int, List[str]]] = []
+    open_tables: List[List[int]] = []  # [table, row, col] per open table
+
+    with archive.open(part) as stream:
+        for event, element in ET.iterparse(stream, events=("start", "end")):
+            tag = element.tag
+
+            if event == "start":
+                if tag == _P:
+                    open_paragraphs.append((paragraph_count, []))
+                    paragraph_count += 1
+                elif tag == _TBL:
+                    open_tables.append([table_count, -1, -1])
+                    table_count += 1
+                elif tag == _TR and open_tables:
+                    open_tables[-1][1] += 1
+                    open_tables[-1][2] = -1
+                elif tag == _TC and open_tables:
+                    open_tables[-1][2] += 1
+                continue
+
+            if tag == _T:
+                if open_paragraphs and element.text:
+                    open_paragraphs[-1][1].append(element.text)
+            elif tag == _TAB:
+                # w:tab inside w:pPr/w:tabs is a tab stop definition, not content
+                if open_paragraphs and element.attrib.get(f"{{{WORD_NAMESPACE}}}pos") is None:
+                    open_paragraphs[-1][1].append(TAB_CHARACTER)
+            elif tag in (_BR, _CR):
+                if open_paragraphs:
+                    open_paragraphs[-1][1].append(BREAK_CHARACTER)
+            elif tag == _P:
+                index, pieces = open_paragraphs.pop()
+                cell = open_tables[-1] if open_tables else None
+                yield {
+                    "part": part,
+                    "index": index,
+                    "kind": "table_cell" if cell else "paragraph",
+                    "table": cell[0] if cell else None,
+                    "row": cell[1] if cell else None,
+                    "col": cell[2] if cell else None,
+                    "text": "".join(pieces),
+                }
+                # Release the parsed paragraph subtree
+                element.clear()
+            elif tag == _TBL:
+                open_tables.pop()
+                element.clear()
+
+def iter_docx_blocks(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the paragraphs and table cell paragraphs of a DOCX file, main document
+    first, then headers, footers, footnotes and endnotes.
+
+    Args:
+        file_path: Path to the DOCX file.
+
+    Yields:
+        Paragraph dictionaries as described in iter_part_paragraphs.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        for part in text_parts(archive):
+            yield from iter_part_paragraphs(archive, part)
+
+def read_docx_blocks(file_path: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Extract the text of a DOCX file together with the position of every paragraph.
+
+    Paragraphs are joined with newlines. Each block gets "start" and "end" character
+    offsets into the returned text, so revised text can later be mapped back to the
+    paragraph it came from.
+
+    Args:
+        file_path: Path to the DOCX file.
+
+    Returns:
+        A tuple of (text, blocks), or None if an error occurred.
+    """
+    try:
+        blocks = []
+        offset = 0
+        for block in iter_docx_blocks(file_path):
+            block["start"] = offset
+            block["end"] = offset + len(block["text"])
+            offset = block["end"] + 1
+            blocks.append(block)
+
+        text = "\n".join(block["text"] for block in blocks)
+        return text, blocks
+
+    except Exception as e:
+        logger.error(f"Error streaming DOCX file {file_path}: {str(e)}")
+        return None
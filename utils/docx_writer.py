@@ -0,0 +1,446 @@
+"""
+In-place DOCX writeback module.
+
+Instead of building a new document from plain text, the revised contract is mapped
+back onto the paragraphs captured by utils.docx_reader and only the runs of changed
+paragraphs are rewritten in the original package. Parts without changes (styles,
+numbering, media, untouched headers and footers) are copied into the output archive
+byte-for-byte without being decompressed, so the work done scales with the edits
+rather than with the size of the document.
+"""
+import re
+import sys
+import copy
+import shutil
+import struct
+import difflib
+import logging
+import zipfile
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+from utils.docx_reader import MAIN_DOCUMENT_PART, TAB_CHARACTER, BREAK_CHARACTER, WORD_NAMESPACE
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Paragraph start (possibly self-closing) and end tags. The lookahead keeps
+# <w:pPr>, <w:pStyle> etc. from matching.
+_PARAGRAPH_TAG_PATTERN = re.compile(r"<w:p(?=[\s>/])[^>]*?(/?)>|</w:p>")
+
+# Text-bearing run content, matching what utils.docx_reader extracts
+_SLOT_PATTERN = re.compile(
+    r"<w:t(?=[\s>/])[^>]*?(?:/>|>(?P<text>.*?)</w:t>)"
+    r"|(?P<tab><w:tab(?=[\s/>])[^>]*/>)"
+    r"|(?P<break><w:(?:br|cr)(?=[\s/>])[^>]*/>)",
+    re.DOTALL
+)
+
+# Attributes and markers that must stay unique when a paragraph is cloned
+_UNIQUE_ID_ATTRIBUTE_PATTERN = re.compile(r'\s+w14:(?:paraId|textId)="[^"]*"')
+_UNIQUE_MARKER_PATTERN = re.compile(
+    r"<w:(?:bookmarkStart|bookmarkEnd|commentRangeStart|commentRangeEnd)\b[^>]*/>"
+    r"|<w:r\b[^>]*>(?:(?!</w:r>).)*?<w:commentReference\b[^>]*/>.*?</w:r>",
+    re.DOTALL
+)
+
+# ZipFile writer attributes used to copy compressed member data as is. They are
+# stable across the CPython versions below; elsewhere members are recompressed.
+_RAW_COPY_ATTRIBUTES = ("fp", "start_dir", "filelist", "NameToInfo", "_didModify", "_writing")
+_RAW_COPY_VERSIONS = ((3, 8), (3, 14))
+_DATA_DESCRIPTOR_FLAG = 0x08
+_ENCRYPTED_FLAG = 0x01
+_ZIP64_LIMIT = zipfile.ZIP64_LIMIT
+
+# Module-internal unescaping for w:t contents (the inverse of xml.sax.saxutils.escape
+# plus the quote entities Word may emit)
+_ENTITIES = {"&lt;": "<", "&gt;": ">", "&quot;": '"', "&apos;": "'", "&amp;": "&"}
+_ENTITY_PATTERN = re.compile(r"&(?:lt|gt|quot|apos|amp|#\d+|#x[0-9a-fA-F]+);")
+
+def _unescape(text: str) -> str:
+    """Resolve the XML entities and character references in w:t contents."""
+    def replace(match):
+        entity = match.group()
+        if entity in _ENTITIES:
+            return _ENTITIES[entity]
+        if entity.startswith("&#x"):
+            return chr(int(entity[3:-1], 16))
+        return chr(int(entity[2:-1]))
+    return _ENTITY_PATTERN.sub(replace, text)
+
+def map_revision_to_blocks(blocks: List[Dict[str, Any]], revised_text: str) -> Tuple[Dict[Tuple[str, int], str], Dict[Tuple[str, int], List[str]]]:
+    """
+    Map a revised plain-text contract back onto the source paragraphs.
+
+    Non-empty revised lines are aligned with non-empty source paragraphs. Aligned pairs
+    whose text differs become changes, extra revised lines become paragraphs inserted
+    after the preceding source paragraph, and source paragraphs of the main document
+    with no counterpart are emptied. Paragraphs of headers, footers and notes are never
+    emptied, since the model often leaves them out of its answer.
+
+    Args:
+        blocks: Paragraph blocks from utils.docx_reader.read_docx_blocks.
+        revised_text: The revised contract text.
+
+    Returns:
+        A tuple of (changes, insertions): new text per (part, index) of changed
+        paragraphs, and lists of new paragraph texts to insert after (part, index).
+    """
+    source = [block for block in blocks if block["text"].strip()]
+    revised = [line for line in revised_text.split("\n") if line.strip()]
+
+    changes: Dict[Tuple[str, int], str] = {}
+    insertions: Dict[Tuple[str, int], List[str]] = {}
+
+    matcher = difflib.SequenceMatcher(
+        None, [block["text"].strip() for block in source], [line.strip() for line in revised], autojunk=False
+    )
+
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+
+        # Pair source paragraphs with revised lines in order
+        for block, line in zip(source[i1:i2], revised[j1:j2]):
+            changes[(block["part"], block["index"])] = line
+
+        # Source paragraphs left without a counterpart are removed from the main document
+        for block in source[i1 + (j2 - j1):i2]:
+            if block["part"] == MAIN_DOCUMENT_PART:
+                changes[(block["part"], block["index"])] = ""
+
+        # Revised lines left without a counterpart are inserted as new paragraphs
+        extra = revised[j1 + (i2 - i1):j2]
+        if extra:
+            anchor_position = min(i2, i1 + (j2 - j1)) - 1
+            if anchor_position < 0:
+                if source:
+                    # Nothing precedes the insertion: prepend it to the first paragraph
+                    first = source[0]
+                    key = (first["part"], first["index"])
+                    changes[key] = " ".join(extra + [changes.get(key, first["text"])])
+                continue
+            anchor = source[anchor_position]
+            insertions.setdefault((anchor["part"], anchor["index"]), []).extend(extra)
+
+    return changes, insertions
+
+def _paragraph_spans(xml: str, indexes: set) -> Dict[int, Tuple[int, int]]:
+    """
+    Locate paragraphs in a part by their ordinal, counted like utils.docx_reader does.
+
+    Args:
+        xml: The part XML.
+        indexes: Paragraph ordinals to locate.
+
+    Returns:
+        The (start, end) character span of each requested paragraph element.
+    """
+    spans = {}
+    stack: List[Tuple[int, int]] = []
+    ordinal = 0
+    remaining = len(indexes)
+
+    for match in _PARAGRAPH_TAG_PATTERN.finditer(xml):
+        if match.group().startswith("</"):
+            index, start = stack.pop()
+            if index in indexes:
+                spans[index] = (start, match.end())
+                remaining -= 1
+                if not remaining:
+                    break
+        elif match.group(1):
+            # Self-closing <w:p/>
+            if ordinal in indexes:
+                spans[ordinal] = (match.start(), match.end())
+                remaining -= 1
+                if not remaining:
+                    break
+            ordinal += 1
+        else:
+            stack.append((ordinal, match.start()))
+            ordinal += 1
+
+    return spans
+
+def _text_run(text: str) -> str:
+    """Render a plain run holding text."""
+    return f'<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+
+def _rewrite_paragraph(paragraph_xml: str, new_text: str, replace_all: bool = False) -> Optional[str]:
+    """
+    Rewrite the text of one paragraph, touching only the runs that change.
+
+    The longest common prefix and suffix of the old and new text are kept in their
+    original runs; the changed middle is written into the first text element it
+    overlaps, and text elements, tabs and breaks entirely inside it are removed.
+
+    Args:
+        paragraph_xml: The w:p element XML.
+        new_text: The new paragraph text.
+        replace_all: Rewrite the whole text instead of only the changed middle.
+
+    Returns:
+        The rewritten paragraph XML, or None if the paragraph cannot be rewritten
+        (it contains nested paragraphs, e.g. a text box).
+    """
+    inner = _PARAGRAPH_TAG_PATTERN.search(paragraph_xml, 1)
+    if inner and inner.end() != len(paragraph_xml):
+        return None
+
+    if paragraph_xml.endswith("/>"):
+        # Empty self-closing paragraph: give it a body with a single run
+        return paragraph_xml[:-2].rstrip() + ">" + (_text_run(new_text) if new_text else "") + "</w:p>"
+
+    # Text slots: (start, end, text, mutable)
+    slots = []
+    for match in _SLOT_PATTERN.finditer(paragraph_xml):
+        if match.group("tab") is not None:
+            if "w:pos=" in match.group("tab"):
+                continue  # tab stop definition in w:pPr/w:tabs
+            slots.append((match.start(), match.end(), TAB_CHARACTER, False))
+        elif match.group("break") is not None:
+            slots.append((match.start(), match.end(), BREAK_CHARACTER, False))
+        else:
+            slots.append((match.start(), match.end(), _unescape(match.group("text") or ""), True))
+
+    old_text = "".join(slot[2] for slot in slots)
+    if old_text == new_text:
+        return paragraph_xml
+
+    if not any(mutable for _, _, _, mutable in slots):
+        # No text element to reuse: append a run before </w:p>
+        end = paragraph_xml.rindex("</w:p>")
+        return paragraph_xml[:end] + _text_run(new_text) + paragraph_xml[end:]
+
+    # Changed range [prefix, len(old_text) - suffix) of the old text
+    prefix = suffix = 0
+    if not replace_all:
+        limit = min(len(old_text), len(new_text))
+        while prefix < limit and old_text[prefix] == new_text[prefix]:
+            prefix += 1
+        while suffix < limit - prefix and old_text[-1 - suffix] == new_text[-1 - suffix]:
+            suffix += 1
+    change_start, change_end = prefix, len(old_text) - suffix
+    middle = new_text[prefix:len(new_text) - suffix]
+
+    # Pick the text element that receives the middle: the first one overlapping the
+    # changed range, else the last one before it, else the first one after it
+    offsets = []
+    position = 0
+    for slot in slots:
+        offsets.append(position)
+        position += len(slot[2])
+
+    target = None
+    for i, (slot, offset) in enumerate(zip(slots, offsets)):
+        if slot[3] and offset <= change_end and offset + len(slot[2]) >= change_start:
+            target = i
+            break
+    if target is None:
+        before = [i for i, (slot, offset) in enumerate(zip(slots, offsets)) if slot[3] and offset < change_start]
+        after = [i for i, (slot, offset) in enumerate(zip(slots, offsets)) if slot[3] and offset >= change_end]
+        target = before[-1] if before else after[0]
+
+    replacements = []
+    for i, ((start, end, text, mutable), offset) in enumerate(zip(slots, offsets)):
+        slot_end = offset + len(text)
+        overlaps = offset < change_end and slot_end > change_start
+
+        if i == target:
+            head = text[:max(0, min(len(text), change_start - offset))]
+            tail = text[max(0, min(len(text), change_end - offset)):]
+            replacement = f'<w:t xml:space="preserve">{escape(head + middle + tail)}</w:t>'
+        elif overlaps and not mutable:
+            replacement = ""
+        elif overlaps:
+            head = text[:max(0, change_start - offset)]
+            tail = text[max(0, change_end - offset):] if change_end < slot_end else ""
+            replacement = f'<w:t xml:space="preserve">{escape(head + tail)}</w:t>'
+        else:
+            continue
+        replacements.append((start, end, replacement))
+
+    for start, end, replacement in reversed(replacements):
+        paragraph_xml = paragraph_xml[:start] + replacement + paragraph_xml[end:]
+
+    return paragraph_xml
+
+def _clone_paragraph(paragraph_xml: str, text: str) -> str:
+    """Copy a paragraph's properties and formatting for a new paragraph holding text."""
+    start_tag_end = paragraph_xml.index(">") + 1
+    start_tag = _UNIQUE_ID_ATTRIBUTE_PATTERN.sub("", paragraph_xml[:start_tag_end])
+    clone = start_tag + _UNIQUE_MARKER_PATTERN.sub("", paragraph_xml[start_tag_end:])
+    return _rewrite_paragraph(clone, text, replace_all=True) or ("<w:p>" + _text_run(text) + "</w:p>")
+
+def _rewrite_part(xml: str, changes: Dict[int, str], insertions: Dict[int, List[str]]) -> str:
+    """
+    Apply paragraph changes and insertions to one part.
+
+    Args:
+        xml: The part XML.
+        changes: New text per paragraph ordinal.
+        insertions: New paragraph texts to insert after each paragraph ordinal.
+
+    Returns:
+        The rewritten part XML.
+    """
+    spans = _paragraph_spans(xml, set(changes) | set(insertions))
+    pieces = []
+    position = 0
+
+    for index in sorted(spans, key=lambda i: spans[i][0]):
+        start, end = spans[index]
+        paragraph_xml = xml[start:end]
+
+        if index in changes:
+            rewritten = _rewrite_paragraph(paragraph_xml, changes[index])
+            if rewritten is None:
+                logger.warning(f"Skipping paragraph {index}: paragraphs with nested paragraphs are not rewritten.")
+            else:
+                paragraph_xml = rewritten
+
+        for text in insertions.get(index, []):
+            paragraph_xml += _clone_paragraph(xml[start:end], text)
+
+        pieces.append(xml[position:start])
+        pieces.append(paragraph_xml)
+        position = end
+
+    missing = (set(changes) | set(insertions)) - set(spans)
+    if missing:
+        logger.warning(f"{len(missing)} paragraphs were not found and left unchanged.")
+
+    pieces.append(xml[position:])
+    return "".join(pieces)
+
+def _can_copy_raw(info: zipfile.ZipInfo, target: zipfile.ZipFile) -> bool:
+    """Whether a member can be copied as compressed bytes: a known CPython ZipFile, no encryption, no ZIP64."""
+    return (_RAW_COPY_VERSIONS[0] <= sys.version_info[:2] < _RAW_COPY_VERSIONS[1]
+            and all(hasattr(target, attribute) for attribute in _RAW_COPY_ATTRIBUTES)
+            and not target._writing
+            and not info.flag_bits & _ENCRYPTED_FLAG
+            and max(info.file_size, info.compress_size, info.header_offset, target.start_dir) < _ZIP64_LIMIT)
+
+def _copy_member_raw(source: zipfile.ZipFile, info: zipfile.ZipInfo, target: zipfile.ZipFile) -> None:
+    """
+    Copy a member's compressed bytes into the target archive without recompressing.
+
+    This follows what ZipFile does when writing a member, but streams the
+    already-compressed data from the source archive.
+
+    Args:
+        source: The source archive (opened for reading).
+        info: The member to copy.
+        target: The target archive (opened for writing).
+    """
+    source_fp = source.fp
+    source_fp.seek(info.header_offset)
+    header = source_fp.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local file header for {info.filename}")
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    source_fp.seek(info.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+
+    new_info = copy.copy(info)
+    # Sizes and CRC are known, so they go in the local header instead of a data descriptor
+    new_info.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+
+    target.fp.seek(target.start_dir)
+    new_info.header_offset = target.fp.tell()
+    target.fp.write(new_info.FileHeader())
+
+    remaining = info.compress_size
+    while remaining:
+        data = source_fp.read(min(remaining, 1 << 20))
+        if not data:
+            raise zipfile.BadZipFile(f"Truncated data for {info.filename}")
+        target.fp.write(data)
+        remaining -= len(data)
+
+    target.start_dir = target.fp.tell()
+    target.filelist.append(new_info)
+    target.NameToInfo[new_info.filename] = new_info
+    target._didModify = True
+
+def _copy_member(source: zipfile.ZipFile, info: zipfile.ZipInfo, target: zipfile.ZipFile) -> None:
+    """
+    Copy a member into the target archive unchanged.
+
+    The compressed bytes are copied as is where _can_copy_raw allows; otherwise
+    (another Python implementation, encrypted or ZIP64 members) the member is
+    decompressed and recompressed with its original method and metadata.
+
+    Args:
+        source: The source archive (opened for reading).
+        info: The member to copy.
+        target: The target archive (opened for writing).
+    """
+    if _can_copy_raw(info, target):
+        _copy_member_raw(source, info, target)
+    else:
+        target.writestr(info, source.read(info), compress_type=info.compress_type)
+
+def save_docx_revision(source_path: str, blocks: List[Dict[str, Any]], revised_text: str, file_path: str) -> bool:
+    """
+    Save a revised contract by editing the original DOCX package in place.
+
+    Styles, numbering, tables and media of the original are kept. Only paragraphs whose
+    text changed are rewritten, and only the parts containing them are re-encoded; all
+    other zip members are copied byte-for-byte.
+
+    Args:
+        source_path: Path to the original DOCX file.
+        blocks: Paragraph blocks captured when the file was read
+            (utils.docx_reader.read_docx_blocks).
+        revised_text: The revised contract text.
+        file_path: Path to save the revised DOCX file.
+
+    Returns:
+        True if successful, False otherwise.
+    """
+    try:
+        changes, insertions = map_revision_to_blocks(blocks, revised_text)
+        logger.info(f"Writing {len(changes)} changed and {sum(len(v) for v in insertions.values())} inserted paragraphs.")
+
+        if not changes and not insertions:
+            shutil.copyfile(source_path, file_path)
+            return True
+
+        changes_by_part: Dict[str, Dict[int, str]] = {}
+        for (part, index), text in changes.items():
+            changes_by_part.setdefault(part, {})[index] = text
+        insertions_by_part: Dict[str, Dict[int, List[str]]] = {}
+        for (part, index), texts in insertions.items():
+            insertions_by_part.setdefault(part, {})[index] = texts
+        changed_parts = set(changes_by_part) | set(insertions_by_part)
+
+        with zipfile.ZipFile(source_path) as source, zipfile.ZipFile(file_path, "w") as target:
+            for info in source.infolist():
+                if info.filename not in changed_parts:
+                    _copy_member(source, info, target)
+                    continue
+
+                xml = source.read(info).decode("utf-8")
+                if f'xmlns:w="{WORD_NAMESPACE}"' not in xml:
+                    logger.warning(f"{info.filename} does not use the w: prefix; leaving it unchanged.")
+                    _copy_member(source, info, target)
+                    continue
+
+                xml = _rewrite_part(xml, changes_by_part.get(info.filename, {}),
+                                    insertions_by_part.get(info.filename, {}))
+
+                new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                new_info.compress_type = zipfile.ZIP_DEFLATED
+                new_info.external_attr = info.external_attr
+                target.writestr(new_info, xml.encode("utf-8"))
+
+        logger.info(f"DOCX saved successfully: {file_path}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error saving DOCX revision {file_path}: {str(e)}")
+        return False
@@ -0,0 +1,150 @@
+"""
+Edit operations returned by the model in place of a full revised text.
+
+The text sent for revision is split into clauses, each with an ID. The model
+answers with a list of edits, each naming a clause, a passage copied from that
+clause and its replacement. The edits are validated against the original text
+and applied locally, so the model only generates the changed passages.
+"""
+import re
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+from utils.chunker import find_clauses
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# A JSON object, possibly wrapped in a Markdown code fence
+_CODE_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", re.DOTALL)
+
+Segment = Tuple[str, int, int]  # (clause ID, start, end)
+
+def segment_text(text: str) -> List[Segment]:
+    """
+    Split a text into clauses and give each an ID the model can refer to.
+
+    Args:
+        text: The text to be revised.
+
+    Returns:
+        (clause ID, start, end) segments covering the non-blank clauses in order,
+        with IDs "C1", "C2", ...
+    """
+    segments = []
+    for start, end, _ in find_clauses(text):
+        if text[start:end].strip():
+            segments.append((f"C{len(segments) + 1}", start, end))
+    return segments
+
+def format_segments(text: str, segments: List[Segment]) -> str:
+    """
+    Render the clauses of a text with their IDs for a prompt.
+
+    Args:
+        text: The text to be revised.
+        segments: Its segments from segment_text.
+
+    Returns:
+        Each clause preceded by its ID in brackets, e.g. "[C1]".
+    """
+    return "\n\n".join(f"[{clause_id}]\n{text[start:end].strip()}" for clause_id, start, end in segments)
+
+def parse_edits(content: str) -> Optional[List[Dict[str, str]]]:
+    """
+    Parse the model's answer into edit operations.
+
+    Args:
+        content: The response content, a JSON object {"edits": [...]} where each edit
+            has the string fields "clause", "original" and "replacement".
+
+    Returns:
+        The edits, or None if the answer is not valid.
+    """
+    match = _CODE_FENCE_PATTERN.match(content or "")
+    try:
+        data = json.loads(match.group(1) if match else content)
+    except (TypeError, ValueError):
+        logger.warning("Edit response is not valid JSON.")
+        return None
+
+    edits = data.get("edits") if isinstance(data, dict) else data
+    if not isinstance(edits, list):
+        logger.warning("Edit response has no list of edits.")
+        return None
+
+    for edit in edits:
+        if not isinstance(edit, dict) or not all(isinstance(edit.get(key), str)
+                                                 for key in ("clause", "original", "replacement")):
+            logger.warning(f"Malformed edit in response: {str(edit)[:200]}")
+            return None
+    return edits
+
+def _locate(text: str, start: int, end: int, passage: str) -> Optional[Tuple[int, int]]:
+    """
+    Find the single occurrence of a passage within text[start:end].
+
+    Differences in whitespace are tolerated, since the model may reflow line breaks.
+
+    Returns:
+        The (start, end) offsets of the passage in text, or None if it occurs zero
+        or several times.
+    """
+    words = passage.split()
+    if not words:
+        return None
+    pattern = re.compile(r"\s+".join(re.escape(word) for word in words))
+    matches = list(pattern.finditer(text, start, end))
+    if len(matches) != 1:
+        return None
+    return matches[0].span()
+
+def apply_edits(text: str, segments: List[Segment], edits: List[Dict[str, str]]) -> Optional[str]:
+    """
+    Apply edit operations to a text.
+
+    Every edit must name a known clause and quote a passage that occurs exactly once
+    in that clause, and no two edits may overlap. An empty list of edits leaves the
+    text unchanged.
+
+    Args:
+        text: The original text.
+        segments: Its segments from segment_text.
+        edits: Edits from parse_edits.
+
+    Returns:
+        The edited text, or None if any edit does not apply cleanly.
+    """
+    spans = {clause_id: (start, end) for clause_id, start, end in segments}
+    located: List[Tuple[int, int, str]] = []
+
+    for edit in edits:
+        clause_id = edit["clause"].strip().strip("[]")
+        if clause_id not in spans:
+            logger.warning(f"Edit refers to unknown clause {edit['clause']!r}.")
+            return None
+
+        span = _locate(text, *spans[clause_id], edit["original"])
+        if span is None:
+            logger.warning(f"Edit passage not found exactly once in clause {clause_id}: {edit['original'][:80]!r}")
+            return None
+        located.append((span[0], span[1], edit["replacement"]))
+
+    located.sort()
+    for (_, previous_end, _), (next_start, _, _) in zip(located, located[1:]):
+        if next_start < previous_end:
+            logger.warning("Edits overlap.")
+            return None
+
+    pieces = []
+    position = 0
+    for start, end, replacement in located:
+        pieces.append(text[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
@@ -8,6 +8,8 @@ from typing import List, Dict, Any, Optional
 import openai
 from dotenv import load_dotenv
 from tqdm import tqdm
+from utils.tokenizer import count_tokens
+from utils.rate_limiter import before_request, after_response, after_rate_limit_error
 
 # Configure logging
 logging.basicConfig(
@@ -63,15 +65,20 @@ def get_embedding(text: str, model: Optional[str] = None) -> Optional[List[float
         
         for attempt in range(max_retries):
             try:
-                response = client.embeddings.create(
+                # Wait for shared quota, then read the updated limits off the response
+                before_request(model, count_tokens(text, model))
+                raw_response = client.embeddings.with_raw_response.create(
                     model=model,
                     input=text
                 )
+                after_response(model, raw_response.headers)
+                response = raw_response.parse()
                 return response.data[0].embedding
             
-            except openai.RateLimitError:
+            except openai.RateLimitError as e:
                 if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
+                    default_wait = retry_delay * (2 ** attempt)  # Exponential backoff
+                    wait_time = after_rate_limit_error(model, e.response.headers, default_wait)
                     logger.warning(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
                     time.sleep(wait_time)
                 else:
@@ -86,6 +93,51 @@ def get_embedding(text: str, model: Optional[str] = None) -> Optional[List[float
         logger.error(f"Unexpected error in get_embedding: {str(e)}")
         return None
 
+def create_embeddings(texts: List[str], model: Optional[str] = None) -> Optional[List[List[float]]]:
+    """
+    Embed several texts in one API call, retrying with exponential backoff on rate limits.
+    
+    Args:
+        texts: Non-empty texts to generate embeddings for.
+        model: The embedding model to use. Defaults to model specified in environment variable.
+        
+    Returns:
+        One embedding per text, in order, or None if the request failed.
+    """
+    model = model or EMBEDDING_MODEL
+    
+    # Retry mechanism for API rate limits
+    max_retries = 3
+    retry_delay = 5  # seconds
+    
+    for attempt in range(max_retries):
+        try:
+            # Wait for shared quota, then read the updated limits off the response
+            before_request(model, sum(count_tokens(text, model) for text in texts))
+            raw_response = client.embeddings.with_raw_response.create(
+                model=model,
+                input=texts
+            )
+            after_response(model, raw_response.headers)
+            response = raw_response.parse()
+            
+            return [embedding_data.embedding for embedding_data in response.data]
+        
+        except openai.RateLimitError as e:
+            if attempt < max_retries - 1:
+                default_wait = retry_delay * (2 ** attempt)  # Exponential backoff
+                wait_time = after_rate_limit_error(model, e.response.headers, default_wait)
+                logger.warning(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
+                time.sleep(wait_time)
+            else:
+                logger.error("Rate limit exceeded and max retries reached.")
+        
+        except Exception as e:
+            logger.error(f"Error generating embeddings batch: {str(e)}")
+            return None
+    
+    return None
+
 def get_embeddings_batch(texts: List[str], model: Optional[str] = None, 
                          batch_size: int = 10, show_progress: bool = True) -> List[Optional[List[float]]]:
     """
@@ -117,35 +169,11 @@ def get_embeddings_batch(texts: List[str], model: Optional[str] = None,
         for i in tqdm(range(0, len(texts), batch_size), disable=not show_progress, 
                      desc="Generating embeddings"):
             batch_texts = texts[i:i + batch_size]
+            batch_embeddings = create_embeddings(batch_texts, model)
             
-            # Retry mechanism for API rate limits
-            max_retries = 3
-            retry_delay = 5  # seconds
-            
-            for attempt in range(max_retries):
-                try:
-                    response = client.embeddings.create(
-                        model=model,
-                        input=batch_texts
-                    )
-                    
-                    # Store embeddings in the result list
-                    for j, embedding_data in enumerate(response.data):
-                        embeddings[i + j] = embedding_data.embedding
-                    
-                    break  # Exit retry loop if successful
-                
-                except openai.RateLimitError:
-                    if attempt < max_retries - 1:
-                        wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-                        logger.warning(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
-                        time.sleep(wait_time)
-                    else:
-                        logger.error("Rate limit exceeded and max retries reached.")
-                
-                except Exception as e:
-                    logger.error(f"Error generating embeddings batch: {str(e)}")
-                    break  # Exit retry loop if other error
+            # Store embeddings in the result list
+            if batch_embeddings:
+                embeddings[i:i + len(batch_embeddings)] = batch_embeddings
     
     except Exception as e:
         logger.error(f"Unexpected error in get_embeddings_batch: {str(e)}")
@@ -0,0 +1,197 @@
+"""
+Shared micro-batcher for embedding requests.
+
+Every document being processed submits its texts to one batcher per model and gets
+futures back. A background thread collects submissions from all callers and sends
+them as full-size embedding requests, waiting at most a few milliseconds for a batch
+to fill up. A text that is already queued or in flight is not sent again; its
+callers share the pending result.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from utils.embedding import EMBEDDING_MODEL, create_embeddings
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables with encoding handling
+try:
+    load_dotenv(encoding='utf-8')
+except UnicodeDecodeError:
+    try:
+        load_dotenv(encoding='utf-16')
+    except UnicodeDecodeError:
+        try:
+            load_dotenv(encoding='latin1')
+        except Exception as e:
+            logger.error(f"Failed to load .env file: {str(e)}")
+
+# Whether the pipeline embeds through the shared batcher
+EMBEDDING_MICROBATCH = os.getenv("EMBEDDING_MICROBATCH", "true").lower() in ("1", "true", "yes")
+
+# Largest number of texts sent in one embedding request
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+
+# Longest time a text waits for its batch to fill up, in milliseconds
+EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "20"))
+
+# Embedding requests in flight at once
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+
+EmbedFunction = Callable[[List[str], str], Optional[List[List[float]]]]
+
+class EmbeddingBatcher:
+    """
+    Coalesces embedding requests from concurrent callers into full-size API calls.
+
+    Args:
+        model: The embedding model. Defaults to the configured embedding model.
+        max_batch_size: Largest number of texts per request.
+        max_wait: Longest time, in seconds, a text waits for its batch to fill up.
+        max_concurrency: Requests in flight at once.
+        embed_function: Function sending one request, with the signature of
+            embedding.create_embeddings.
+    """
+
+    def __init__(self, model: Optional[str] = None, max_batch_size: Optional[int] = None,
+                 max_wait: Optional[float] = None, max_concurrency: Optional[int] = None,
+                 embed_function: Optional[EmbedFunction] = None):
+        self.model = model or EMBEDDING_MODEL
+        self.max_batch_size = max_batch_size or EMBEDDING_BATCH_SIZE
+        self.max_wait = EMBEDDING_MAX_WAIT_MS / 1000 if max_wait is None else max_wait
+        self.embed_function = embed_function or create_embeddings
+
+        # Counters for reporting
+        self.requests = 0
+        self.texts_sent = 0
+        self.deduplicated = 0
+
+        self._condition = threading.Condition()
+        self._queue: Deque[Tuple[str, float]] = deque()  # (text, arrival time)
+        self._futures: Dict[str, Future] = {}  # queued or in-flight texts
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_concurrency or EMBEDDING_MAX_CONCURRENCY,
+                                            thread_name_prefix="embedding-request")
+        self._worker = threading.Thread(target=self._collect, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        """
+        Queue a text for embedding.
+
+        Args:
+            text: The text to embed.
+
+        Returns:
+            A future resolving to the embedding, or to None if the text is empty or
+            the request failed.
+        """
+        if not text.strip():
+            future = Future()
+            future.set_result(None)
+            return future
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed.")
+
+            future = self._futures.get(text)
+            if future is not None:
+                self.deduplicated += 1
+                return future
+
+            future = Future()
+            self._futures[text] = future
+            self._queue.append((text, time.monotonic()))
+            self._condition.notify()
+            return future
+
+    def embed_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Embed texts through the batcher and wait for the results.
+
+        Args:
+            texts: Texts to embed.
+
+        Returns:
+            One embedding per text, in order, with None for empty texts and failed requests.
+        """
+        futures = [self.submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    def _collect(self) -> None:
+        """Form batches from the queue and hand them to the request pool."""
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+
+                # Wait until the batch is full or its oldest text has waited max_wait
+                deadline = self._queue[0][1] + self.max_wait
+                while len(self._queue) < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = [self._queue.popleft()[0] for _ in range(min(self.max_batch_size, len(self._queue)))]
+
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch: List[str]) -> None:
+        """Send one batch and resolve its futures."""
+        try:
+            embeddings = self.embed_function(batch, self.model)
+        except Exception as e:
+            logger.error(f"Error in batched embedding request: {str(e)}")
+            embeddings = None
+
+        if embeddings is None or len(embeddings) != len(batch):
+            embeddings = [None] * len(batch)
+
+        with self._condition:
+            self.requests += 1
+            self.texts_sent += len(batch)
+            futures = [self._futures.pop(text) for text in batch]
+
+        for future, embedding in zip(futures, embeddings):
+            future.set_result(embedding)
+
+    def close(self) -> None:
+        """Send any queued texts and stop the background threads."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+        self._executor.shutdown(wait=True)
+
+_batchers: Dict[str, EmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
+
+def get_embedding_batcher(model: Optional[str] = None) -> EmbeddingBatcher:
+    """
+    Return the process-wide batcher for a model, creating it on first use.
+
+    Args:
+        model: The embedding model. Defaults to the configured embedding model.
+
+    Returns:
+        The shared EmbeddingBatcher.
+    """
+    model = model or EMBEDDING_MODEL
+    with _batchers_lock:
+        if model not in _batchers:
+            _batchers[model] = EmbeddingBatcher(model)
+        return _batchers[model]
@@ -4,12 +4,10 @@ File handler module for reading and writing PDF and DOCX files.
 import os
 import io
 import logging
-from typing import Tuple, Optional
-import PyPDF2
-import docx
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from docx import Document
+from typing import Any, Dict, List, Tuple, Optional
+from utils.docx_reader import read_docx_blocks
+from utils.docx_writer import save_docx_revision
+from utils.parse_cache import PARSE_CACHE, ParseCache, document_key
 
 # Configure logging
 logging.basicConfig(
@@ -104,36 +102,62 @@ def save_file_dialog(default_filename: str, file_types: Tuple[Tuple[str, str], .
         logger.error(f"Error opening save file dialog: {str(e)}")
         return None
 
-def read_pdf(file_path: str) -> Optional[str]:
+def read_pdf_pages(file_path: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
     """
-    Read text from a PDF file.
+    Read text from a PDF file together with the position of every page.
     
     Args:
         file_path: Path to the PDF file.
         
     Returns:
-        The extracted text or None if an error occurred.
+        A tuple of (text, pages), where each page dictionary has the keys "page"
+        (numbered from 1), "start" and "end" (character offsets into the text),
+        or None if an error occurred.
     """
     try:
-        text = ""
+        # Imported here so runs served from the parse cache never load PyPDF2
+        import PyPDF2
+        
+        pieces = []
+        pages = []
+        offset = 0
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
             for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text()
+                page_text = pdf_reader.pages[page_num].extract_text()
+                pieces.append(page_text)
+                pages.append({"page": page_num + 1, "start": offset, "end": offset + len(page_text)})
+                offset += len(page_text)
+        text = "".join(pieces)
         
         if not text.strip():
             logger.warning(f"No text extracted from PDF file: {file_path}")
         
-        return text
+        return text, pages
     except Exception as e:
         logger.error(f"Error reading PDF file {file_path}: {str(e)}")
         return None
 
+def read_pdf(file_path: str) -> Optional[str]:
+    """
+    Read text from a PDF file.
+    
+    Args:
+        file_path: Path to the PDF file.
+        
+    Returns:
+        The extracted text or None if an error occurred.
+    """
+    result = read_pdf_pages(file_path)
+    return result[0] if result else None
+
 def read_docx(file_path: str) -> Optional[str]:
     """
     Read text from a DOCX file.
     
+    The document is streamed from the zip archive (see utils.docx_reader), so table
+    cells, headers, footers and footnotes are included and embedded media is never loaded.
+    
     Args:
         file_path: Path to the DOCX file.
         
@@ -141,8 +165,10 @@ def read_docx(file_path: str) -> Optional[str]:
         The extracted text or None if an error occurred.
     """
     try:
-        doc = Document(file_path)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+        result = read_docx_blocks(file_path)
+        if result is None:
+            return None
+        text, _ = result
         
         if not text.strip():
             logger.warning(f"No text extracted from DOCX file: {file_path}")
@@ -152,13 +178,18 @@ def read_docx(file_path: str) -> Optional[str]:
         logger.error(f"Error reading DOCX file {file_path}: {str(e)}")
         return None
 
-def save_file(text: str, file_path: str) -> bool:
+def save_file(text: str, file_path: str, source_path: Optional[str] = None,
+              blocks: Optional[List[Dict[str, Any]]] = None) -> bool:
     """
     Save text to a file.
     
     Args:
         text: Text to save.
         file_path: Path to save the file.
+        source_path: Path to the original file. For DOCX output, together with blocks,
+            the original document is edited in place instead of being regenerated.
+        blocks: Paragraph positions captured when the original DOCX was read
+            (see read_file_with_positions).
         
     Returns:
         True if successful, False otherwise.
@@ -176,6 +207,8 @@ def save_file(text: str, file_path: str) -> bool:
         if ext == '.pdf':
             return save_as_pdf(text, file_path)
         elif ext == '.docx':
+            if source_path and blocks and source_path.lower().endswith('.docx'):
+                return save_docx_revision(source_path, blocks, text, file_path)
             return save_as_docx(text, file_path)
         else:
             logger.error(f"Unsupported file format: {ext}")
@@ -196,6 +229,9 @@ def save_as_pdf(text: str, file_path: str) -> bool:
         True if successful, False otherwise.
     """
     try:
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import letter
+        
         logger.info("Creating PDF document...")
         # Create a PDF document
         packet = io.BytesIO()
@@ -273,6 +309,8 @@ def save_as_docx(text: str, file_path: str) -> bool:
         True if successful, False otherwise.
     """
     try:
+        from docx import Document
+        
         logger.info("Creating DOCX document...")
         # Create a new Document
         doc = Document()
@@ -295,29 +333,82 @@ def save_as_docx(text: str, file_path: str) -> bool:
         logger.error(f"Error saving DOCX file {file_path}: {str(e)}")
         return False
 
-def read_file(file_path: str) -> Optional[Tuple[str, str]]:
+def _parse_file(file_path: str, ext: str) -> Optional[Tuple[str, Optional[List[Dict[str, Any]]]]]:
+    """Extract the text and positions of a PDF or DOCX file."""
+    if ext == '.pdf':
+        return read_pdf_pages(file_path)
+    return read_docx_blocks(file_path)
+
+def read_file_with_positions(file_path: str) -> Optional[Tuple[str, str, Optional[List[Dict[str, Any]]]]]:
     """
-    Read a file and extract its text.
+    Read a file and extract its text along with the position of its pages or paragraphs.
+    
+    Parsed documents are looked up in the parse cache (see utils.parse_cache) by
+    content hash first, so a file that was read before is not parsed again.
     
     Args:
         file_path: Path to the file.
         
     Returns:
-        A tuple containing the extracted text and the file extension, or None if an error occurred.
+        A tuple containing the extracted text, the file extension and the positions
+        of the text: the paragraph blocks from utils.docx_reader for DOCX files, or
+        the pages from read_pdf_pages for PDF files; or None if an error occurred.
     """
     try:
         _, ext = os.path.splitext(file_path)
         ext = ext.lower()
         
-        if ext == '.pdf':
-            text = read_pdf(file_path)
-            return (text, ext) if text else None
-        elif ext == '.docx':
-            text = read_docx(file_path)
-            return (text, ext) if text else None
-        else:
+        if ext not in ('.pdf', '.docx'):
             logger.error(f"Unsupported file format: {ext}")
             return None
+        
+        cache = None
+        key = None
+        result = None
+        if PARSE_CACHE:
+            try:
+                cache = ParseCache()
+                key = document_key(file_path, ext)
+                result = cache.get(key)
+            except Exception as e:
+                logger.warning(f"Parse cache unavailable, parsing directly: {str(e)}")
+                cache = None
+        
+        try:
+            if result is not None:
+                logger.info(f"Parse cache hit: {file_path}")
+            else:
+                result = _parse_file(file_path, ext)
+                if cache and result and result[0].strip():
+                    try:
+                        cache.put(key, *result)
+                    except Exception as e:
+                        logger.warning(f"Could not store parsed document in the parse cache: {str(e)}")
+        finally:
+            if cache:
+                cache.close()
+        
+        if not result or not result[0].strip():
+            logger.warning(f"No text extracted from file: {file_path}")
+            return None
+        text, positions = result
+        return text, ext, positions
     except Exception as e:
         logger.error(f"Error reading file {file_path}: {str(e)}")
-        return None 
\ No newline at end of file
+        return None
+
+def read_file(file_path: str) -> Optional[Tuple[str, str]]:
+    """
+    Read a file and extract its text.
+    
+    Args:
+        file_path: Path to the file.
+        
+    Returns:
+        A tuple containing the extracted text and the file extension, or None if an error occurred.
+    """
+    result = read_file_with_positions(file_path)
+    if not result:
+        return None
+    text, ext, _ = result
+    return text, ext
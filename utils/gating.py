@@ -0,0 +1,115 @@
+"""
+Relevance gating module for deciding which contract chunks need revision.
+
+Most of a contract is boilerplate that no company policy applies to. A chunk is a
+revision candidate only if enough knowledge base entries were retrieved for it
+within a cosine distance threshold; every other chunk is passed through unchanged,
+so chat model calls scale with the number of risky clauses rather than the
+length of the contract.
+"""
+import os
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables with encoding handling
+try:
+    load_dotenv(encoding='utf-8')
+except UnicodeDecodeError:
+    try:
+        load_dotenv(encoding='utf-16')
+    except UnicodeDecodeError:
+        try:
+            load_dotenv(encoding='latin1')
+        except Exception as e:
+            logger.error(f"Failed to load .env file: {str(e)}")
+
+# Whether the pipeline skips chunks without policy hits. Skipped chunks are not
+# sent to the chat model at all, so they also miss the translation step of SYSTEM_PROMPT.
+GATE_CHUNKS = os.getenv("GATE_CHUNKS", "false").lower() in ("1", "true", "yes")
+
+# Largest cosine distance at which a retrieved entry counts as a policy hit
+GATE_MAX_DISTANCE = float(os.getenv("GATE_MAX_DISTANCE", "0.6"))
+
+# Number of policy hits a chunk needs to be sent for revision
+GATE_MIN_HITS = int(os.getenv("GATE_MIN_HITS", "1"))
+
+def hit_statistics(entries: List[Dict[str, Any]], max_distance: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Summarize the knowledge base entries retrieved for one chunk.
+
+    Args:
+        entries: Entries from find_similar_entries, with their "similarity" (cosine distance).
+        max_distance: Largest distance counted as a hit. Defaults to GATE_MAX_DISTANCE.
+
+    Returns:
+        A dictionary with the keys:
+            hits: Number of entries within max_distance.
+            best_distance: Distance of the closest entry, or None if there are none.
+    """
+    max_distance = GATE_MAX_DISTANCE if max_distance is None else max_distance
+
+    distances = [float(entry["similarity"]) for entry in entries if entry.get("similarity") is not None]
+    return {
+        "hits": sum(1 for distance in distances if distance <= max_distance),
+        "best_distance": min(distances) if distances else None,
+    }
+
+def select_candidates(knowledge_entries: List[List[Dict[str, Any]]], max_distance: Optional[float] = None,
+                      min_hits: Optional[int] = None) -> Tuple[List[int], List[Dict[str, Any]]]:
+    """
+    Pick the chunks whose retrieved entries show that a policy may apply.
+
+    Args:
+        knowledge_entries: List of lists of knowledge base entries for each chunk.
+        max_distance: Largest distance counted as a hit. Defaults to GATE_MAX_DISTANCE.
+        min_hits: Hits a chunk needs to be a candidate. Defaults to GATE_MIN_HITS.
+
+    Returns:
+        A tuple of (candidate chunk indexes, hit statistics per chunk).
+    """
+    min_hits = GATE_MIN_HITS if min_hits is None else min_hits
+
+    statistics = [hit_statistics(entries, max_distance) for entries in knowledge_entries]
+    candidates = [i for i, stats in enumerate(statistics) if stats["hits"] >= min_hits]
+
+    for i, stats in enumerate(statistics):
+        logger.debug(f"Chunk {i}: {stats['hits']} hits, best distance {stats['best_distance']}")
+    logger.info(f"{len(candidates)} of {len(statistics)} chunks have policy hits.")
+
+    return candidates, statistics
+
+def merge_sections(spans: Sequence[Tuple[int, int]], candidates: List[int],
+                   knowledge_entries: List[List[Dict[str, Any]]]) -> List[Tuple[int, int, List[Dict[str, Any]]]]:
+    """
+    Merge the character spans of candidate chunks into non-overlapping sections.
+
+    Overlapping or touching spans (e.g. chunks sharing overlap sentences) become one
+    section, which gets the knowledge base entries of all its chunks.
+
+    Args:
+        spans: (start, end) character offsets of every chunk in the contract text.
+        candidates: Indexes of the chunks to revise.
+        knowledge_entries: List of lists of knowledge base entries for each chunk.
+
+    Returns:
+        A list of (start, end, entries) sections in text order.
+    """
+    sections: List[Tuple[int, int, List[Dict[str, Any]]]] = []
+
+    for i in sorted(candidates, key=lambda i: spans[i]):
+        start, end = spans[i]
+        if sections and start <= sections[-1][1]:
+            last_start, last_end, entries = sections[-1]
+            sections[-1] = (last_start, max(last_end, end), entries + knowledge_entries[i])
+        else:
+            sections.append((start, end, list(knowledge_entries[i])))
+
+    return sections
@@ -0,0 +1,160 @@
+"""
+In-process metrics registry.
+
+Counters, gauges and latency samples are kept in memory, keyed by metric name and
+labels, and can be exported as a JSON-friendly snapshot or in the Prometheus text
+format. Latency samples are kept in a bounded window so recent percentiles can
+drive runtime decisions such as when to hedge a request.
+"""
+import json
+import logging
+import threading
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per metric
+LATENCY_WINDOW = 500
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_lock = threading.Lock()
+_counters: Dict[_Key, float] = defaultdict(float)
+_gauges: Dict[_Key, float] = {}
+_latencies: Dict[_Key, Deque[float]] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+
+def _key(name: str, labels: Dict[str, Any]) -> _Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    """
+    Add to a counter.
+
+    Args:
+        name: Metric name, e.g. "chat_hedges_total".
+        value: Amount to add.
+        **labels: Label values, e.g. model="gpt-4.1-nano".
+    """
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """
+    Set a gauge to a value.
+
+    Args:
+        name: Metric name.
+        value: The new value.
+        **labels: Label values.
+    """
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name: str, seconds: float, **labels) -> None:
+    """
+    Record a latency sample.
+
+    Args:
+        name: Metric name, e.g. "chat_latency_seconds".
+        seconds: The observed latency.
+        **labels: Label values.
+    """
+    with _lock:
+        _latencies[_key(name, labels)].append(seconds)
+
+def _pick(samples, q: float) -> float:
+    """Return the q-th percentile of sorted samples (nearest rank)."""
+    return samples[min(len(samples) - 1, max(0, int(round(q / 100 * (len(samples) - 1)))))]
+
+def percentile(name: str, q: float, min_samples: int = 1, **labels) -> Optional[float]:
+    """
+    Return a percentile of the recent latency samples of a metric.
+
+    Args:
+        name: Metric name.
+        q: Percentile between 0 and 100.
+        min_samples: Fewest samples for the result to be meaningful.
+        **labels: Label values.
+
+    Returns:
+        The percentile, or None if there are fewer than min_samples samples.
+    """
+    with _lock:
+        samples = sorted(_latencies.get(_key(name, labels), ()))
+    if not samples or len(samples) < min_samples:
+        return None
+    return _pick(samples, q)
+
+def _format_key(key: _Key) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
+
+def snapshot() -> Dict[str, Any]:
+    """
+    Return all metrics as plain values.
+
+    Returns:
+        A dictionary with "counters" and "gauges" keyed by metric name and labels,
+        and "latencies" giving the count, p50, p95 and p99 of each latency metric.
+    """
+    with _lock:
+        counters = {_format_key(key): value for key, value in _counters.items()}
+        gauges = {_format_key(key): value for key, value in _gauges.items()}
+        windows = {key: sorted(samples) for key, samples in _latencies.items()}
+
+    latencies = {}
+    for key, samples in windows.items():
+        if samples:
+            latencies[_format_key(key)] = {
+                "count": len(samples), "p50": _pick(samples, 50), "p95": _pick(samples, 95), "p99": _pick(samples, 99),
+            }
+
+    return {"counters": counters, "gauges": gauges, "latencies": latencies}
+
+def render_prometheus() -> str:
+    """
+    Render counters and gauges in the Prometheus text exposition format, with latency
+    percentiles as summary quantiles.
+
+    Returns:
+        The metrics text.
+    """
+    data = snapshot()
+    lines = []
+    for key, value in sorted(data["counters"].items()) + sorted(data["gauges"].items()):
+        lines.append(f"{key} {value}")
+    for key, summary in sorted(data["latencies"].items()):
+        name, _, labels = key.partition("{")
+        labels = labels.rstrip("}")
+        for quantile in ("p50", "p95", "p99"):
+            quantile_label = f'quantile="0.{quantile[1:]}"'
+            all_labels = ",".join(label for label in (labels, quantile_label) if label)
+            lines.append(f"{name}{{{all_labels}}} {summary[quantile]}")
+        lines.append(f"{name}_count{{{labels}}} {summary['count']}" if labels else f"{name}_count {summary['count']}")
+    return "\n".join(lines) + "\n"
+
+def write_metrics(file_path: str) -> bool:
+    """
+    Save a metrics snapshot as JSON.
+
+    Args:
+        file_path: Path to save the JSON file.
+
+    Returns:
+        True if successful, False otherwise.
+    """
+    try:
+        with open(file_path, "w", encoding="utf-8") as file:
+            json.dump(snapshot(), file, indent=2)
+        return True
+    except Exception as e:
+        logger.error(f"Error saving metrics to {file_path}: {str(e)}")
+        return False
@@ -0,0 +1,200 @@
+"""
+Persistent cache of parsed documents.
+
+Text extraction is the slowest CPU step of a run on large PDFs, and the same files
+are submitted again and again. Extracted text is cached in a local SQLite file,
+keyed by a hash of the file content and the version of the parser that produced
+it, together with the page offsets (PDF) or paragraph blocks (DOCX) of the text.
+Entries are stored as compressed JSON with the block texts left out, since they
+are slices of the document text. The least recently used entries are evicted
+once the cache grows past PARSE_CACHE_MAX_MB.
+"""
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+from importlib import metadata
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables with encoding handling
+try:
+    load_dotenv(encoding='utf-8')
+except UnicodeDecodeError:
+    try:
+        load_dotenv(encoding='utf-16')
+    except UnicodeDecodeError:
+        try:
+            load_dotenv(encoding='latin1')
+        except Exception as e:
+            logger.error(f"Failed to load .env file: {str(e)}")
+
+# Whether read_file_with_positions consults the cache
+PARSE_CACHE = os.getenv("PARSE_CACHE", "true").lower() in ("1", "true", "yes")
+
+# Location of the cache database
+PARSE_CACHE_PATH = os.getenv("PARSE_CACHE_PATH", os.path.join(".cache", "parsed.sqlite3"))
+
+# Size of the stored entries above which the least recently used are evicted
+PARSE_CACHE_MAX_MB = float(os.getenv("PARSE_CACHE_MAX_MB", "500"))
+
+# Version of each extractor; bump when its output changes so old entries are not reused
+PARSER_VERSIONS = {".pdf": "pdf-pages-1", ".docx": "docx-blocks-1"}
+
+# Block fields stored per row; "text" is restored from the document text
+_BLOCK_FIELDS = ("index", "kind", "table", "row", "col", "start", "end")
+
+def parser_version(ext: str) -> str:
+    """
+    Identify the parser of a file type, including the version of its library.
+
+    PyPDF2's version is read from its package metadata, so PyPDF2 is not imported.
+
+    Args:
+        ext: The lowercase file extension, e.g. ".pdf".
+
+    Returns:
+        A version string that changes whenever the extracted text may change.
+    """
+    version = PARSER_VERSIONS.get(ext, "unknown")
+    if ext == ".pdf":
+        try:
+            version += "/PyPDF2-" + metadata.version("PyPDF2")
+        except metadata.PackageNotFoundError:
+            pass
+    return version
+
+def document_key(file_path: str, ext: str) -> str:
+    """
+    Build the cache key of a file.
+
+    Args:
+        file_path: Path to the file.
+        ext: The lowercase file extension.
+
+    Returns:
+        A hex digest of the file content and the parser version.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(parser_version(ext).encode("utf-8"))
+    return digest.hexdigest()
+
+def _encode(text: str, positions: Optional[List[Dict[str, Any]]]) -> bytes:
+    """Pack a parsed document: blocks become rows of fields, part names are listed once."""
+    entry: Dict[str, Any] = {"text": text}
+    if positions and "part" in positions[0]:
+        parts = list(dict.fromkeys(block["part"] for block in positions))
+        part_numbers = {part: number for number, part in enumerate(parts)}
+        entry["parts"] = parts
+        entry["blocks"] = [[part_numbers[block["part"]]] + [block[field] for field in _BLOCK_FIELDS]
+                           for block in positions]
+    elif positions:
+        entry["pages"] = [[page["page"], page["start"], page["end"]] for page in positions]
+    return zlib.compress(json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+def _decode(data: bytes) -> Tuple[str, Optional[List[Dict[str, Any]]]]:
+    """Unpack an entry written by _encode."""
+    entry = json.loads(zlib.decompress(data).decode("utf-8"))
+    text = entry["text"]
+    if "blocks" in entry:
+        positions = []
+        for row in entry["blocks"]:
+            block = {"part": entry["parts"][row[0]], **dict(zip(_BLOCK_FIELDS, row[1:]))}
+            block["text"] = text[block["start"]:block["end"]]
+            positions.append(block)
+        return text, positions
+    if "pages" in entry:
+        return text, [{"page": page, "start": start, "end": end} for page, start, end in entry["pages"]]
+    return text, None
+
+class ParseCache:
+    """
+    SQLite-backed store of parsed documents with least-recently-used eviction.
+
+    SQLite handles locking, so several processes can share one cache file.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.path = path or PARSE_CACHE_PATH
+        self.max_bytes = int(PARSE_CACHE_MAX_MB * 1024 * 1024) if max_bytes is None else max_bytes
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                key TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS documents_last_used ON documents (last_used)")
+        self.connection.commit()
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[List[Dict[str, Any]]]]]:
+        """
+        Look up a parsed document and mark it as recently used.
+
+        Args:
+            key: Cache key from document_key.
+
+        Returns:
+            (text, positions), or None if the document is not cached.
+        """
+        row = self.connection.execute("SELECT data FROM documents WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self.connection:
+            self.connection.execute("UPDATE documents SET last_used = ? WHERE key = ?", (time.time(), key))
+        return _decode(row[0])
+
+    def put(self, key: str, text: str, positions: Optional[List[Dict[str, Any]]]) -> None:
+        """
+        Store a parsed document, then evict the least recently used entries while the
+        cache is over its size limit.
+
+        Args:
+            key: Cache key from document_key.
+            text: The extracted text.
+            positions: Page offsets or paragraph blocks of the text, if any.
+        """
+        data = _encode(text, positions)
+        if len(data) > self.max_bytes:
+            logger.info(f"Parsed document of {len(data)} bytes exceeds the parse cache size; not cached.")
+            return
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO documents (key, data, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(data), len(data), time.time())
+            )
+            total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+            if total > self.max_bytes:
+                evicted = 0
+                for old_key, size in self.connection.execute(
+                        "SELECT key, size FROM documents WHERE key != ? ORDER BY last_used", (key,)).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self.connection.execute("DELETE FROM documents WHERE key = ?", (old_key,))
+                    total -= size
+                    evicted += 1
+                logger.info(f"Parse cache: evicted {evicted} documents to stay under {self.max_bytes} bytes.")
+
+    def close(self) -> None:
+        """Close the cache database."""
+        self.connection.close()
@@ -0,0 +1,235 @@
+"""
+Profiling hooks for the contract pipeline.
+
+A RunProfiler splits a run into named stages. For each stage it records a cProfile
+profile, the wall time and a tracemalloc comparison against the previous stage
+boundary (top allocation sites). Throughout the run, a sampling profiler records the
+call stacks of all threads in collapsed-stack format, ready for flamegraph.pl or
+speedscope. Everything is written to a per-run directory.
+"""
+import os
+import io
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from utils import metrics
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables with encoding handling
+try:
+    load_dotenv(encoding='utf-8')
+except UnicodeDecodeError:
+    try:
+        load_dotenv(encoding='utf-16')
+    except UnicodeDecodeError:
+        try:
+            load_dotenv(encoding='latin1')
+        except Exception as e:
+            logger.error(f"Failed to load .env file: {str(e)}")
+
+# Directory under which each profiled run gets its own directory
+PROFILE_DIR = os.getenv("PROFILE_DIR", "runs")
+
+# Interval between call-stack samples, in milliseconds
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+
+# Frames kept per allocation traceback and allocation sites listed per stage
+TRACEMALLOC_FRAMES = 25
+TOP_ALLOCATIONS = 20
+
+class StackSampler:
+    """
+    Samples the call stacks of all threads at a fixed interval.
+
+    Stacks are aggregated in collapsed format (frames root first, separated by
+    semicolons), prefixed with the current stage name.
+
+    Args:
+        interval: Seconds between samples.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stage = "startup"
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update({thread.ident: thread.name for thread in threading.enumerate()})
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    # Functions are identified by their definition line so samples aggregate per function
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                frames.append(self.stage)
+                self.stacks[";".join(reversed(frames))] += 1
+            self.samples += 1
+
+    def write(self, file_path: str) -> None:
+        """Write the collapsed stacks, one "stack count" line per distinct stack."""
+        with open(file_path, "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+class RunProfiler:
+    """
+    Per-stage CPU and memory profiler for one pipeline run.
+
+    Call step() at the start of each stage and finish() at the end. When disabled,
+    every method is a no-op, so callers do not need to check.
+
+    Args:
+        enabled: Whether to profile.
+        run_dir: Directory for the artifacts. Defaults to a new timestamped
+            directory under PROFILE_DIR.
+    """
+
+    def __init__(self, enabled: bool = True, run_dir: Optional[str] = None):
+        self.enabled = enabled
+        self.run_dir = None
+        self.stages: List[Dict[str, Any]] = []
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+        self._snapshot = None
+        self._stage_started = 0.0
+        if not enabled:
+            return
+
+        self.run_dir = run_dir or os.path.join(PROFILE_DIR, datetime.now().strftime("%Y%m%d-%H%M%S"))
+        os.makedirs(self.run_dir, exist_ok=True)
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._snapshot = tracemalloc.take_snapshot()
+
+        self._sampler = StackSampler(PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        self._sampler.start()
+        logger.info(f"Profiling this run into {self.run_dir}")
+
+    def step(self, name: str) -> None:
+        """
+        End the current stage, if any, and start a new one.
+
+        Args:
+            name: Stage name, used in file names and the collapsed stacks.
+        """
+        if not self.enabled:
+            return
+        self._end_stage()
+
+        self.stages.append({"stage": name})
+        self._sampler.stage = name
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        self._stage_started = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def _end_stage(self) -> None:
+        """Stop the current stage's profile and write its artifacts."""
+        if self._profile is None:
+            return
+        self._profile.disable()
+        # Samples taken while the artifacts are written are attributed to the profiler
+        self._sampler.stage = "profiler"
+        stage = self.stages[-1]
+        stage["seconds"] = time.perf_counter() - self._stage_started
+        prefix = os.path.join(self.run_dir, f"{len(self.stages):02d}_{stage['stage']}")
+
+        # CPU: raw stats for snakeviz/pstats and a readable top list
+        self._profile.dump_stats(f"{prefix}.prof")
+        report = io.StringIO()
+        pstats.Stats(self._profile, stream=report).sort_stats("cumulative").print_stats(40)
+        with open(f"{prefix}_cpu.txt", "w", encoding="utf-8") as file:
+            file.write(report.getvalue())
+        self._profile = None
+
+        # Memory: allocation sites that grew most since the previous boundary
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        differences = snapshot.compare_to(self._snapshot, "traceback")[:TOP_ALLOCATIONS]
+        self._snapshot = snapshot
+        with open(f"{prefix}_memory.txt", "w", encoding="utf-8") as file:
+            file.write(f"Traced memory at end of stage: {current / 2**20:.1f} MiB, "
+                       f"peak during stage: {peak / 2**20:.1f} MiB\n\n")
+            for difference in differences:
+                file.write(f"{difference.size_diff / 2**10:+.1f} KiB, {difference.count_diff:+d} blocks "
+                           f"({difference.size / 2**10:.1f} KiB total)\n")
+                for line in difference.traceback.format(limit=8):
+                    file.write(f"  {line}\n")
+                file.write("\n")
+
+        stage["traced_mib"] = round(current / 2**20, 2)
+        stage["peak_mib"] = round(peak / 2**20, 2)
+        stage["top_allocation"] = str(differences[0].traceback[0]) if differences else None
+
+    def finish(self) -> Optional[str]:
+        """
+        End the last stage, stop sampling and write the run summary.
+
+        Returns:
+            The run directory, or None if profiling is disabled.
+        """
+        if not self.enabled:
+            return None
+        self._end_stage()
+        self._sampler.stop()
+        self._sampler.write(os.path.join(self.run_dir, "stacks.collapsed"))
+        tracemalloc.stop()
+
+        summary = {
+            "stages": self.stages,
+            "stack_samples": self._sampler.samples,
+            "sample_interval_ms": PROFILE_SAMPLE_INTERVAL_MS,
+        }
+        try:
+            import resource
+            # ru_maxrss is in KiB on Linux and bytes on macOS
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            summary["max_rss_mib"] = round(max_rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+        except ImportError:
+            pass
+
+        with open(os.path.join(self.run_dir, "summary.json"), "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2, default=str)
+        metrics.write_metrics(os.path.join(self.run_dir, "metrics.json"))
+
+        logger.info(f"Profile written to {self.run_dir}")
+        for stage in self.stages:
+            logger.info(f"  {stage['stage']:<20} {stage.get('seconds', 0):8.2f} s  peak {stage.get('peak_mib', 0):8.1f} MiB")
+        return self.run_dir
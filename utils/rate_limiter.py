@@ -0,0 +1,314 @@
+"""
+Cross-process rate limiter for OpenAI requests.
+
+Each model has two token buckets, one for requests per minute and one for tokens
+per minute, stored in a local SQLite file. Every process and thread calling the
+API takes from the same buckets under an exclusive SQLite transaction, so worker
+processes sharing an organization quota wait for capacity before sending instead
+of hitting 429s. Bucket sizes start from the configured limits and follow the
+x-ratelimit-* headers of every response.
+"""
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Mapping, Optional
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables with encoding handling
+try:
+    load_dotenv(encoding='utf-8')
+except UnicodeDecodeError:
+    try:
+        load_dotenv(encoding='utf-16')
+    except UnicodeDecodeError:
+        try:
+            load_dotenv(encoding='latin1')
+        except Exception as e:
+            logger.error(f"Failed to load .env file: {str(e)}")
+
+# Whether API calls wait for the shared rate limiter
+RATE_LIMITER = os.getenv("RATE_LIMITER", "true").lower() in ("1", "true", "yes")
+
+# Location of the shared bucket state
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", os.path.join(".cache", "rate_limits.sqlite3"))
+
+# Starting limits for models not yet seen in a response
+DEFAULT_REQUESTS_PER_MINUTE = float(os.getenv("RATE_LIMIT_RPM", "500"))
+DEFAULT_TOKENS_PER_MINUTE = float(os.getenv("RATE_LIMIT_TPM", "200000"))
+
+# Longest a caller waits for capacity before sending anyway, in seconds
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "120"))
+
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """
+    Parse a reset duration from an x-ratelimit-reset-* header.
+
+    Args:
+        value: A duration such as "20ms", "1.5s" or "6m0s".
+
+    Returns:
+        The duration in seconds, or None if it cannot be parsed.
+    """
+    parts = _DURATION_PATTERN.findall(value or "")
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+class SharedRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets shared through SQLite.
+
+    Args:
+        path: Location of the SQLite file. Defaults to value from environment variable.
+        max_wait: Longest time acquire waits before giving up and letting the call through.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_wait: Optional[float] = None):
+        self.path = path or RATE_LIMIT_PATH
+        self.max_wait = RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Transactions are managed explicitly; the lock serializes threads of this process
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                model TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                capacity REAL NOT NULL,
+                level REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (model, kind)
+            )
+        """)
+
+    def _load(self, model: str, now: float) -> Dict[str, list]:
+        """Read and refill both buckets of a model; call inside a transaction."""
+        buckets = {
+            kind: [capacity, min(capacity, level + capacity / 60 * max(0.0, now - updated_at))]
+            for kind, capacity, level, updated_at in self._connection.execute(
+                "SELECT kind, capacity, level, updated_at FROM buckets WHERE model = ?", (model,)
+            )
+        }
+        for kind, default in (("requests", DEFAULT_REQUESTS_PER_MINUTE), ("tokens", DEFAULT_TOKENS_PER_MINUTE)):
+            buckets.setdefault(kind, [default, default])
+        return buckets
+
+    def _store(self, model: str, buckets: Dict[str, list], now: float) -> None:
+        """Write both buckets of a model; call inside a transaction."""
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO buckets (model, kind, capacity, level, updated_at) VALUES (?, ?, ?, ?, ?)",
+            [(model, kind, capacity, level, now) for kind, (capacity, level) in buckets.items()]
+        )
+
+    def acquire(self, model: str, tokens: int) -> float:
+        """
+        Wait until the model's buckets can take one request of the given size, then take it.
+
+        A request larger than the whole token bucket is let through once the bucket is full.
+
+        Args:
+            model: The model the request is for.
+            tokens: Estimated tokens the request counts against the limit.
+
+        Returns:
+            The time spent waiting, in seconds.
+        """
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                self._connection.execute("BEGIN IMMEDIATE")
+                try:
+                    now = time.time()
+                    buckets = self._load(model, now)
+                    wanted = {"requests": 1.0, "tokens": float(tokens)}
+                    wait = 0.0
+                    for kind, amount in wanted.items():
+                        capacity, level = buckets[kind]
+                        missing = min(amount, capacity) - level
+                        if missing > 0:
+                            wait = max(wait, missing / (capacity / 60))
+
+                    waited = time.monotonic() - started
+                    if wait <= 0 or waited + wait > self.max_wait:
+                        for kind, amount in wanted.items():
+                            buckets[kind][1] -= amount
+                        self._store(model, buckets, now)
+                        self._connection.execute("COMMIT")
+                        if wait > 0:
+                            logger.warning(f"Rate limiter for {model} waited {waited:.1f} s; sending anyway.")
+                        return waited
+                    self._connection.execute("COMMIT")
+                except Exception:
+                    self._connection.execute("ROLLBACK")
+                    raise
+
+            logger.info(f"Waiting {wait:.2f} s for {model} rate limit capacity...")
+            time.sleep(min(wait, 5.0))
+
+    def update_from_headers(self, model: str, headers: Mapping[str, str]) -> None:
+        """
+        Align the model's buckets with the x-ratelimit-* headers of a response.
+
+        The limits set the bucket capacities; the remaining counts lower the bucket
+        levels when the server has seen more use than this machine accounted for
+        (e.g. other machines sharing the quota).
+
+        Args:
+            model: The model the response was for.
+            headers: The response headers.
+        """
+        values = {}
+        for kind in ("requests", "tokens"):
+            try:
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                values[kind] = (float(limit) if limit else None, float(remaining) if remaining else None)
+            except ValueError:
+                values[kind] = (None, None)
+
+        if all(limit is None and remaining is None for limit, remaining in values.values()):
+            return
+
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                buckets = self._load(model, now)
+                for kind, (limit, remaining) in values.items():
+                    if limit:
+                        # A changed limit moves the level by the same amount
+                        buckets[kind][1] += limit - buckets[kind][0]
+                        buckets[kind][0] = limit
+                    if remaining is not None:
+                        buckets[kind][1] = min(buckets[kind][1], remaining)
+                self._store(model, buckets, now)
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def penalize(self, model: str, seconds: float) -> None:
+        """
+        Empty the model's buckets after a rate limit error so that every process backs off.
+
+        Args:
+            model: The model that was rate limited.
+            seconds: How long the server asked callers to wait.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                buckets = self._load(model, now)
+                for kind, (capacity, level) in buckets.items():
+                    # A level this far below zero takes `seconds` to refill to zero
+                    buckets[kind][1] = min(level, -capacity / 60 * seconds)
+                self._store(model, buckets, now)
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+_rate_limiter: Optional[SharedRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> Optional[SharedRateLimiter]:
+    """
+    Return the process-wide rate limiter, or None if it is disabled or unavailable.
+    """
+    global _rate_limiter
+    if not RATE_LIMITER:
+        return None
+
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            try:
+                _rate_limiter = SharedRateLimiter()
+            except Exception as e:
+                logger.error(f"Rate limiter unavailable: {str(e)}")
+                return None
+        return _rate_limiter
+
+def before_request(model: str, tokens: int) -> None:
+    """
+    Wait for rate limit capacity for one request. Errors in the limiter never block the call.
+
+    Args:
+        model: The model the request is for.
+        tokens: Estimated tokens the request counts against the limit.
+    """
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return
+    try:
+        limiter.acquire(model, tokens)
+    except Exception as e:
+        logger.warning(f"Rate limiter error, sending without waiting: {str(e)}")
+
+def after_response(model: str, headers: Optional[Mapping[str, str]]) -> None:
+    """
+    Update the shared buckets from a response's headers.
+
+    Args:
+        model: The model the response was for.
+        headers: The response headers, or None.
+    """
+    limiter = get_rate_limiter()
+    if limiter is None or headers is None:
+        return
+    try:
+        limiter.update_from_headers(model, headers)
+    except Exception as e:
+        logger.warning(f"Rate limiter error while reading headers: {str(e)}")
+
+def after_rate_limit_error(model: str, headers: Optional[Mapping[str, str]], default_wait: float) -> float:
+    """
+    Record a rate limit error and decide how long to back off.
+
+    Args:
+        model: The model that was rate limited.
+        headers: The error response headers, or None.
+        default_wait: Backoff to use when the headers do not say.
+
+    Returns:
+        Seconds to wait before retrying.
+    """
+    wait = None
+    if headers is not None:
+        retry_after = headers.get("retry-after")
+        try:
+            wait = float(retry_after) if retry_after else None
+        except ValueError:
+            wait = None
+        if wait is None:
+            # Time until the exhausted bucket(s) start refilling
+            resets = [parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}", ""))
+                      for kind in ("requests", "tokens")
+                      if headers.get(f"x-ratelimit-remaining-{kind}") == "0"]
+            resets = [reset for reset in resets if reset is not None]
+            wait = max(resets) if resets else None
+    wait = default_wait if wait is None else wait
+
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        try:
+            limiter.penalize(model, wait)
+        except Exception as e:
+            logger.warning(f"Rate limiter error while recording a 429: {str(e)}")
+    return wait
@@ -0,0 +1,448 @@
+"""
+Change report module comparing an original contract with its revision.
+
+The two texts are diffed at word level. Clause headings found in both texts anchor
+the comparison, so each clause is diffed only against its counterpart. Inside a
+clause, patience diff (anchoring on words that occur once on each side) splits the
+problem further, and linear-space Myers diff handles what is left. The result is a
+structured change list that can be rendered as a redlined HTML page or DOCX file.
+"""
+import os
+import re
+import html
+import json
+import bisect
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+from utils.chunker import find_clauses
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables with encoding handling
+try:
+    load_dotenv(encoding='utf-8')
+except UnicodeDecodeError:
+    try:
+        load_dotenv(encoding='utf-16')
+    except UnicodeDecodeError:
+        try:
+            load_dotenv(encoding='latin1')
+        except Exception as e:
+            logger.error(f"Failed to load .env file: {str(e)}")
+
+# Whether the pipeline writes a change report next to the revised contract
+REDLINE_REPORT = os.getenv("REDLINE_REPORT", "true").lower() in ("1", "true", "yes")
+
+# Words and individual punctuation marks; whitespace is not compared
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Edit distance beyond which Myers gives up on a region and reports it as one replacement,
+# bounding the worst case (two unrelated texts) to O(MAX_EDIT_COST^2)
+MAX_EDIT_COST = 2000
+
+def _tokenize(text: str, vocabulary: Dict[str, int]) -> Tuple[List[int], List[int], List[int]]:
+    """
+    Split text into word tokens, interned to integers for fast comparison.
+
+    Args:
+        text: The text to tokenize.
+        vocabulary: Shared token-to-id mapping, extended in place.
+
+    Returns:
+        A tuple of (token ids, start offsets, end offsets).
+    """
+    ids, starts, ends = [], [], []
+    for match in _TOKEN_PATTERN.finditer(text):
+        ids.append(vocabulary.setdefault(match.group(), len(vocabulary)))
+        starts.append(match.start())
+        ends.append(match.end())
+    return ids, starts, ends
+
+def _longest_increasing_subsequence(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Return the longest subsequence of (a, b) pairs, sorted by a, whose b values increase.
+
+    Args:
+        pairs: Pairs sorted by their first element.
+
+    Returns:
+        The selected pairs in order.
+    """
+    tails: List[int] = []       # smallest b ending an increasing run of each length
+    tail_index: List[int] = []  # index in pairs of that element
+    previous = [-1] * len(pairs)
+
+    for i, (_, b) in enumerate(pairs):
+        position = bisect.bisect_left(tails, b)
+        if position == len(tails):
+            tails.append(b)
+            tail_index.append(i)
+        else:
+            tails[position] = b
+            tail_index[position] = i
+        previous[i] = tail_index[position - 1] if position else -1
+
+    result = []
+    i = tail_index[-1] if tail_index else -1
+    while i >= 0:
+        result.append(pairs[i])
+        i = previous[i]
+    result.reverse()
+    return result
+
+def _unique_anchors(a: Sequence[int], a_lo: int, a_hi: int,
+                    b: Sequence[int], b_lo: int, b_hi: int) -> List[Tuple[int, int]]:
+    """
+    Find patience-diff anchors: tokens occurring exactly once in each range,
+    kept in an order consistent on both sides.
+    """
+    counts: Dict[int, List[int]] = {}
+    for i in range(a_lo, a_hi):
+        entry = counts.get(a[i])
+        if entry is None:
+            counts[a[i]] = [1, 0, i, 0]
+        else:
+            entry[0] += 1
+    for j in range(b_lo, b_hi):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[1] += 1
+            entry[3] = j
+
+    pairs = sorted((entry[2], entry[3]) for entry in counts.values() if entry[0] == 1 and entry[1] == 1)
+    return _longest_increasing_subsequence(pairs)
+
+def _middle_snake(a: Sequence[int], a_lo: int, a_hi: int,
+                  b: Sequence[int], b_lo: int, b_hi: int) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Find the middle snake of the shortest edit script between two ranges (Myers 1986).
+
+    Args:
+        a, b: Token sequences.
+        a_lo, a_hi, b_lo, b_hi: The ranges to compare.
+
+    Returns:
+        (x, y, u, v): the snake runs from (x, y) to (u, v) in absolute indexes,
+        or None if the edit distance exceeds MAX_EDIT_COST.
+    """
+    n, m = a_hi - a_lo, b_hi - b_lo
+    delta = n - m
+    odd = delta & 1
+    max_d = min((n + m + 1) // 2, MAX_EDIT_COST)
+    offset = max_d + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+
+    for d in range(max_d + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            reverse_k = delta - k
+            if odd and -(d - 1) <= reverse_k <= d - 1 and x + backward[offset + reverse_k] >= n:
+                return a_lo + x0, b_lo + y0, a_lo + x, b_lo + y
+
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a_hi - 1 - x] == b[b_hi - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + k] = x
+            forward_k = delta - k
+            if not odd and -d <= forward_k <= d and x + forward[offset + forward_k] >= n:
+                return a_lo + n - x, b_lo + m - y, a_lo + n - x0, b_lo + m - y0
+
+    return None
+
+def _match_tokens(a: Sequence[int], a_lo: int, a_hi: int,
+                  b: Sequence[int], b_lo: int, b_hi: int, matches: List[Tuple[int, int]]) -> None:
+    """
+    Append the matched token pairs of two ranges to matches (in no particular order).
+
+    Ranges are trimmed of their common prefix and suffix, split at patience anchors
+    when there are any, and otherwise split at the Myers middle snake.
+    """
+    stack = [(a_lo, a_hi, b_lo, b_hi)]
+
+    while stack:
+        a_lo, a_hi, b_lo, b_hi = stack.pop()
+
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            matches.append((a_lo, b_lo))
+            a_lo += 1
+            b_lo += 1
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+            matches.append((a_hi, b_hi))
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+
+        anchors = _unique_anchors(a, a_lo, a_hi, b, b_lo, b_hi)
+        if anchors:
+            previous_a, previous_b = a_lo, b_lo
+            for anchor_a, anchor_b in anchors:
+                matches.append((anchor_a, anchor_b))
+                stack.append((previous_a, anchor_a, previous_b, anchor_b))
+                previous_a, previous_b = anchor_a + 1, anchor_b + 1
+            stack.append((previous_a, a_hi, previous_b, b_hi))
+            continue
+
+        snake = _middle_snake(a, a_lo, a_hi, b, b_lo, b_hi)
+        if snake is None:
+            continue  # too different: leave the whole region unmatched
+        x, y, u, v = snake
+        matches.extend((x + i, y + i) for i in range(u - x))
+        stack.append((a_lo, x, b_lo, y))
+        stack.append((u, a_hi, v, b_hi))
+
+def _clause_anchors(original: str, revised: str,
+                    a_starts: List[int], b_starts: List[int]) -> List[Tuple[int, int, Optional[str]]]:
+    """
+    Pair clause headings that occur exactly once in each text, in consistent order.
+
+    Returns:
+        (token index in original, token index in revised, clause number) per anchor.
+    """
+    def unique_clauses(text: str, starts: List[int]) -> Dict[str, int]:
+        seen: Dict[str, Optional[int]] = {}
+        for start, _, label in find_clauses(text):
+            if label is not None:
+                seen[label] = None if label in seen else bisect.bisect_left(starts, start)
+        return {label: index for label, index in seen.items() if index is not None}
+
+    original_clauses = unique_clauses(original, a_starts)
+    revised_clauses = unique_clauses(revised, b_starts)
+    pairs = sorted((index, revised_clauses[label]) for label, index in original_clauses.items()
+                   if label in revised_clauses)
+    labels = {index: label for label, index in original_clauses.items()}
+    return [(i, j, labels[i]) for i, j in _longest_increasing_subsequence(pairs)]
+
+def diff_contracts(original: str, revised: str) -> List[Dict[str, Any]]:
+    """
+    Compare an original contract with its revision at word level.
+
+    Args:
+        original: The original contract text (e.g. from read_file).
+        revised: The revised contract text (e.g. from get_contract_revision).
+
+    Returns:
+        A list of changes in document order, each a dictionary with the keys:
+            type: "insert", "delete" or "replace".
+            clause: Clause number of the clause containing the change, or None.
+            original_start, original_end: Character span in the original text
+                (equal for insertions).
+            revised_start, revised_end: Character span in the revised text
+                (equal for deletions).
+            original, revised: The removed and inserted text.
+    """
+    vocabulary: Dict[str, int] = {}
+    a, a_starts, a_ends = _tokenize(original, vocabulary)
+    b, b_starts, b_ends = _tokenize(revised, vocabulary)
+
+    # Diff each anchored clause separately
+    anchors = _clause_anchors(original, revised, a_starts, b_starts)
+    matches: List[Tuple[int, int]] = []
+    previous_a = previous_b = 0
+    for anchor_a, anchor_b, _ in anchors:
+        _match_tokens(a, previous_a, anchor_a, b, previous_b, anchor_b, matches)
+        previous_a, previous_b = anchor_a, anchor_b
+    _match_tokens(a, previous_a, len(a), b, previous_b, len(b), matches)
+    matches.sort()
+
+    # Clause of each original token position, for labelling changes
+    anchor_positions = [anchor[0] for anchor in anchors]
+    anchor_labels = [anchor[2] for anchor in anchors]
+
+    def clause_at(token_index: int) -> Optional[str]:
+        position = bisect.bisect_right(anchor_positions, token_index) - 1
+        return anchor_labels[position] if position >= 0 else None
+
+    changes = []
+    i = j = 0
+    for match_a, match_b in matches + [(len(a), len(b))]:
+        if match_a > i or match_b > j:
+            original_start = a_starts[i] if i < match_a else (a_ends[i - 1] if i else 0)
+            original_end = a_ends[match_a - 1] if i < match_a else original_start
+            revised_start = b_starts[j] if j < match_b else (b_ends[j - 1] if j else 0)
+            revised_end = b_ends[match_b - 1] if j < match_b else revised_start
+            changes.append({
+                "type": "replace" if i < match_a and j < match_b else ("delete" if i < match_a else "insert"),
+                "clause": clause_at(i),
+                "original_start": original_start,
+                "original_end": original_end,
+                "revised_start": revised_start,
+                "revised_end": revised_end,
+                "original": original[original_start:original_end],
+                "revised": revised[revised_start:revised_end],
+            })
+        i, j = match_a + 1, match_b + 1
+
+    logger.info(f"Found {len(changes)} changes between the original and revised contract.")
+    return changes
+
+def redline_segments(original: str, revised: str, changes: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """
+    Interleave unchanged, deleted and inserted text for rendering.
+
+    Args:
+        original: The original contract text.
+        revised: The revised contract text.
+        changes: Changes from diff_contracts.
+
+    Returns:
+        A list of (kind, text) segments, kind being "equal", "delete" or "insert".
+    """
+    segments = []
+    position = 0
+    for change in changes:
+        if change["revised_start"] > position:
+            segments.append(("equal", revised[position:change["revised_start"]]))
+        if change["original"]:
+            segments.append(("delete", change["original"]))
+        if change["revised"]:
+            segments.append(("insert", change["revised"]))
+        position = change["revised_end"]
+    if position < len(revised):
+        segments.append(("equal", revised[position:]))
+    return segments
+
+def render_redline_html(original: str, revised: str, changes: List[Dict[str, Any]]) -> str:
+    """
+    Render a redlined HTML page: deletions struck through in red, insertions underlined in blue.
+
+    Args:
+        original: The original contract text.
+        revised: The revised contract text.
+        changes: Changes from diff_contracts.
+
+    Returns:
+        The HTML document.
+    """
+    body = []
+    for kind, text in redline_segments(original, revised, changes):
+        escaped = html.escape(text)
+        if kind == "delete":
+            body.append(f"<del>{escaped}</del>")
+        elif kind == "insert":
+            body.append(f"<ins>{escaped}</ins>")
+        else:
+            body.append(escaped)
+
+    return (
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Contract changes</title>\n"
+        "<style>body{font-family:sans-serif;white-space:pre-wrap;max-width:60em;margin:2em auto}"
+        "del{color:#b00;text-decoration:line-through}ins{color:#00b;text-decoration:underline}</style>\n"
+        f"</head><body><p>{len(changes)} changes</p>\n{''.join(body)}</body></html>\n"
+    )
+
+def save_redline_html(original: str, revised: str, changes: List[Dict[str, Any]], file_path: str) -> bool:
+    """
+    Save a redlined HTML page.
+
+    Args:
+        original: The original contract text.
+        revised: The revised contract text.
+        changes: Changes from diff_contracts.
+        file_path: Path to save the HTML file.
+
+    Returns:
+        True if successful, False otherwise.
+    """
+    try:
+        with open(file_path, "w", encoding="utf-8") as file:
+            file.write(render_redline_html(original, revised, changes))
+        logger.info(f"Redline HTML saved successfully: {file_path}")
+        return True
+    except Exception as e:
+        logger.error(f"Error saving redline HTML {file_path}: {str(e)}")
+        return False
+
+def save_redline_docx(original: str, revised: str, changes: List[Dict[str, Any]], file_path: str) -> bool:
+    """
+    Save a redlined DOCX file: deletions struck through in red, insertions underlined in blue.
+
+    Args:
+        original: The original contract text.
+        revised: The revised contract text.
+        changes: Changes from diff_contracts.
+        file_path: Path to save the DOCX file.
+
+    Returns:
+        True if successful, False otherwise.
+    """
+    try:
+        from docx import Document
+        from docx.shared import RGBColor
+
+        doc = Document()
+        paragraph = doc.add_paragraph()
+
+        for kind, text in redline_segments(original, revised, changes):
+            lines = text.split("\n")
+            for line_number, line in enumerate(lines):
+                if line_number:
+                    paragraph = doc.add_paragraph()
+                if not line:
+                    continue
+                run = paragraph.add_run(line)
+                if kind == "delete":
+                    run.font.strike = True
+                    run.font.color.rgb = RGBColor(0xBB, 0x00, 0x00)
+                elif kind == "insert":
+                    run.font.underline = True
+                    run.font.color.rgb = RGBColor(0x00, 0x00, 0xBB)
+
+        doc.save(file_path)
+        logger.info(f"Redline DOCX saved successfully: {file_path}")
+        return True
+    except Exception as e:
+        logger.error(f"Error saving redline DOCX {file_path}: {str(e)}")
+        return False
+
+def save_redline_report(original: str, revised: str, output_path: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Diff the contracts and save the change report next to the revised contract:
+    <stem>_redline.html, <stem>_redline.docx and <stem>_changes.json.
+
+    Args:
+        original: The original contract text.
+        revised: The revised contract text.
+        output_path: Path of the saved revised contract.
+
+    Returns:
+        The list of changes, or None if an error occurred.
+    """
+    try:
+        changes = diff_contracts(original, revised)
+
+        output = Path(output_path)
+        base = output.with_name(output.stem)
+        save_redline_html(original, revised, changes, f"{base}_redline.html")
+        save_redline_docx(original, revised, changes, f"{base}_redline.docx")
+        with open(f"{base}_changes.json", "w", encoding="utf-8") as file:
+            json.dump(changes, file, ensure_ascii=False, indent=2)
+
+        return changes
+    except Exception as e:
+        logger.error(f"Error saving change report for {output_path}: {str(e)}")
+        return None
@@ -0,0 +1,148 @@
+"""
+Persistent cache of knowledge base search results.
+
+The same chunk texts (standard clauses, boilerplate) come back contract after
+contract, while the knowledge base changes only a few times a week. Search results
+are cached in a local SQLite file as ordered lists of entry ids and distances,
+keyed by a hash of the query embedding and the search parameters. Every entry is
+stamped with the knowledge base version it was computed against, and entries from
+any other version are never returned.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from utils.vector import VectorLike, as_float32
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables with encoding handling
+try:
+    load_dotenv(encoding='utf-8')
+except UnicodeDecodeError:
+    try:
+        load_dotenv(encoding='utf-16')
+    except UnicodeDecodeError:
+        try:
+            load_dotenv(encoding='latin1')
+        except Exception as e:
+            logger.error(f"Failed to load .env file: {str(e)}")
+
+# Whether find_similar_entries_batch consults the cache
+RETRIEVAL_CACHE = os.getenv("RETRIEVAL_CACHE", "true").lower() in ("1", "true", "yes")
+
+# Location of the cache database
+RETRIEVAL_CACHE_PATH = os.getenv("RETRIEVAL_CACHE_PATH", os.path.join(".cache", "retrieval.sqlite3"))
+
+# A cached hit: (entry id, cosine distance, fused score or None)
+CachedHit = Tuple[int, float, Optional[float]]
+
+def cache_key(embedding: VectorLike, top_k: int, filters: Dict[str, Any]) -> str:
+    """
+    Build the cache key of a search.
+
+    Args:
+        embedding: The query embedding.
+        top_k: Number of results requested.
+        filters: Every other parameter that changes the results (search mode,
+            hybrid settings, query text, ...). Values must be JSON serializable.
+
+    Returns:
+        A hex digest identifying the search.
+    """
+    digest = hashlib.sha256(as_float32(embedding).tobytes())
+    digest.update(json.dumps({"top_k": top_k, **filters}, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+class RetrievalCache:
+    """
+    SQLite-backed store of search results, tagged with a knowledge base version.
+
+    SQLite handles locking, so several processes can share one cache file.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or RETRIEVAL_CACHE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                hits TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    def get_many(self, keys: List[str], version: str) -> Dict[str, List[CachedHit]]:
+        """
+        Look up several searches at once.
+
+        Args:
+            keys: Cache keys from cache_key.
+            version: The current knowledge base version.
+
+        Returns:
+            The cached hits of every key found for this version.
+        """
+        found = {}
+        # Stay well below SQLite's limit on bound parameters
+        for offset in range(0, len(keys), 500):
+            batch = keys[offset:offset + 500]
+            rows = self.connection.execute(
+                f"SELECT key, hits FROM results WHERE version = ? AND key IN ({', '.join('?' * len(batch))})",
+                [version, *batch]
+            )
+            for key, hits in rows:
+                found[key] = [tuple(hit) for hit in json.loads(hits)]
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, List[CachedHit]]], version: str) -> None:
+        """
+        Store search results, dropping entries of older knowledge base versions.
+
+        Args:
+            items: (cache key, hits) pairs.
+            version: The knowledge base version the results were computed against.
+        """
+        now = time.time()
+        with self.connection:
+            self.connection.execute("DELETE FROM results WHERE version != ?", (version,))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results (key, version, hits, created_at) VALUES (?, ?, ?, ?)",
+                [(key, version, json.dumps(hits), now) for key, hits in items]
+            )
+
+    def close(self) -> None:
+        """Close the cache database."""
+        self.connection.close()
+
+def to_cached_hits(entries: List[Dict[str, Any]]) -> List[CachedHit]:
+    """
+    Reduce search results to what the cache stores.
+
+    Args:
+        entries: Results of find_similar_entries.
+
+    Returns:
+        (id, distance, fused score) per entry, in result order.
+    """
+    return [
+        (int(entry["id"]), float(entry["similarity"]),
+         float(entry["rrf_score"]) if entry.get("rrf_score") is not None else None)
+        for entry in entries
+    ]
@@ -0,0 +1,176 @@
+"""
+Model routing for section revisions.
+
+Most revised sections are routine (a payment term, a notice address) and a small
+fast model revises them as well as a large one. Each section is scored from
+signals that are already at hand before any chat request: how close and how many
+distinct policies were retrieved for it, how long it is and whether it mentions a
+high-risk subject. Sections scoring at least ROUTING_STRONG_SCORE, and every
+section with a keyword trigger, go to the strong tier; the rest go to the fast
+tier. Each tier has its own model and concurrency limit.
+"""
+import os
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from utils.gating import GATE_MAX_DISTANCE
+from utils.tokenizer import count_tokens
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables with encoding handling
+try:
+    load_dotenv(encoding='utf-8')
+except UnicodeDecodeError:
+    try:
+        load_dotenv(encoding='utf-16')
+    except UnicodeDecodeError:
+        try:
+            load_dotenv(encoding='latin1')
+        except Exception as e:
+            logger.error(f"Failed to load .env file: {str(e)}")
+
+# Whether revise_sections routes sections between a fast and a strong model
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "false").lower() in ("1", "true", "yes")
+
+# Model of each tier; the fast tier defaults to CHAT_MODEL
+FAST_CHAT_MODEL = os.getenv("FAST_CHAT_MODEL") or os.getenv("CHAT_MODEL", "gpt-4.1-nano")
+STRONG_CHAT_MODEL = os.getenv("STRONG_CHAT_MODEL", "gpt-4.1")
+
+# Sections revised at the same time on each tier
+FAST_CONCURRENCY = int(os.getenv("FAST_CONCURRENCY", "8"))
+STRONG_CONCURRENCY = int(os.getenv("STRONG_CONCURRENCY", "2"))
+
+# Score from which a section goes to the strong tier
+ROUTING_STRONG_SCORE = float(os.getenv("ROUTING_STRONG_SCORE", "4"))
+
+# Subjects that always go to the strong tier (comma-separated, matched
+# case-insensitively as word prefixes, with Turkish dotted and dotless i folded).
+# Keep them specific: a trigger bypasses the score, so terms found in most clauses
+# (liability, warranty) would send nearly every section to the strong tier.
+ROUTING_KEYWORDS = [keyword.strip() for keyword in os.getenv(
+    "ROUTING_KEYWORDS",
+    "cezai şart,rekabet yasağı,fikri mülkiyet,münhasırlık,"
+    "indemnif,liquidated damages,intellectual property,non-compet,exclusivity"
+).split(",") if keyword.strip()]
+
+# Score weights: points per distinct policy hit, per SCORE_TOKENS_PER_POINT tokens
+# of section text, and for a policy at distance 0 (falling to 0 at GATE_MAX_DISTANCE)
+POLICY_WEIGHT = 1.0
+SCORE_TOKENS_PER_POINT = 500
+DISTANCE_WEIGHT = 2.0
+
+# USD per million (input, output) tokens, used to log the cost of each tier.
+# FAST_TIER_PRICE / STRONG_TIER_PRICE ("input,output") override the table.
+MODEL_PRICES = {
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# Share of the input price billed for prompt tokens served from the provider's cache
+CACHED_INPUT_PRICE_FACTOR = 0.25
+
+def _parse_price(value: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Parse an "input,output" price setting."""
+    if not value:
+        return None
+    try:
+        input_price, output_price = (float(part) for part in value.split(","))
+        return input_price, output_price
+    except ValueError:
+        logger.error(f"Invalid tier price {value!r}; expected \"input,output\" in USD per million tokens.")
+        return None
+
+TIERS = {
+    "fast": {"model": FAST_CHAT_MODEL, "concurrency": FAST_CONCURRENCY,
+             "price": _parse_price(os.getenv("FAST_TIER_PRICE"))},
+    "strong": {"model": STRONG_CHAT_MODEL, "concurrency": STRONG_CONCURRENCY,
+               "price": _parse_price(os.getenv("STRONG_TIER_PRICE"))},
+}
+
+def _fold(text: str) -> str:
+    """Lowercase a text with the Turkish dotted and dotless i folded to "i"."""
+    return text.translate({ord("İ"): "i", ord("I"): "i", ord("ı"): "i"}).lower()
+
+_KEYWORD_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(_fold(keyword)) for keyword in ROUTING_KEYWORDS) + r")"
+) if ROUTING_KEYWORDS else None
+
+def section_signals(section_text: str, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Collect the routing signals of a section.
+
+    Args:
+        section_text: The text of the section.
+        entries: Knowledge base entries retrieved for the section, with their
+            "similarity" (cosine distance).
+
+    Returns:
+        A dictionary with the keys:
+            tokens: Token count of the section.
+            policies: Number of distinct policies among the entries.
+            best_distance: Distance of the closest entry, or None if there are none.
+            keywords: The keyword triggers found in the section.
+    """
+    distances = [float(entry["similarity"]) for entry in entries if entry.get("similarity") is not None]
+    policies = {entry.get("id", entry.get("content")) for entry in entries}
+    keywords = sorted(set(_KEYWORD_PATTERN.findall(_fold(section_text)))) if _KEYWORD_PATTERN else []
+    return {
+        "tokens": count_tokens(section_text),
+        "policies": len(policies),
+        "best_distance": min(distances) if distances else None,
+        "keywords": keywords,
+    }
+
+def route_section(section_text: str, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Decide which tier revises a section.
+
+    Args:
+        section_text: The text of the section.
+        entries: Knowledge base entries retrieved for the section.
+
+    Returns:
+        A dictionary with the keys tier ("fast" or "strong"), model, score and
+        signals (from section_signals).
+    """
+    signals = section_signals(section_text, entries)
+
+    closeness = 0.0
+    if signals["best_distance"] is not None and GATE_MAX_DISTANCE > 0:
+        closeness = min(1.0, max(0.0, 1 - signals["best_distance"] / GATE_MAX_DISTANCE))
+    score = (POLICY_WEIGHT * signals["policies"]
+             + signals["tokens"] / SCORE_TOKENS_PER_POINT
+             + DISTANCE_WEIGHT * closeness)
+
+    tier = "strong" if signals["keywords"] or score >= ROUTING_STRONG_SCORE else "fast"
+    return {"tier": tier, "model": TIERS[tier]["model"], "score": score, "signals": signals}
+
+def estimate_cost(tier: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Optional[float]:
+    """
+    Estimate the cost of a tier's requests.
+
+    Args:
+        tier: "fast" or "strong".
+        prompt_tokens: Input tokens billed, including cached ones.
+        completion_tokens: Output tokens billed.
+        cached_tokens: Input tokens served from the provider's prompt cache.
+
+    Returns:
+        The cost in USD, or None if the tier's model has no known price.
+    """
+    price = TIERS[tier]["price"] or MODEL_PRICES.get(TIERS[tier]["model"])
+    if price is None:
+        return None
+    uncached_tokens = prompt_tokens - cached_tokens
+    return (uncached_tokens * price[0] + cached_tokens * price[0] * CACHED_INPUT_PRICE_FACTOR
+            + completion_tokens * price[1]) / 1e6
@@ -0,0 +1,77 @@
+"""
+Token counting module using the same BPE encodings as the OpenAI models.
+"""
+import os
+import re
+import logging
+from functools import lru_cache
+from typing import Optional
+import tiktoken
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables with encoding handling
+try:
+    load_dotenv(encoding='utf-8')
+except UnicodeDecodeError:
+    try:
+        load_dotenv(encoding='utf-16')
+    except UnicodeDecodeError:
+        try:
+            load_dotenv(encoding='latin1')
+        except Exception as e:
+            logger.error(f"Failed to load .env file: {str(e)}")
+
+# Model whose tokenizer is used when none is given
+DEFAULT_TOKENIZER_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Used when the BPE encoding is unavailable (e.g. tiktoken cannot download it offline):
+# every run of up to four word characters and every punctuation mark counts as one
+# token, which tracks BPE counts on Turkish text much better than whitespace splitting.
+_APPROXIMATE_TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    """
+    Load the tiktoken encoding for a model.
+
+    Args:
+        model: The OpenAI model name.
+
+    Returns:
+        The tiktoken Encoding, or None if it could not be loaded.
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Tokenizer for {model} unavailable, using approximate token counts: {str(e)}")
+        return None
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Count the tokens in a text as the given model would see them.
+
+    Args:
+        text: The text to count.
+        model: The model whose tokenizer to use. Defaults to the embedding model.
+
+    Returns:
+        The number of tokens.
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding(model or DEFAULT_TOKENIZER_MODEL)
+    if encoding is None:
+        return len(_APPROXIMATE_TOKEN_PATTERN.findall(text))
+
+    return len(encoding.encode_ordinary(text))
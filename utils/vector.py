@@ -0,0 +1,216 @@
+"""
+Vector serialization module for sending embeddings to pgvector.
+
+psycopg2 adapts a plain Python list to an ``ARRAY[...]`` literal of numerics, which
+PostgreSQL parses as ``numeric[]`` and then casts element by element to ``vector``.
+This module provides a psycopg2 adapter that renders embeddings straight to
+pgvector's own input format, and a binary encoder for ``COPY ... (FORMAT binary)``
+bulk writes that skips text parsing altogether.
+"""
+import io
+import json
+import struct
+import logging
+from typing import Any, Iterable, Sequence, Union
+import numpy as np
+from psycopg2.extensions import register_adapter
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Anything that can be turned into a 1-D float32 array
+VectorLike = Union[Sequence[float], np.ndarray]
+
+# pgvector binary layout: int16 dimensions, int16 unused, then big-endian float4 values
+_VECTOR_HEADER = struct.Struct('>HH')
+_FLOAT4_BE = np.dtype('>f4')
+
+# PostgreSQL COPY binary framing
+_COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+_COPY_HEADER = _COPY_SIGNATURE + struct.pack('>ii', 0, 0)
+_COPY_TRAILER = struct.pack('>h', -1)
+_INT16 = struct.Struct('>h')
+_INT32 = struct.Struct('>i')
+_INT64 = struct.Struct('>q')
+_NULL_FIELD = _INT32.pack(-1)
+
+def as_float32(embedding: VectorLike) -> np.ndarray:
+    """
+    Convert an embedding to a contiguous 1-D float32 array.
+
+    Args:
+        embedding: The embedding as a list of floats or a NumPy array.
+
+    Returns:
+        The embedding as a float32 NumPy array.
+    """
+    array = np.asarray(embedding, dtype=np.float32)
+    if array.ndim != 1:
+        raise ValueError(f"Expected a 1-D embedding, got an array with shape {array.shape}.")
+    return array
+
+def to_vector_text(embedding: VectorLike) -> str:
+    """
+    Render an embedding in pgvector's text input format.
+
+    Values are written with 9 significant digits, which round-trips float32 exactly
+    while keeping the literal shorter than Python's float repr.
+
+    Args:
+        embedding: The embedding as a list of floats or a NumPy array.
+
+    Returns:
+        A string such as ``[0.1,-0.2,0.3]``.
+    """
+    values = as_float32(embedding).tolist()
+    return "[" + (",".join(["%.9g"] * len(values)) % tuple(values)) + "]"
+
+def from_vector_text(text: str) -> np.ndarray:
+    """
+    Parse a vector from pgvector's text output format.
+
+    Args:
+        text: A string such as ``[0.1,-0.2,0.3]``.
+
+    Returns:
+        The embedding as a float32 NumPy array.
+    """
+    return np.array(text.strip()[1:-1].split(","), dtype=np.float32)
+
+def to_vector_binary(embedding: VectorLike) -> bytes:
+    """
+    Encode an embedding in pgvector's binary wire format (as used by ``vector_recv``).
+
+    Args:
+        embedding: The embedding as a list of floats or a NumPy array.
+
+    Returns:
+        The encoded vector.
+    """
+    array = as_float32(embedding)
+    return _VECTOR_HEADER.pack(len(array), 0) + array.astype(_FLOAT4_BE).tobytes()
+
+def from_vector_binary(data: bytes) -> np.ndarray:
+    """
+    Decode a vector from pgvector's binary wire format.
+
+    Args:
+        data: The encoded vector.
+
+    Returns:
+        The embedding as a float32 NumPy array.
+    """
+    dimensions, unused = _VECTOR_HEADER.unpack_from(data)
+    if unused != 0 or len(data) != _VECTOR_HEADER.size + 4 * dimensions:
+        raise ValueError("Invalid pgvector binary value.")
+    return np.frombuffer(data, dtype=_FLOAT4_BE, offset=_VECTOR_HEADER.size).astype(np.float32)
+
+class Vector:
+    """
+    Wrapper marking a sequence of floats as a pgvector value for psycopg2.
+
+    The quoted literal is rendered once and reused, so a Vector can appear several
+    times in the same query at no extra cost.
+    """
+
+    __slots__ = ("array", "_quoted")
+
+    def __init__(self, embedding: VectorLike):
+        self.array = as_float32(embedding)
+        self._quoted = None
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def quoted(self) -> bytes:
+        """Return the vector as a quoted SQL literal."""
+        if self._quoted is None:
+            # The literal only contains digits, signs, dots, commas, 'e' and brackets,
+            # so it never needs escaping.
+            self._quoted = ("'" + to_vector_text(self.array) + "'").encode("ascii")
+        return self._quoted
+
+class VectorAdapter:
+    """psycopg2 adapter rendering a Vector as a quoted pgvector text literal."""
+
+    def __init__(self, value: Vector):
+        self.value = value
+
+    def getquoted(self) -> bytes:
+        return self.value.quoted()
+
+def register_vector_adapter() -> None:
+    """
+    Register the vector adapter for Vector with psycopg2.
+
+    Only the Vector wrapper is adapted, so NumPy arrays bound for other columns keep
+    psycopg2's own handling; wrap embeddings in Vector where they are passed.
+    """
+    register_adapter(Vector, VectorAdapter)
+
+register_vector_adapter()
+
+def _encode_copy_field(value: Any, pg_type: str) -> bytes:
+    """
+    Encode a single field for a binary COPY stream.
+
+    Args:
+        value: The Python value (None for NULL).
+        pg_type: The PostgreSQL type name of the target column.
+
+    Returns:
+        The length-prefixed field bytes.
+    """
+    if value is None:
+        return _NULL_FIELD
+
+    if pg_type == "vector":
+        payload = to_vector_binary(value)
+    elif pg_type in ("text", "varchar"):
+        payload = str(value).encode("utf-8")
+    elif pg_type in ("json", "jsonb"):
+        # Serialized like psycopg2.extras.Json; jsonb's binary format adds a version byte
+        payload = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        if pg_type == "jsonb":
+            payload = b'\x01' + payload
+    elif pg_type in ("int4", "integer"):
+        payload = _INT32.pack(int(value))
+    elif pg_type in ("int8", "bigint"):
+        payload = _INT64.pack(int(value))
+    elif pg_type in ("bool", "boolean"):
+        payload = b'\x01' if value else b'\x00'
+    else:
+        raise ValueError(f"Unsupported column type for binary COPY: {pg_type}")
+
+    return _INT32.pack(len(payload)) + payload
+
+def encode_copy_binary(rows: Iterable[Sequence[Any]], column_types: Sequence[str]) -> io.BytesIO:
+    """
+    Build a ``COPY ... FROM STDIN WITH (FORMAT binary)`` stream for the given rows.
+
+    Args:
+        rows: Row tuples, with values in the same order as column_types.
+        column_types: PostgreSQL type names of the target columns
+            (vector, text, varchar, json, jsonb, int4, int8, bool).
+
+    Returns:
+        A BytesIO positioned at the start of the encoded stream.
+    """
+    field_count = _INT16.pack(len(column_types))
+    buffer = io.BytesIO()
+    buffer.write(_COPY_HEADER)
+
+    for row in rows:
+        if len(row) != len(column_types):
+            raise ValueError(f"Expected {len(column_types)} values per row, got {len(row)}.")
+        buffer.write(field_count)
+        for value, pg_type in zip(row, column_types):
+            buffer.write(_encode_copy_field(value, pg_type))
+
+    buffer.write(_COPY_TRAILER)
+    buffer.seek(0)
+    return buffer